@@ -1,18 +1,33 @@
 import importlib
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from contextlib import contextmanager
+from datetime import datetime
 from os import listdir, linesep, makedirs
 from os.path import abspath, dirname, isfile, join as joinpath, isdir, expandvars as envar, basename
-from threading import Thread, Event
-from typing import Union, Dict, Type, Callable
+from threading import Thread, Event, RLock
+from time import perf_counter, monotonic
+from typing import Union, Dict, Type, Callable, Tuple
 
 from Transceiver import SerialTransceiver, PelengTransceiver
 from Transceiver.errors import *
 from Transceiver.errors import VerboseError
 from Utils import Logger, bytewise, castStr, ConfigLoader, formatDict, Formatters
 
+from bulk import BulkTransfer, BulkReport
+from cache import ReplyCache
+from capture import CaptureWriter, CaptureReader, Direction, ERROR_NONE, ERROR_TIMEOUT, ERROR_BAD_DATA, parseTime
 from device import Device, DataInvalidError
+from flight import FlightRecorder
+from ingress import IngressQueue
 from notifier import Notifier
+from peleng import MAX_PAYLOAD_SIZE
+from port import PortKeeper
+from tap import Tap, TapServer
+from scheduler import Scheduler, URGENT, NCS
+from timing import RtoEstimator, Backoff
+from window import TxWindow, Request
 
 # NCS - Native Control Software - external native application that is used
 #       to control the device through ProtocolProxy app
@@ -64,11 +79,16 @@ class ProtocolLoader(dict):
         if protocol is not None:
             return protocol
         else:
+            # ▼ Pars created by protocol module re-register 'altered', 'new', etc. events, dropping their handlers
+            handlers = {event: tuple(eventHandlers) for event, eventHandlers in Notifier.events.items()}
             try:
                 deviceModule = importlib.import_module(item)
             except ModuleNotFoundError:
                 raise ApplicationError(f"Cannot find protocol file '{item}.py' in '{pDir}' directory "
                                        f"(application resources corrupted?)")
+            finally:
+                for event, eventHandlers in handlers.items():
+                    for handler in eventHandlers: Notifier.events[event].add(handler)
             try:
                 deviceClass = getattr(deviceModule, item.upper())
             except AttributeError:
@@ -87,11 +107,37 @@ class CONFIG(ConfigLoader, section='APP'):
     DEVICES_FOLDER_REL: str = 'devices'
     APP_COM_PORT: str = 'COM11'     # virtual port for App
     DEV_COM_PORT: str = 'COM1'      # real port for Device
-    DEVICE_TIMEOUT: float = 0.5  # sec
-    SMALL_TIMEOUT_DELAY: float = 0.5  # sec
-    BIG_TIMEOUT_DELAY: int = 5  # sec
-    NO_REPLY_HOPELESS: int = 50  # timeouts
+    DEVICE_TIMEOUT: float = 0.5  # sec, upper limit for adaptive device reply timeout
+    DEVICE_TIMEOUT_FLOOR: float = 0.002  # sec, lower limit for adaptive device reply timeout
+    ADAPTIVE_TIMEOUT: bool = True  # adapt device reply timeout to measured round-trip time
+    TIMEOUT_ADAPT_INTERVAL: float = 1  # sec, min period of device port reconfiguration by adaptive timeout
+    AUTO_RECONNECT: bool = True  # reopen ports and resume communication after port loss
+    RECONNECT_PERIOD: float = 1  # sec, port availability polling period
+    SMALL_TIMEOUT_DELAY: float = 0.5  # sec, initial backoff delay when device does not reply
+    BIG_TIMEOUT_DELAY: int = 5  # sec, max backoff delay
+    BACKOFF_GRACE: int = 3  # timeouts retried without delay
+    BACKOFF_JITTER: float = 0.25  # relative spread of backoff delays
     NATIVE_SOFT_COMM: bool = True
+    PORT_IDLE_TIMEOUT: float = 2  # sec
+    NCS_QUEUE_SIZE: int = 16  # max NCS commands waiting for device transaction
+    NCS_QUEUE_POLICY: str = 'drop-oldest'  # 'drop-oldest' | 'drop-duplicates' | 'deadline'
+    NCS_QUEUE_DEADLINE: float = 0.5  # sec, max NCS command age for 'deadline' policy
+    COALESCE_WINDOW: float = 0  # sec, merge identical idempotent NCS commands received within window
+                                #   (their transaction is delayed until window ends), 0 ––► off
+    REPLY_CACHE_TTL: float = 0  # sec, answer repeated NCS inquiries from cache within TTL, 0 ––► off
+    URGENT_WEIGHT: int = 8  # share of transaction slots given to parameter changes...
+    NCS_WEIGHT: int = 2  # ...and to NCS commands, while both are pending
+    STARVATION_LIMIT: int = 8  # max slots in a row pending traffic class could be left waiting
+    KEEPALIVE_INTERVAL: float = 0.5  # sec, idle polling period while nothing happens, 0 ––► poll continuously
+    TX_WINDOW: int = 1  # max NCS commands in flight to device that numbers its replies, 1 ––► stop-and-wait
+    BULK_CHUNK_SIZE: int = MAX_PAYLOAD_SIZE  # bytes, max bulk data per packet
+    BULK_PIPELINE_DEPTH: int = 4  # bulk packets sent ahead without waiting for replies
+    CAPTURE_FILE: str = ''  # traffic capture started together with communication, '' ––► off
+    CAPTURE_CODEC: str = 'zlib'  # capture blocks compression: 'none' | 'zlib' | 'lzma'
+    FLIGHT_RECORDER_SIZE: int = 256  # recent device transactions kept for failure dumps, 0 ––► off
+    FLIGHT_DUMP_FOLDER: str = ''  # folder for flight recorder dumps, '' ––► app data folder
+    TAP_PORT: int = 0  # local socket port for traffic monitors (see tap.py), 0 ––► off
+    TAP_BUFFER_SIZE: int = 4096  # records buffered for each tap subscriber before overrun
 
 
 class App(Notifier):
@@ -102,6 +148,7 @@ class App(Notifier):
       • setProtocol()
       • start()
       • stop()
+      • submitTransaction()
     
     API objects:
       • device
@@ -124,9 +171,11 @@ class App(Notifier):
         self.cmdThread: Thread = None
         self.commThread: Thread = None
         self.ncsThread: Thread = None
+        self.ioWorker: ThreadPoolExecutor = None  # single I/O thread for asynchronous transactions
 
         self.stopEvent: Event = None
         self.commRunning: bool = False
+        self.commLock: RLock = RLock()  # held while device transaction is in progress
 
         self.loggerLevels = {
             'App': 'DEBUG',
@@ -142,6 +191,38 @@ class App(Notifier):
         # when communication is running, these ▼ attrs should be accessed only from inside commThread!
         self.appInt: SerialTransceiver = None  # serial interface to native communication soft (virtual port)
         self.devInt: PelengTransceiver = None  # serial interface to physical device (real port)
+        self.devPort: PortKeeper = None  # device interface lifetime manager
+        self.devTimer: RtoEstimator = None  # device reply timeout estimator
+        self.timeoutAdaptedAt: float = None  # monotonic time adapted timeout has been applied to device port
+        self.devBackoff: Backoff = None  # device polling backoff policy (while device does not reply)
+        self.nProbes: int = 0
+        self.ingress: IngressQueue = None  # framed NCS commands waiting for device transaction
+        self.replyCache: ReplyCache = None  # device replies to NCS inquiries
+        self.scheduler: Scheduler = None  # transaction slots arbiter
+        self.ncsWaiting: bool = False  # comm loop is blocked waiting for NCS command
+        self.ncsWaitCutShort: bool = False  # the last wait for NCS command has ended early without one
+        self.lastTransactionAt: float = 0  # monotonic time of most recent relayed transaction, sec
+        self.deferredReplies: int = 0  # NCS replies held until device consumes retransmitted command
+        self.nRetransmits: int = 0
+        self.txWindow: TxWindow = None  # NCS commands in flight (only in windowed mode)
+        self.lastBulkReport: BulkReport = None
+        self.capture: CaptureWriter = None  # traffic recorder (see .startCapture())
+        self.flightRecorder: FlightRecorder = None  # recent transactions, dumped on comm failure
+        self.tap: Tap = Tap()  # live traffic for passive monitors (multi-producer: traced from several threads)
+        self.tapServer: TapServer = None  # serves .tap to local socket clients (see CONFIG.TAP_PORT)
+        self.sentPacket: bytes = b''  # most recent packet sent to device...
+        self.writeTime: float = 0  # ...and time it took to write it, sec
+
+        # Idle polling statistics
+        self.keepAliveMode: bool = False  # True ––► idle polling is slowed down to CONFIG.KEEPALIVE_INTERVAL
+        self.nSlowdowns: int = 0
+        self.nSkippedPolls: int = 0
+
+        # Communication supervisor statistics
+        self.nReconnects: int = 0
+        self.totalDowntime: float = 0  # sec
+        self.maxDowntime: float = 0  # sec
+        self.lastLoss: str = None  # error that caused most recent communication loss
         self.nativeSoftConnEstablished: bool = False
         self.nativeData: bytes = None
         self.deviceData: bytes = None
@@ -152,13 +233,22 @@ class App(Notifier):
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.commThread:
             if self.commRunning:
-                self.stopEvent.set()
+                self.interrupt()
             self.commThread.join()
 
         if self.ncsThread:
-            self.stopEvent.set()
+            self.interrupt()
             self.ncsThread.join()
 
+        if self.ioWorker:
+            self.ioWorker.shutdown(wait=True)
+
+        if self.devPort:
+            self.devPort.close()
+
+        self.stopCapture()
+        if self.tapServer: self.tapServer.stop()
+
         if self.cmdThread:
             self.cmdThread.join()
 
@@ -176,11 +266,28 @@ class App(Notifier):
             'comm started',      # Communication loop is ready to start transactions
             'comm dropped',      # Failed to configure and open ports
             'comm failed',       # Fatal failure in communication loop
+            'comm lost',         # Port is lost, communication is suspended until it reappears
+            'comm restored',     # Ports are reopened and communication is resumed
             'comm stopped',      # Communication loop is stopped and communication thread is about to exit
             'comm ok',           # Transaction controlSoft ⇆ app ⇆ device performed successfully
             'comm timeout',      # Write or read timeout in communication loop
             'comm error'         # Error in packet transmission process (bad data, connection lost, etc.)
         )
+        # ▼ Handlers stay registered for app lifetime: trace ones are idle while there is no capture or tap subscriber,
+        #   urgent transaction one — while comm loop is stopped (adding / removing them from other threads
+        #   would race with notifications)
+        self.addEvents('altered', 'new')
+        self.addHandler('altered', self.traceAltered)
+        self.addHandler('new', self.traceNew)
+        self.addHandler('altered', self.requestUrgentTransaction)
+        self.addHandler('altered', self.invalidateReplyCache)
+        self.addHandler('new', self.invalidateReplyCache)
+        if CONFIG.FLIGHT_RECORDER_SIZE > 0:
+            self.flightRecorder = FlightRecorder(CONFIG.FLIGHT_RECORDER_SIZE)
+            self.addHandler('comm failed', self.dumpFlightRecorder)
+        if CONFIG.TAP_PORT:
+            try: self.tapServer = TapServer(self.tap, CONFIG.TAP_PORT, capacity=CONFIG.TAP_BUFFER_SIZE).start()
+            except OSError as e: log.error(f"Failed to start tap server on port {CONFIG.TAP_PORT}: {e}")
 
         self.notify('app initialized')
 
@@ -193,6 +300,9 @@ class App(Notifier):
 
     @contextmanager
     def restartNeeded(self):
+        """ Stop communication (if it is running) for the duration of the block and start it again afterwards
+            Pending port I/O is cancelled on stop (see .interrupt()), so restart takes milliseconds
+        """
         if not self.commRunning:
             yield
         else:
@@ -215,12 +325,32 @@ class App(Notifier):
         self.appInt.port = CONFIG.APP_COM_PORT
         self.devInt = self.getInterface(self.device.COMMUNICATION_INTERFACE)
         self.devInt.port = CONFIG.DEV_COM_PORT
+        self.devPort = PortKeeper(self.devInt, CONFIG.PORT_IDLE_TIMEOUT)
 
     def setProtocol(self, deviceName: str):
-        self.device = self.protocols[deviceName]()
-        if not self.appInt and not self.devInt: self.initInterfaces()
-        with self.device.lock, self.restartNeeded():
-            self.device.configureInterface(self.appInt, self.devInt)
+        """ Switch app to another device protocol
+            Running communication is not restarted — device is substituted between transactions
+                and interfaces are reconfigured in place (only if serial settings actually differ)
+        """
+        device = self.protocols[deviceName]()
+        if not self.appInt and not self.devInt:
+            self.device = device
+            self.initInterfaces()
+        with self.commLock, device.lock:
+            reconfigured = device.configureInterface(self.appInt, self.devInt)
+            self.device = device
+            self.devTimer = RtoEstimator(floor=max(device.transactionTime() * 2, CONFIG.DEVICE_TIMEOUT_FLOOR),
+                                         ceiling=min(device.DEV_TIMEOUT, CONFIG.DEVICE_TIMEOUT))
+            self.timeoutAdaptedAt = None
+            self.replyCache = ReplyCache(device, CONFIG.REPLY_CACHE_TTL)
+            self.deferredReplies = 0
+            if CONFIG.TX_WINDOW > 1 and device.SEQUENCE_MODULO:
+                self.txWindow = TxWindow(CONFIG.TX_WINDOW, device.SEQUENCE_MODULO)
+            else:
+                self.txWindow = None
+            device.windowed = self.txWindow is not None
+        if not reconfigured:
+            log.debug(f"Serial settings for {device.name} protocol are unchanged — ports are left as is")
         self.notify('protocol changed', deviceName)
 
     def start(self, name: str, target: Callable, subject: str, openApp: bool, openDev: bool):
@@ -241,12 +371,12 @@ class App(Notifier):
         log.info(f"Launching {subject}...")
         try:
             if openApp is True: self.appInt.open()
-            if openDev is True: self.devInt.open()
+            if openDev is True: self.devPort.acquire()
         except SerialError as e:
             if openApp is True:
                 self.appInt.close()
             if openDev is True:
-                self.devInt.close()
+                self.devPort.close()
                 self.notify('comm dropped')
             log.fatal(f"Failed to start {subject} loop: {e}")
             log.debug('', traceback=True)
@@ -272,12 +402,24 @@ class App(Notifier):
             return None
         if thread.is_alive():
             log.info(f"Interrupting {subject} loop...")
-            self.stopEvent.set()
+            self.interrupt()
         thread.join()
         self.stopEvent.clear()
         setattr(self, name, thread)
         return False
 
+    def interrupt(self):
+        """ Set stop event and wake up blocking reads/writes of running loop immediately """
+        self.stopEvent.set()
+        if self.scheduler: self.scheduler.wake()
+        for interface in (self.appInt, self.devInt):
+            if interface is None or not interface.is_open: continue
+            try:
+                interface.cancel_read()
+                interface.cancel_write()
+            except (AttributeError, NotImplementedError, SerialError) as e:
+                log.debug(f"Cannot cancel pending I/O on {interface.port}: {e}")
+
     def startComm(self):
         status = self.start(name='commThread', target=self.commLoop,
                             subject='communication', openApp=True, openDev=True)
@@ -305,11 +447,13 @@ class App(Notifier):
         return status
 
     @contextmanager
-    def controlSoftErrorsHandler(self):
+    def controlSoftErrorsHandler(self, stopEvent):
         subject = self.device.name
         try:
             yield
         except SerialReadTimeoutError:
+            if stopEvent.is_set(): return  # read has been cancelled by .interrupt()
+            if self.scheduler and self.scheduler.urgentPending: return  # ...or by .requestUrgentTransaction()
             self.appInt.nTimeouts += 1
             if self.appInt.nTimeouts == 1:
                 tlog.warning(f"No reply from {subject} native control soft...")
@@ -317,6 +461,7 @@ class App(Notifier):
                 tlog.debug(f"No reply from {subject} native control soft [{self.appInt.nTimeouts}]")
             self.notify('comm timeout')
         except (DataInvalidError, SerialCommunicationError) as e:
+            if stopEvent.is_set(): return  # incomplete packet, as read has been cancelled by .interrupt()
             if isinstance(e, BadDataError):
                 tlog.error(f"Received bad data from {subject} native control soft:\n{e}\n"
                            f"(wrong data source is connected to {self.appInt.token}?)")
@@ -329,6 +474,7 @@ class App(Notifier):
             tlog.info("Packet discarded")
             if isinstance(e, VerboseError):
                 tlog.debug(e)
+            self.trace(Direction.NCS_IN, getattr(e, 'data', None) or b'', ERROR_BAD_DATA)
             self.notify('comm error')
         else:
             if self.appInt.nTimeouts:
@@ -342,8 +488,6 @@ class App(Notifier):
                 tlog.error(f"{subject} native control soft input buffer ({self.appInt.port}) is filled over limit")
                 self.appInt.reset_input_buffer()
                 tlog.info(f"{self.appInt.token}: {nBytesUnread} bytes flushed.")
-        tlog.info(f"Using {subject} idle payload: [{bytewise(self.device.IDLE_PAYLOAD)}]")
-        self.nativeData = self.device.IDLE_PAYLOAD
 
     @contextmanager
     def deviceErrorsHandler(self, stopEvent):
@@ -351,16 +495,21 @@ class App(Notifier):
         try:
             yield
         except SerialReadTimeoutError:
+            if stopEvent.is_set(): return  # read has been cancelled by .interrupt()
             self.devInt.nTimeouts += 1
             if self.devInt.nTimeouts == 1:
                 tlog.warning(f"No reply from {subject} device...")
             else:
                 tlog.debug(f"No reply from {subject} device [{self.devInt.nTimeouts}]")
             self.notify('comm timeout')
-            # TODO: redesign this ▼ to set new timer interval to 5x transaction period
-            #  when scheduler will be used instead of 'for loop' for triggering transactions
-            stopEvent.wait(CONFIG.SMALL_TIMEOUT_DELAY if self.devInt.nTimeouts < CONFIG.NO_REPLY_HOPELESS
-                           else CONFIG.BIG_TIMEOUT_DELAY)
+            if self.devBackoff is not None:
+                wasActive = self.devBackoff.active
+                delay = self.devBackoff.next()
+                if self.devBackoff.active and not wasActive:
+                    tlog.warning(f"{subject} device is not responding — probing it with backoff "
+                                 f"(up to {self.devBackoff.cap} sec)")
+                elif delay:
+                    tlog.debug(f"Next {subject} device probe in {delay:.2f} sec")
         except (DataInvalidError, SerialCommunicationError) as e:
             if isinstance(e, BadDataError):
                 tlog.error(f"Received corrupted data from '{subject}' device:\n{e}")
@@ -378,6 +527,7 @@ class App(Notifier):
             if self.devInt.nTimeouts:
                 tlog.info(f"Found data from {subject} device after {self.devInt.nTimeouts} timeouts")
                 self.devInt.nTimeouts = 0
+            if self.devBackoff is not None: self.devBackoff.reset()
             return
         finally:
             if self.devInt.in_waiting > self.device.DEV_MAX_INPUT_BUFFER_SIZE:
@@ -390,48 +540,14 @@ class App(Notifier):
         try:
             self.commRunning = True
             self.nativeSoftConnEstablished = False
+            self.devBackoff = Backoff(base=CONFIG.SMALL_TIMEOUT_DELAY, cap=CONFIG.BIG_TIMEOUT_DELAY,
+                                      grace=CONFIG.BACKOFF_GRACE, jitter=CONFIG.BACKOFF_JITTER)
+            self.ingress = IngressQueue(CONFIG.NCS_QUEUE_SIZE, CONFIG.NCS_QUEUE_POLICY, CONFIG.NCS_QUEUE_DEADLINE)
+            self.scheduler = Scheduler(weights={URGENT: CONFIG.URGENT_WEIGHT, NCS: CONFIG.NCS_WEIGHT},
+                                       starvationLimit=CONFIG.STARVATION_LIMIT)
+            if CONFIG.CAPTURE_FILE and self.capture is None: self.startCapture(CONFIG.CAPTURE_FILE)
             log.info("Communication launched")
-            while True:  # TODO: replace this loop with proper timing-based scheduler
-                self.nativeData = self.deviceData = None
-                if (stopEvent.is_set()):
-                    log.info("Received stop communication command")
-                    break
-
-                with self.controlSoftErrorsHandler():
-                    if self.interactWithNativeSoft:
-                        self.nativeData = self.device.receiveNative(self.appInt)
-                    else:
-                        self.nativeData = self.device.IDLE_PAYLOAD
-                if self.nativeData is None: continue
-
-                self.nativeData = self.device.wrap(self.nativeData)
-                try:
-                    self.devInt.sendPacket(self.nativeData)
-                except SerialWriteTimeoutError:
-                    tlog.error(f"Failed to send data over '{self.devInt.token}' (device disconnected?)")
-                    self.notify('comm error')
-                    continue  # TODO: what needs to be done when unexpected error happens [2]?
-
-                with self.deviceErrorsHandler(stopEvent):
-                    self.deviceData = self.devInt.receivePacket()
-                if self.deviceData is None: continue
-
-                self.deviceData = self.device.unwrap(self.deviceData)
-                try:
-                    if self.interactWithNativeSoft and self.appInt.nTimeouts == 0:  # duck-tape-ish...
-                        self.device.sendNative(self.appInt, self.deviceData)
-                except SerialWriteTimeoutError:
-                    if self.nativeSoftConnEstablished is False:
-                        # ▼ Wait for native control soft to launch
-                        if self.appInt.nTimeouts == 1:
-                            tlog.info(f"Waiting for {self.device.name} native control soft to launch")
-                    else:
-                        tlog.error(f"Failed to send data over {self.appInt.token} "
-                                   f"(native communication soft disconnected?)")
-                        self.notify('comm error')
-                        # TODO: what needs to be done when unexpected error happens [3]?
-                self.notify('comm ok')
-
+            self.supervise(self.relayLoop, stopEvent, reopenDev=True)
         except SerialError as e:
             tlog.fatal(f"Transaction failed: {e}")
             tlog.debug('', traceback=True)
@@ -443,41 +559,298 @@ class App(Notifier):
             self.notify('comm failed')
         finally:
             self.appInt.close()
-            self.devInt.close()
+            self.devPort.close()
             self.appInt.nTimeouts = self.devInt.nTimeouts = 0
             self.commRunning = False
             self.notify('comm stopped')
             log.info("Communication stopped")
 
-    def ncsLoop(self, stopEvent: Event):
-        self.notify('comm started')
-        try:
-            log.debug('NCS loop launched')
-            while True:
-                if (stopEvent.is_set()):
-                    log.info("Received stop communication command")
-                    break
-                try:
-                    self.nativeData = self.device.receiveNative(self.appInt)
-                except SerialReadTimeoutError:
-                    log.debug("NCS timeout")
-                    continue
-                except (DataInvalidError, SerialCommunicationError) as e:
-                    log.debug(f"Bad packet from NCS - {e}")
-                    self.notify('comm error')
+    def relayLoop(self, stopEvent: Event):
+        """ Relay NCS commands to device and device replies back to NCS until stop is requested """
+        while True:
+            self.nativeData = self.deviceData = None
+            if (stopEvent.is_set()):
+                log.info("Received stop communication command")
+                return
+
+            device = self.device
+            nReplies = 0  # ◄ NCS expects replies only to its own commands
+            if self.devBackoff.active:
+                # ▼ Device does not reply — probe it with idle payload, leave NCS data unread
+                self.nativeData = device.IDLE_PAYLOAD
+                self.nProbes += 1
+            elif device.retransmission() is not None:
+                # ▼ Device has not consumed recent command — resend it right away instead of waiting for timeout
+                self.nativeData = device.retransmission()
+                self.nRetransmits += 1
+                tlog.debug(f"Retransmitting {device.name} command: [{bytewise(self.nativeData)}]")
+            else:
+                if self.interactWithNativeSoft:
+                    self.receiveIngress(stopEvent, wait=not self.scheduler.urgentPending)
+                if stopEvent.is_set(): continue
+                slot = self.scheduler.next(ncsPending=self.interactWithNativeSoft and len(self.ingress) > 0)
+                command = self.ingress.get() if slot == NCS else None
+                if command is not None:
+                    device, self.nativeData = command.source, command.data
+                    nReplies = 1 + self.coalesce(stopEvent, command)
+                    if self.answerFromCache(command, nReplies): continue
+                else:
+                    if slot == URGENT:
+                        tlog.debug(f"{device.name} parameters altered — dedicated transaction scheduled")
+                    else:
+                        if not self.idlePollDue(device): continue
+                        if self.interactWithNativeSoft:
+                            tlog.info(f"Using {device.name} idle payload: [{bytewise(device.IDLE_PAYLOAD)}]")
+                    self.nativeData = device.IDLE_PAYLOAD
+
+            with self.commLock:
+                if device is not self.device:
+                    tlog.info(f"Protocol changed to {self.device.name} — "
+                              f"packet from {device.name} native control soft discarded")
                     continue
+                if nReplies and self.txWindow is not None:
+                    self.relayWindow(stopEvent, nReplies)
                 else:
-                    state = self.transaction(data=self.nativeData, closePort=False)
-                if state is True:
+                    self.relayTransaction(stopEvent, nReplies)
+
+            # ▼ Wait outside of transaction lock, so protocol could be switched meanwhile
+            if self.devBackoff.delay: stopEvent.wait(self.devBackoff.delay)
+
+    def receiveIngress(self, stopEvent: Event, wait: bool = True):
+        """ Move NCS commands to ingress queue: wait for the next one if queue is empty (and `wait` is set),
+                then take commands already buffered by NCS port without waiting
+        """
+        device = self.device
+        self.ncsWaitCutShort = False
+        if wait and len(self.ingress) == 0:
+            self.ncsWaiting = True
+            startedAt = monotonic()
+            try:
+                with self.controlSoftErrorsHandler(stopEvent):
+                    self.ingress.put(self.receiveNative(device), device)
+            finally:
+                self.ncsWaiting = False
+                # ▼ Read has returned without NCS command well before timeout (e.g. stale .cancel_read())
+                timeout = self.appInt.timeout
+                self.ncsWaitCutShort = len(self.ingress) == 0 and (
+                        timeout is None or monotonic() - startedAt < timeout / 2)
+        # ▼ Limited, so that continuous NCS flood does not starve device transactions
+        for _ in range(self.ingress.maxsize):
+            if stopEvent.is_set() or not self.appInt.in_waiting: break
+            with self.controlSoftErrorsHandler(stopEvent):
+                self.ingress.put(self.receiveNative(device), device)
+
+    def idlePollDue(self, device: Device) -> bool:
+        """ Decide whether idle slot should be used for device polling
+            While all parameters are in sync and NCS is silent, device is polled only once per keep-alive interval
+                (slot is skipped after waiting for NCS command or parameter change, whichever comes first)
+        """
+        if CONFIG.KEEPALIVE_INTERVAL <= 0 or not all(par.inSync for par in device.params):
+            if self.keepAliveMode:
+                self.keepAliveMode = False
+                tlog.debug(f"{device.name} polling resumed at full rate")
+            return True
+        remaining = self.lastTransactionAt + CONFIG.KEEPALIVE_INTERVAL - monotonic()
+        if remaining <= 0: return True
+        if not self.keepAliveMode:
+            self.keepAliveMode = True
+            self.nSlowdowns += 1
+            tlog.debug(f"{device.name} is idle — polling every {CONFIG.KEEPALIVE_INTERVAL} sec")
+        self.nSkippedPolls += 1
+        # ▼ With NCS enabled, waiting happens in blocking NCS read on the next slot,
+        #   unless that read does not block (loop would spin then)
+        if not self.interactWithNativeSoft or self.ncsWaitCutShort: self.scheduler.sleep(remaining)
+        return False
+
+    def requestUrgentTransaction(self, *_):
+        """ Par 'altered' event handler — transfer parameter change to device in the very next slot """
+        if self.scheduler is None or not self.commRunning: return
+        self.scheduler.requestUrgent()
+        # ▼ Do not let comm loop sit waiting for NCS command meanwhile,
+        #   but let it finish the frame NCS has already started to send
+        if self.ncsWaiting and self.appInt.is_open and self.appInt.in_waiting == 0:
+            try: self.appInt.cancel_read()
+            except (AttributeError, NotImplementedError, SerialError) as e:
+                log.debug(f"Cannot cancel pending NCS read: {e}")
+
+    def coalesce(self, stopEvent: Event, command) -> int:
+        """ Merge duplicates of idempotent NCS `command` received within CONFIG.COALESCE_WINDOW sec after it
+                into its transaction, return their number
+            Transaction waits for the rest of the window, unless parameter change is pending
+        """
+        if CONFIG.COALESCE_WINDOW <= 0: return 0
+        device = command.source
+        if device.commandType(command.data) not in device.IDEMPOTENT_COMMANDS: return 0
+        window = CONFIG.COALESCE_WINDOW
+        remaining = command.received + window - monotonic()
+        if remaining > 0 and not self.scheduler.urgentPending:
+            self.scheduler.sleep(remaining)  # ◄ woken up by parameter change or stop request
+            if self.interactWithNativeSoft: self.receiveIngress(stopEvent, wait=False)
+            # ▼ Commands buffered by NCS port during the window are timestamped only when taken from it
+            window = monotonic() - command.received
+        nMerged = self.ingress.coalesce(command, window)
+        if nMerged: tlog.debug(f"{nMerged} identical {device.name} NCS commands merged into one transaction")
+        return nMerged
+
+    def answerFromCache(self, command, nReplies: int) -> bool:
+        """ Reply to NCS `command` from reply cache without device transaction, return False on cache miss """
+        cache = self.replyCache
+        if cache.device is not command.source: return False
+        reply = cache.lookup(command.data)
+        if reply is None: return False
+        if self.tracing: self.trace(Direction.EVENT, f"cached reply={reply.hex()}".encode())
+        try:
+            for _ in range(nReplies): self.sendNative(cache.device, reply)
+        except SerialWriteTimeoutError:
+            tlog.error(f"Failed to send data over {self.appInt.token} (native communication soft disconnected?)")
+            self.notify('comm error')
+        return True
+
+    def invalidateReplyCache(self, *_):
+        """ Par 'altered' / 'new' event handler — cached replies report device state that is about to change
+                or has changed already
+        """
+        cache = self.replyCache
+        if cache is not None: cache.invalidate()
+
+    def relayTransaction(self, stopEvent: Event, nReplies: int = 0):
+        """ Forward obtained native data to device and send device reply back to native control soft
+                `nReplies` times (several identical NCS commands could be merged into one transaction)
+        """
+        command = self.nativeData
+        self.lastTransactionAt = monotonic()
+        self.nativeData = self.device.wrap(self.nativeData)
+        sentAt = perf_counter()
+        try:
+            self.sendToDevice(self.nativeData)
+        except SerialWriteTimeoutError:
+            tlog.error(f"Failed to send data over '{self.devInt.token}' (device disconnected?)")
+            self.notify('comm error')
+            return  # TODO: what needs to be done when unexpected error happens [2]?
+
+        with self.deviceErrorsHandler(stopEvent):
+            self.deviceData = self.receiveReply(sentAt)
+        if self.deviceData is None: return
+
+        self.deviceData = self.device.unwrap(self.deviceData)
+        if self.device.retransmission() is not None:
+            # ▼ Reply does not relate to NCS command yet — answer NCS once command is consumed
+            self.deferredReplies += nReplies
+            nReplies = 0
+        else:
+            nReplies += self.deferredReplies
+            self.deferredReplies = 0
+            self.replyCache.store(command, self.deviceData)
+        if self.interactWithNativeSoft and nReplies: self.replyNative(nReplies)
+        self.notify('comm ok')
+
+    def relayWindow(self, stopEvent: Event, nReplies: int):
+        """ Relay obtained NCS command along with the following queued ones, keeping up to CONFIG.TX_WINDOW
+                of them in flight — device replies are matched to commands by sequence number
+        """
+        device, window = self.device, self.txWindow
+        backlog = deque([(self.nativeData, nReplies)])
+        try:
+            while backlog or window:
+                if stopEvent.is_set(): return
+                while backlog and not window.full:
+                    data, nReplies = backlog.popleft()
+                    packet = device.wrap(data)
+                    self.lastTransactionAt = monotonic()
                     try:
-                        self.device.sendNative(self.appInt, self.deviceData)
+                        self.sendToDevice(packet)
                     except SerialWriteTimeoutError:
-                        log.error("NCS write timeout")
+                        tlog.error(f"Failed to send data over '{self.devInt.token}' (device disconnected?)")
                         self.notify('comm error')
-                if self.appInt.in_waiting == 0:
-                    self.devInt.close()
-                else:
-                    self.appInt.reset_input_buffer()
+                        return
+                    window.add(Request(device.sequenceNumber(packet), data, nReplies, perf_counter(), packet))
+                    if not backlog and not self.scheduler.urgentPending:
+                        following = self.nextWindowCommand(stopEvent, device)
+                        if following is not None: backlog.append(following)
+
+                self.deviceData = None
+                nTimeouts = self.devInt.nTimeouts
+                with self.deviceErrorsHandler(stopEvent):
+                    # ▼ RTT is sampled once reply is matched — it may answer other request than the oldest one
+                    oldest = window.oldest()
+                    reply = self.receiveReply(oldest.sentAt, oldest.packet, sample=False)
+                    seq, self.deviceData = device.sequenceNumber(reply), device.unwrap(reply)
+                if self.deviceData is None:
+                    if self.devInt.nTimeouts > nTimeouts:
+                        # ▼ Reply to the oldest request has not arrived within timeout, later ones still may
+                        window.lose(oldest)
+                        tlog.warning(f"Reply to {device.name} command #{oldest.seq} is lost")
+                    if self.devBackoff.active: return
+                    continue
+
+                request = window.match(seq)
+                if request is None:
+                    tlog.debug(f"Stray {device.name} reply #{seq} discarded")
+                    continue
+                rtt = perf_counter() - request.sentAt
+                self.recordFlight(FlightRecorder.OK, reply, rtt, request.packet)
+                self.adaptDeviceTimeout(self.devTimer.sample(rtt))
+                self.replyCache.store(request.data, self.deviceData)
+                if self.interactWithNativeSoft: self.replyNative(request.nReplies)
+                self.notify('comm ok')
+        finally:
+            self.drainWindow(device, window)
+
+    def drainWindow(self, device: Device, window: TxWindow):
+        """ Collect replies still in flight, waiting one reply timeout at most
+            Replies arriving later are told from replies to the following transactions by sequence number,
+                so input buffer is not flushed
+        """
+        deadline = perf_counter() + (self.devInt.timeout or 0)
+        try:
+            while window and perf_counter() < deadline:
+                try:
+                    reply = self.devInt.receivePacket()
+                except SerialReadTimeoutError:
+                    break
+                except SerialCommunicationError:
+                    continue
+                request = window.match(device.sequenceNumber(reply))
+                if request is not None:
+                    self.trace(Direction.DEV_IN, reply)
+                    self.recordFlight(FlightRecorder.OK, reply, perf_counter() - request.sentAt, request.packet)
+                    device.unwrap(reply)  # ◄ device state is still updated, NCS is not answered anymore
+        except (SerialError, DataInvalidError) as e:
+            tlog.debug(f"Failed to drain {device.name} replies in flight: {e}")
+        finally:
+            window.expire(float('inf'))
+
+    def nextWindowCommand(self, stopEvent: Event, device: Device):
+        """ Take next queued NCS command to be sent without waiting for replies in flight
+            Returns (command data, NCS replies count) or None if there is no such command
+        """
+        self.receiveIngress(stopEvent, wait=False)
+        while True:
+            command = self.ingress.get()
+            if command is None or command.source is not device: return None
+            nReplies = 1 + self.coalesce(stopEvent, command)
+            if not self.answerFromCache(command, nReplies): return command.data, nReplies
+
+    def replyNative(self, nReplies: int):
+        """ Send device reply data to native control soft `nReplies` times """
+        try:
+            for _ in range(nReplies): self.sendNative(self.device, self.deviceData)
+        except SerialWriteTimeoutError:
+            if self.nativeSoftConnEstablished is False:
+                # ▼ Wait for native control soft to launch
+                if self.appInt.nTimeouts == 1:
+                    tlog.info(f"Waiting for {self.device.name} native control soft to launch")
+            else:
+                tlog.error(f"Failed to send data over {self.appInt.token} "
+                           f"(native communication soft disconnected?)")
+                self.notify('comm error')
+                # TODO: what needs to be done when unexpected error happens [3]?
+
+    def ncsLoop(self, stopEvent: Event):
+        self.notify('comm started')
+        try:
+            log.debug('NCS loop launched')
+            self.supervise(self.monitorLoop, stopEvent, reopenDev=False)
         except SerialError as e:
             tlog.fatal(f"Transaction failed: {e}")
             tlog.debug('', traceback=True)
@@ -488,55 +861,317 @@ class App(Notifier):
             self.notify('comm failed')
         finally:
             self.appInt.close()
-            self.devInt.close()
+            self.devPort.close()
             self.notify('comm stopped')
             log.info("NCS loop stopped")
 
-    def transaction(self, *_, data=None, closePort=True):
-        with self.device.lock:
+    def monitorLoop(self, stopEvent: Event):
+        """ Perform device transaction on each NCS command until stop is requested """
+        while True:
+            if (stopEvent.is_set()):
+                log.info("Received stop communication command")
+                return
+            try:
+                self.nativeData = self.receiveNative(self.device)
+            except SerialReadTimeoutError:
+                if not stopEvent.is_set(): log.debug("NCS timeout")
+                continue
+            except (DataInvalidError, SerialCommunicationError) as e:
+                log.debug(f"Bad packet from NCS - {e}")
+                self.notify('comm error')
+                continue
+            else:
+                state = self.transaction(data=self.nativeData)
+            if state is True:
+                try:
+                    self.sendNative(self.device, self.deviceData)
+                except SerialWriteTimeoutError:
+                    log.error("NCS write timeout")
+                    self.notify('comm error')
+            if self.appInt.in_waiting != 0:
+                self.appInt.reset_input_buffer()
+
+    def supervise(self, loop: Callable, stopEvent: Event, reopenDev: bool):
+        """ Run subject `loop`, resume it each time communication is restored after port loss """
+        while True:
+            try:
+                return loop(stopEvent)
+            except (SerialError, OSError) as e:
+                if not CONFIG.AUTO_RECONNECT or stopEvent.is_set(): raise
+                if not self.reconnect(stopEvent, e, reopenDev): return
+
+    def reconnect(self, stopEvent: Event, error: Exception, reopenDev: bool) -> bool:
+        """ Close ports and poll them until they reappear, then reopen with the same settings
+            Device state (params and props) is left intact
+            Returns True if ports are reopened, False if stop has been requested meanwhile
+        """
+        tlog.error(f"Communication lost: {error}")
+        tlog.debug('', traceback=True)
+        self.notify('comm lost')
+        lostAt = monotonic()
+        self.lastLoss = str(error)
+        self.appInt.close()
+        self.devPort.close()
+
+        nAttempts = 0
+        while not stopEvent.wait(CONFIG.RECONNECT_PERIOD):
+            nAttempts += 1
+            try:
+                self.appInt.open()
+                if reopenDev: self.devPort.acquire()
+            except (SerialError, OSError) as e:
+                self.appInt.close()
+                self.devPort.close()
+                if nAttempts == 1:
+                    tlog.info("Waiting for ports to reappear...")
+                tlog.debug(f"Reconnection attempt #{nAttempts} failed: {e}")
+                continue
+            downtime = monotonic() - lostAt
+            self.nReconnects += 1
+            self.totalDowntime += downtime
+            self.maxDowntime = max(self.maxDowntime, downtime)
+            self.appInt.nTimeouts = self.devInt.nTimeouts = 0
+            tlog.info(f"Communication restored after {downtime:.1f} sec ({nAttempts} attempts)")
+            self.notify('comm restored')
+            return True
+        return False
+
+    def performTransaction(self, data: bytes = None) -> bytes:
+        """ Perform single device transaction with given payload (idle payload if omitted)
+            Device port is opened if needed and closed only after idle timeout
+            Returns unwrapped device reply data, raises transaction error on failure
+        """
+        with self.commLock, self.devPort:
             if data is None: data = self.device.IDLE_PAYLOAD
-            data = self.device.wrap(data)
+            try:
+                sentAt = perf_counter()
+                self.sendToDevice(self.device.wrap(data))
+                self.deviceData = self.device.unwrap(self.receiveReply(sentAt))
+            except SerialReadTimeoutError:
+                self.notify('comm timeout')
+                raise
+            except SerialWriteTimeoutError:
+                self.notify('comm error')
+                raise
+            self.notify('comm ok')
+            return self.deviceData
+
+    def bulkTransfer(self, data: bytes, transceiver=None, stopEvent: Event = None) -> Tuple[bytes, BulkReport]:
+        """ Transfer large data block (calibration table, firmware image, etc.) to device in max-size packets
+            Device interface is used unless another `transceiver` is given (e.g. simulated device)
+            Transfer is interrupted (BulkInterrupted) by `stopEvent` or, if it is not given, by communication stop
+            Returns device replies data joined together and transfer report, raises transaction error on failure
+        """
+        transfer = BulkTransfer(transceiver or self.devInt, self.device,
+                                CONFIG.BULK_CHUNK_SIZE, CONFIG.BULK_PIPELINE_DEPTH)
+        stopEvent = stopEvent or self.stopEvent
+        if transceiver is not None:
+            replies, self.lastBulkReport = transfer.run(data, stopEvent)
+            return replies, self.lastBulkReport
+        with self.commLock, self.devPort:
+            # ▼ Adaptive timeout is tuned for short packets — reply to max-size packet takes much longer
+            timeout = self.devInt.timeout
+            self.devInt.timeout = transfer.replyTimeout(CONFIG.DEVICE_TIMEOUT)
+            try:
+                replies, self.lastBulkReport = transfer.run(data, stopEvent)
+            finally:
+                self.devInt.timeout = timeout
+            return replies, self.lastBulkReport
+
+    def receiveReply(self, sentAt: float, packet: bytes = None, sample: bool = True) -> bytes:
+        """ Receive device reply to `packet` (most recently sent one by default)
+                and adapt reply timeout to round-trip time measured from `sentAt`
+            `sample` is False ––► reply is matched to its request by caller,
+                which samples round-trip time and records the transaction itself
+        """
+        try:
+            reply = self.devInt.receivePacket()
+        except SerialReadTimeoutError:
+            self.trace(Direction.DEV_IN, b'', ERROR_TIMEOUT)
+            self.recordFlight(FlightRecorder.TIMEOUT, b'', perf_counter() - sentAt, packet)
+            self.adaptDeviceTimeout(self.devTimer.backoff(), urgent=True)
+            raise
+        except SerialCommunicationError as e:
+            data = getattr(e, 'data', None) or b''
+            self.trace(Direction.DEV_IN, data, ERROR_BAD_DATA)
+            self.recordFlight(FlightRecorder.BAD_REPLY, data, perf_counter() - sentAt, packet)
+            raise
+        self.trace(Direction.DEV_IN, reply)
+        if sample:
+            rtt = perf_counter() - sentAt
+            self.recordFlight(FlightRecorder.OK, reply, rtt, packet)
+            self.adaptDeviceTimeout(self.devTimer.sample(rtt))
+        return reply
+
+    def sendToDevice(self, packet: bytes):
+        self.trace(Direction.DEV_OUT, packet)
+        startedAt = perf_counter()
+        try:
+            self.devInt.sendPacket(packet)
+        except SerialWriteTimeoutError:
+            # ▼ There will be no reply, so transaction is recorded right away
+            self.sentPacket, self.writeTime = packet, perf_counter() - startedAt
+            self.recordFlight(FlightRecorder.WRITE_FAILED, b'', 0)
+            raise
+        self.sentPacket, self.writeTime = packet, perf_counter() - startedAt
+
+    def recordFlight(self, outcome: int, reply: bytes, replyTime: float, packet: bytes = None):
+        """ Record device transaction of `packet` (most recently sent one by default)
+                to flight recorder (if it is enabled)
+        """
+        if self.flightRecorder is None: return
+        if packet is None: packet = self.sentPacket
+        self.flightRecorder.record(outcome, self.device.DEV_ADDRESS, packet, reply,
+                                   self.writeTime, replyTime, self.devInt.timeout or 0)
+
+    def dumpFlightRecorder(self, *_, reason: str = 'comm failed') -> str:
+        """ Dump flight recorder to a new file in CONFIG.FLIGHT_DUMP_FOLDER, return file path (None on failure)
+            Also used as 'comm failed' event handler
+        """
+        if self.flightRecorder is None: return None
+        folder = CONFIG.FLIGHT_DUMP_FOLDER or dirname(ProtocolLoader.path)
+        path = joinpath(folder, f"flight_{datetime.now():%Y%m%d_%H%M%S_%f}.txt")
+        try:
+            makedirs(folder, exist_ok=True)
+            self.flightRecorder.dump(path, reason)
+        except OSError as e:
+            log.error(f"Failed to dump flight recorder to {path}: {e}")
+            return None
+        return path
+
+    def receiveNative(self, device: Device) -> bytes:
+        data = device.receiveNative(self.appInt, self.stopEvent)
+        if self.tracing: self.trace(Direction.NCS_IN, device.nativeCommandFrame(data))
+        return data
+
+    def sendNative(self, device: Device, data: bytes):
+        if self.tracing: self.trace(Direction.NCS_OUT, device.nativeReplyFrame(data))
+        device.sendNative(self.appInt, data)
+
+    def trace(self, direction: Direction, data: bytes, error: int = ERROR_NONE):
+        """ Record frame to traffic capture (if it is running) and publish it to tap subscribers (if any) """
+        capture = self.capture
+        if capture is not None: capture.record(direction, data, error, self.device.DEV_ADDRESS)
+        if self.tap.subscribers: self.tap.publish(direction, data, error, self.device.DEV_ADDRESS)
+
+    @property
+    def tracing(self) -> bool:
+        """ Whether there is someone to receive traced traffic (capture or tap subscribers) """
+        return self.capture is not None or bool(self.tap.subscribers)
+
+    def traceAltered(self, name: str, value):
+        """ Par 'altered' event handler — record parameter changes along with traffic """
+        if self.tracing: self.trace(Direction.EVENT, f"altered {name}={value}".encode())
+
+    def traceNew(self, name: str, value):
+        """ Par 'new' event handler — record device parameter changes along with traffic """
+        if self.tracing: self.trace(Direction.EVENT, f"new {name}={value}".encode())
+
+    def startCapture(self, path: str):
+        """ Record traffic on both proxy sides to capture file `path` (see capture.py for export tools) """
+        self.stopCapture()
+        self.capture = CaptureWriter(path, codec=CONFIG.CAPTURE_CODEC).start()
+
+    def stopCapture(self):
+        if self.capture is None: return
+        capture, self.capture = self.capture, None
+        capture.close()
+
+    def adaptDeviceTimeout(self, timeout: float, urgent: bool = False):
+        """ Apply estimated device reply timeout to device port, at most once per CONFIG.TIMEOUT_ADAPT_INTERVAL
+                (`urgent` ––► at once, e.g. timeout is backed off after device has not replied)
+        """
+        if not CONFIG.ADAPTIVE_TIMEOUT: return
+        now = monotonic()
+        recent = self.timeoutAdaptedAt is not None and now - self.timeoutAdaptedAt < CONFIG.TIMEOUT_ADAPT_INTERVAL
+        if recent and not urgent: return
+        timeout = max(timeout, self.devTimer.floor)
+        # ▼ Changing timeout reconfigures the port, so ignore insignificant changes
+        if abs(self.devInt.timeout - timeout) > self.devInt.timeout * 0.1:
+            self.devInt.timeout = timeout
+            self.timeoutAdaptedAt = now
+
+    def submitTransaction(self, data: bytes = None) -> Future:
+        """ Schedule device transaction on I/O thread and return immediately
+            Device port is kept open while transactions continue (see CONFIG.PORT_IDLE_TIMEOUT)
+            Returned future resolves to unwrapped device reply data or raises transaction error
+        """
+        if self.ioWorker is None:
+            self.ioWorker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="IO thread")
+        future = self.ioWorker.submit(self.performTransaction, data)
+        future.add_done_callback(self.logTransactionFailure)
+        return future
+
+    @staticmethod
+    def logTransactionFailure(future: Future):
+        if future.cancelled(): return
+        error = future.exception()
+        if error is None: return
+        if isinstance(error, SerialReadTimeoutError):
+            log.warning("Device timeout")
+        elif isinstance(error, SerialWriteTimeoutError):
+            tlog.error("Device write timeout")
+        else:
+            log.error(f"Transaction failed - {error}")
+
+    def transaction(self, *_, data=None):
+        with self.commLock:
             port = self.devInt.port
 
-            if self.devInt.is_open is False:
-                try:
-                    self.devInt.open()
-                except SerialError as e:
-                    log.error(f"Transaction failed - cannot open port '{port}' - {e}")
-                    log.debug('', traceback=True)
-                    return False
             try:
-                self.devInt.sendPacket(data)
+                self.devPort.acquire()
+            except SerialError as e:
+                log.error(f"Transaction failed - cannot open port '{port}' - {e}")
+                log.debug('', traceback=True)
+                return False
+            try:
+                self.performTransaction(data)
             except SerialWriteTimeoutError:
                 tlog.error(f"Device write timeout ({port})")
-                self.notify('comm error')
                 return False
-            try:
-                self.deviceData = self.device.unwrap(self.devInt.receivePacket())
             except SerialReadTimeoutError:
                 log.warning("Device timeout")
-                self.notify('comm timeout')
             except (DataInvalidError, SerialError) as e:
                 log.error(f"Transaction failed - {e}")
                 log.debug('', traceback=True)
             else:
-                self.notify('comm ok')
                 return True
             finally:
-                if closePort: self.devInt.close()
+                self.devPort.release()
 
     def ackTransaction(self, *_, limit=1000):
-        try:
-            for _ in range(limit):
-                self.transaction(closePort=False)
-                if self.deviceData is None: return None
-                if all(par.inSync for par in self.device.params): break
-            else:
-                failedParams = (par.name for par in self.device.params if not par.inSync)
-                log.error(f"Failed to get ack for {self.device.name} params {', '.join(failedParams)} " 
-                          f"after {limit} attempts")
-        finally:
-            self.devInt.close()
+        for _ in range(limit):
+            self.transaction()
+            if self.deviceData is None: return None
+            if all(par.inSync for par in self.device.params): break
+        else:
+            failedParams = (par.name for par in self.device.params if not par.inSync)
+            log.error(f"Failed to get ack for {self.device.name} params {', '.join(failedParams)} " 
+                      f"after {limit} attempts")
+
+    def stats(self) -> Dict[str, dict]:
+        """ Collect runtime statistics of communication components """
+        stats = {}
+        if self.devPort: stats['device port'] = self.devPort.stats()
+        if self.devTimer: stats['device timeout'] = self.devTimer.stats()
+        if self.devBackoff: stats['device backoff'] = dict(self.devBackoff.stats(), probes=self.nProbes)
+        if self.ingress is not None: stats['ncs ingress'] = self.ingress.stats()
+        if self.replyCache is not None: stats['reply cache'] = self.replyCache.stats()
+        if self.scheduler: stats['scheduler'] = self.scheduler.stats()
+        if self.txWindow is not None: stats['tx window'] = self.txWindow.stats()
+        if self.capture is not None: stats['capture'] = self.capture.stats()
+        if self.flightRecorder is not None: stats['flight recorder'] = self.flightRecorder.stats()
+        if self.tap.subscribers: stats['tap'] = self.tap.stats()
+        if self.tapServer: stats['tap server'] = self.tapServer.stats()
+        if self.lastBulkReport: stats['bulk'] = dict(self.lastBulkReport._asdict(),
+                                                     throughput=self.lastBulkReport.throughput)
+        stats['retransmit'] = dict(retransmits=self.nRetransmits, deferredReplies=self.deferredReplies)
+        stats['polling'] = dict(mode='keep-alive' if self.keepAliveMode else 'full',
+                                keepAliveInterval=CONFIG.KEEPALIVE_INTERVAL,
+                                slowdowns=self.nSlowdowns, skipped=self.nSkippedPolls)
+        stats['supervisor'] = dict(reconnects=self.nReconnects, downtime=self.totalDowntime,
+                                   maxDowntime=self.maxDowntime, lastLoss=self.lastLoss)
+        return stats
 
     def suppressLoggers(self, mode: Union[str, bool] = None) -> Union[str, bool]:
         isAltered = not all((Logger.all[loggerName].levelname == level
@@ -577,13 +1212,16 @@ class App(Notifier):
 
         commandsHelp = {
             'h': ("h [command]", "show help"),
-            'show': ("show [int|dev|config|app|log]", "show current state of specified parameter"),
+            'show': ("show [int|dev|config|app|log|stats]", "show current state of specified parameter"),
             's': ("s", "start/stop communication"),
             'r': ("r", "restart communication"),
             'com': ("com [<in|out> <new_COM_port_number>]", "change internal/device com port"),
             'p': ("p <device_name>", "change protocol"),
             'n': ("n", "enable/disable transactions with native control soft"),
             'so': ("so <mode>", "set transactions output suppression"),
+            'fr': ("fr [dump]", "show flight recorder state / dump recent device transactions to file"),
+            'cap': ("cap [<file>|off|find <time> [<span>]]", "start/stop traffic capture to file, "
+                                                            "show captured packets around given time"),
             'e': ("e", "exit app"),
             'd': ("d <parameter_shortcut> [new_value]", "show/set device parameter"),
             'log': ("log [<logger_name>, <new_level>]", "set logging level to specified logger"),
@@ -697,6 +1335,8 @@ class App(Notifier):
                         cmd.info(NotImplemented)
                     elif elem in ('l', 'log'):
                         cmd.info(', '.join(f"{logName} = {level}" for logName, level in self.loggerLevels.items()))
+                    elif elem in ('st', 'stats'):
+                        cmd.info(f"Statistics: {formatDict(self.stats())}")
                     elif elem in ('e', 'events'):
                         handlersDict = {e:[h.__name__ for h in handlers] for e, handlers in Notifier.events.items()}
                         cmd.info(f"Event handlers: {formatDict(handlersDict)}")
@@ -735,12 +1375,12 @@ class App(Notifier):
                     if self.commRunning:
                         if self.suppressLoggers():
                             cmd.info(self.suppressLoggers(False))
-                        self.stopComm()
-                        self.startComm()
+                        with self.restartNeeded(): pass
                     else: cmd.info("Cannot restart communication — not running currently")
 
                 elif command in ('n', 'native'):
                     self.interactWithNativeSoft = not self.interactWithNativeSoft
+                    if self.scheduler: self.scheduler.wake()
                     cmd.info(f"{'Enabled' if self.interactWithNativeSoft else 'Disabled'} "
                              f"interaction with {self.device.name} native control soft")
 
@@ -795,6 +1435,38 @@ class App(Notifier):
                             except ValueError as e: raise CommandError(e)
                             cmd.info(f"{self.device.name}.{par}")
 
+                elif command == 'fr':
+                    if self.flightRecorder is None:
+                        raise CommandError("Flight recorder is disabled (see CONFIG.FLIGHT_RECORDER_SIZE)")
+                    if len(params) == 1:
+                        cmd.info(f"Flight recorder: {self.flightRecorder.stats()}")
+                    elif params[1] == 'dump':
+                        path = self.dumpFlightRecorder(reason='on demand')
+                        if path is None: raise ApplicationError("Failed to dump flight recorder")
+                        cmd.info(f"Flight recorder dumped to {path}")
+                    else: raise CommandError("Wrong parameters")
+
+                elif command in ('cap', 'capture'):
+                    if len(params) == 1:
+                        cmd.info(f"Capture: {self.capture.stats() if self.capture else 'off'}")
+                    elif params[1] == 'off':
+                        if self.capture is None: raise CommandError("Capture is not running")
+                        self.stopCapture()
+                    elif params[1] == 'find':
+                        if self.capture is None: raise CommandError("Capture is not running")
+                        if len(params) < 3: raise CommandError("Specify time ('HH:MM:SS[.ffffff]')")
+                        self.capture.flush()  # ◄ otherwise the latest records are not in the file yet
+                        reader = CaptureReader(self.capture.path)
+                        try:
+                            center = parseTime(params[2], reader.startTime)
+                            span = int(float(params[3]) * 1e9) if len(params) > 3 else 1_000_000_000
+                        except ValueError as e: raise CommandError(e)
+                        for record in reader.query(center - span, center + span): cmd.info(record)
+                    else:
+                        try: self.startCapture(params[1])
+                        except OSError as e: raise CommandError(f"Cannot create capture file: {e}")
+                        cmd.info(f"Capturing traffic to {self.capture.path}")
+
                 elif command in ('so', 'supp', 'sl'):
                     if not self.commRunning:
                         raise CommandError(f"Output suppression is used only while communication is running")
@@ -0,0 +1,277 @@
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from os.path import abspath, dirname, isfile, join as joinpath
+from threading import Thread, Event
+from time import perf_counter, process_time, sleep
+from typing import Dict, List, NamedTuple, Optional
+
+from Utils import Logger
+
+from loadgen import LoadGenerator, PROTOCOLS
+from simulator import Simulator, SIMULATORS, Faults, PtyPort
+
+log = Logger("Benchmark")
+log.setLevel('DEBUG')
+
+# End-to-end proxy benchmark: App runs headless in a child process (so that its CPU time and memory are measured
+#   alone), simulated device and NCS load generator are attached to it via pseudo-terminals in this process
+# Results are stored as JSON and compared against baseline given by --baseline (see THRESHOLDS)
+# Baseline has to be produced on the reference machine with --save-baseline — numbers from other hardware
+#   are not comparable, so no baseline is shipped and comparison is opt-in (missing baseline file is an error)
+
+BASELINE_PATH = joinpath(dirname(abspath(__file__)), 'res', 'benchmark_baseline.json')
+
+# Child process protocol: parent sends commands via stdin, child answers with marked stdout lines
+READY = 'BENCH READY'
+MEASURING = 'BENCH MEASURING'
+RESULT = 'BENCH RESULT '
+FAILED = 'BENCH FAILED '
+
+NATIVE_MIXES = {'sony': 'mixed', 'mwxc': 'varying'}  # load generator command mix for each protocol
+
+
+class Scenario(NamedTuple):
+    description: str
+    ncs: bool = True  # interact with NCS (CONFIG.NATIVE_SOFT_COMM)
+    smart: bool = False  # smart mode: transaction per NCS command and parameter change
+    load: Optional[str] = 'closed'  # load generator mode, None ––► no NCS load
+    rate: float = 0  # commands per sec for 'fixed' and 'open' load modes
+    stormRate: float = 0  # parameter changes per sec
+    faults: Faults = Faults()  # device line faults
+    config: dict = {}  # app CONFIG overrides
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    'idle': Scenario("Device polling at full rate, NCS is off", ncs=False, load=None,
+                     config=dict(KEEPALIVE_INTERVAL=0)),
+    'passthrough': Scenario("NCS commands relayed back-to-back"),
+    'smart': Scenario("Smart mode, device transaction per NCS command", smart=True),
+    'storm': Scenario("Open-loop NCS load along with parameter changes storm", load='open', rate=200, stormRate=100),
+    'noisy': Scenario("NCS commands relayed over noisy device line",
+                      faults=Faults(badCrc=0.02, truncated=0.01, junkPrefix=0.05, dropReply=0.01)),
+}
+
+
+class Threshold(NamedTuple):
+    higherIsBetter: bool
+    tolerance: float  # relative change allowed in the worse direction
+    slack: float = 0  # absolute change always allowed (for metrics near zero)
+
+
+THRESHOLDS: Dict[str, Threshold] = {
+    'deviceThroughput': Threshold(True, 0.10),
+    'ncsThroughput': Threshold(True, 0.10),
+    'p50': Threshold(False, 0.25, 0.1),  # ms
+    'p99': Threshold(False, 0.50, 0.5),  # ms
+    'p999': Threshold(False, 1.00, 1.0),  # ms
+    'cpuPerTx': Threshold(False, 0.15, 5),  # µs
+    'rssGrowth': Threshold(False, 0.50, 1024),  # KiB
+}
+
+
+def residentMemory() -> Optional[int]:
+    """ Current process resident set size, KiB (None where it cannot be obtained) """
+    try:
+        with open('/proc/self/statm') as file: pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    from resource import getpagesize
+    return pages * getpagesize() // 1024
+
+
+# ———————————————————————————————————————————— Child process (App) ————————————————————————————————————————————
+
+def serveApp(protocol: str, scenarioName: str, devicePath: str, ncsPath: str):
+    """ Run App headless on given lines, measure own CPU time and memory between parent's commands """
+    from tempfile import TemporaryDirectory
+    from Utils import ConfigLoader
+    from app import App, CONFIG, ProtocolLoader
+
+    scenario = SCENARIOS[scenarioName]
+    with TemporaryDirectory() as folder:
+        # ▼ Benchmark should neither read nor overwrite user config
+        ConfigLoader.path = folder
+        ProtocolLoader.path = joinpath(dirname(abspath(__file__)), 'devices')
+        INFO = dict(version='[benchmark]', projectname='ProtocolProxy', projectdir=dirname(abspath(__file__)))
+        with App(INFO) as app:
+            CONFIG.APP_COM_PORT, CONFIG.DEV_COM_PORT = ncsPath, devicePath
+            CONFIG.NATIVE_SOFT_COMM = app.interactWithNativeSoft = scenario.ncs
+            for name, value in scenario.config.items(): setattr(CONFIG, name, value)
+            app.init()
+            app.suppressLoggers('kill')
+            app.setProtocol(protocol)
+            if scenario.smart:
+                app.addHandler('altered', app.ackTransaction)
+                started = app.enableSmart()
+            else:
+                started = app.startComm()
+            if not started:
+                print(f"{FAILED}communication has not started", flush=True)
+                return
+
+            stopEvent = Event()
+            if scenario.stormRate:
+                def storm():
+                    device = app.device
+                    while not stopEvent.wait(1 / scenario.stormRate):
+                        device.POWER = not device.POWER
+                Thread(name='Parameter storm', target=storm, daemon=True).start()
+
+            print(READY, flush=True)
+            cpu = rss = None
+            for line in sys.stdin:
+                command = line.strip()
+                if command == 'measure':
+                    cpu, rss = process_time(), residentMemory()
+                    print(MEASURING, flush=True)
+                elif command == 'stop':
+                    cpu, rssEnd = process_time() - cpu, residentMemory()
+                    rssGrowth = rssEnd - rss if rss is not None and rssEnd is not None else None
+                    print(RESULT + json.dumps(dict(cpu=cpu, rssGrowth=rssGrowth, rss=rssEnd, stats=app.stats()),
+                                              default=str), flush=True)
+                    break
+            stopEvent.set()
+            if scenario.smart: app.disableSmart()
+            else: app.stopComm()
+
+
+# ———————————————————————————————————————————— Parent process (runner) ————————————————————————————————————————————
+
+def expect(child: subprocess.Popen, marker: str) -> str:
+    """ Read child output until line starting with `marker`, return the rest of that line """
+    for line in child.stdout:
+        if line.startswith(FAILED): raise RuntimeError(f"Benchmark app failed: {line[len(FAILED):].strip()}")
+        if line.startswith(marker): return line[len(marker):].strip()
+    raise RuntimeError(f"Benchmark app exited unexpectedly (code {child.wait()})")
+
+
+def runScenario(protocol: str, scenarioName: str, duration: float, warmup: float) -> dict:
+    scenario = SCENARIOS[scenarioName]
+    simDevice = SIMULATORS[protocol]()
+    simulator = Simulator([simDevice], latency=0.001, jitter=0.0005, faults=scenario.faults, seed=1,
+                          baudrate=simDevice.deviceClass.DEV_BAUDRATE).start()
+    ncsLine = PtyPort()
+    child = subprocess.Popen([sys.executable, abspath(__file__), '--child', protocol, scenarioName,
+                              simulator.path, ncsLine.path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             text=True)
+    try:
+        expect(child, READY)
+        generator = None
+        if scenario.load:
+            nativeProtocol = PROTOCOLS[protocol]()
+            generator = LoadGenerator(nativeProtocol, ncsLine, scenario.load, scenario.rate or 100,
+                                      NATIVE_MIXES[protocol], timeout=0.5, seed=1)
+            generator.run(duration=warmup)
+        else:
+            sleep(warmup)
+
+        child.stdin.write('measure\n')
+        child.stdin.flush()
+        expect(child, MEASURING)
+        startedAt, commandsBefore = perf_counter(), simulator.nCommands
+        report = None
+        if generator: report = generator.run(duration=duration)
+        else: sleep(duration)
+        elapsed, commands = perf_counter() - startedAt, simulator.nCommands - commandsBefore
+        child.stdin.write('stop\n')
+        child.stdin.flush()
+        measured = json.loads(expect(child, RESULT))
+        child.stdin.close()
+        child.wait(timeout=10)
+    finally:
+        if child.poll() is None: child.kill()
+        simulator.stop()
+        ncsLine.close()
+
+    result = dict(deviceThroughput=round(commands / elapsed, 1),
+                  cpuPerTx=round(measured['cpu'] / commands * 1e6, 1) if commands else None,
+                  rssGrowth=measured['rssGrowth'], rss=measured['rss'], deviceCommands=commands,
+                  simulator=dict(badBytes=simulator.nBadBytes, faults=simulator.nFaults))
+    if report is not None:
+        summary = report.summary()
+        result.update(ncsThroughput=summary['throughput'], p50=summary['p50'], p99=summary['p99'],
+                      p999=summary['p999'], ncsSent=summary['sent'], ncsTimeouts=summary['timeouts'])
+    return result
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """ Regressions of `results` against `baseline` beyond THRESHOLDS, as readable lines """
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None: continue
+        for metric, threshold in THRESHOLDS.items():
+            value, base = result.get(metric), reference.get(metric)
+            if value is None or base is None: continue
+            allowed = abs(base) * threshold.tolerance + threshold.slack
+            change = base - value if threshold.higherIsBetter else value - base
+            if change > allowed:
+                regressions.append(f"{key} {metric}: {base} ––► {value} "
+                                   f"({'−' if threshold.higherIsBetter else '+'}{change:.1f}, allowed {allowed:.1f})")
+    return regressions
+
+
+def gitCommit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=dirname(abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    if sys.argv[1:2] == ['--child']:
+        serveApp(*sys.argv[2:6])
+        sys.exit(0)
+
+    parser = ArgumentParser(description="End-to-end ProtocolProxy benchmark against simulated device and NCS "
+                                        "(Linux, pseudo-terminals are used as ports)")
+    parser.add_argument('--protocols', nargs='+', choices=SIMULATORS, default=list(SIMULATORS))
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--duration', type=float, default=10.0, help="measurement time per scenario, sec")
+    parser.add_argument('--warmup', type=float, default=2.0, help="time before measurement starts, sec")
+    parser.add_argument('--output', default='benchmark_results.json', help="results file")
+    parser.add_argument('--baseline', default=None,
+                        help="baseline file to compare results with (results are not compared if omitted)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"store results as the new baseline (to --baseline file, default {BASELINE_PATH})")
+    args = parser.parse_args()
+    if args.save_baseline:
+        args.baseline = args.baseline or BASELINE_PATH
+    elif args.baseline is not None and not isfile(args.baseline):
+        # ▼ Fail before scenarios are run, not after minutes of measurements
+        parser.error(f"no baseline at {args.baseline} — run with --save-baseline on the reference machine")
+
+    results = {}
+    for protocol in args.protocols:
+        for scenarioName in args.scenarios:
+            key = f"{protocol}/{scenarioName}"
+            print(f"{key}: {SCENARIOS[scenarioName].description}...", flush=True)
+            try:
+                results[key] = runScenario(protocol, scenarioName, args.duration, args.warmup)
+            except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+                log.error(f"{key} failed: {e}")
+                continue
+            print(f"    {json.dumps({k: v for k, v in results[key].items() if k != 'simulator'})}")
+
+    document = dict(meta=dict(time=datetime.now().isoformat(' ', 'seconds'), commit=gitCommit(),
+                              python=platform.python_version(), platform=platform.platform(),
+                              duration=args.duration, warmup=args.warmup), results=results)
+    with open(args.output, 'w', encoding='utf-8') as file: json.dump(document, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file: json.dump(document, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file: baseline = json.load(file)
+        regressions = compare(results, baseline['results'])
+        print(f"Compared with baseline from {baseline['meta']['time']} (commit {baseline['meta']['commit']}): "
+              f"{len(regressions) or 'no'} regressions")
+        for regression in regressions: print(f"    {regression}")
+        if regressions: sys.exit(1)
@@ -0,0 +1,100 @@
+from collections import deque
+from threading import Event
+from time import perf_counter
+from typing import NamedTuple, Tuple
+
+from Transceiver import rfc1071
+from Utils import Logger, auto_repr, bytewise
+
+from peleng import Rfc1071, OVERHEAD
+
+log = Logger("Bulk")
+log.setLevel('DEBUG')
+
+
+class BulkInterrupted(RuntimeError):
+    """ Bulk transfer has been stopped before all data was transferred """
+
+
+class BulkChecksumError(RuntimeError):
+    """ Device has acknowledged bulk data chunk with checksum other than one of the chunk sent """
+
+
+class BulkReport(NamedTuple):
+    nBytesSent: int
+    nBytesReceived: int
+    nChunks: int
+    elapsed: float  # sec
+    sentChecksum: bytes  # rfc1071 of whole block sent
+    receivedChecksum: bytes  # rfc1071 of all reply data received
+
+    @property
+    def throughput(self) -> float:
+        """ Payload bytes transferred in both directions per second """
+        return (self.nBytesSent + self.nBytesReceived) / self.elapsed if self.elapsed else 0
+
+    def __str__(self):
+        return (f"{self.nBytesSent} bytes sent, {self.nBytesReceived} bytes received in {self.nChunks} chunks, "
+                f"{self.elapsed:.3f} sec ({self.throughput / 1024:.1f} KiB/s)")
+
+
+class BulkTransfer:
+    """ Streams large data block to device as a series of max-size packets
+        Up to `depth` packets are sent ahead without waiting for replies, replies are expected in the same order
+        Each chunk is verified against checksum acknowledged by device reply, if device acknowledges chunks at all
+            (see Device.bulkChecksum())
+        Transceiver is anything with .sendPacket() / .receivePacket() (e.g. PelengTransceiver)
+    """
+
+    def __init__(self, transceiver, device, chunkSize: int, depth: int = 1):
+        self.transceiver = transceiver
+        self.device = device
+        self.chunkSize: int = device.bulkChunkSize(chunkSize)
+        self.depth: int = max(depth, 1)
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.device.name}, chunk={self.chunkSize}, depth={self.depth}")
+
+    def replyTimeout(self, baseTimeout: float) -> float:
+        """ Time to wait for reply to the oldest packet in flight, when all of them are max-size """
+        packetSize = OVERHEAD + self.device.BULK_HEADER_SIZE + self.chunkSize
+        return baseTimeout + self.device.charTime('DEV') * packetSize * (self.depth + 1)
+
+    def run(self, data: bytes, stopEvent: Event = None) -> Tuple[bytes, BulkReport]:
+        """ Transfer `data` block, return device replies data joined together and transfer report
+            Transceiver errors (timeouts, bad checksums, etc.) are propagated as is
+            Raises BulkChecksumError on the first chunk acknowledged with wrong checksum,
+                BulkInterrupted if `stopEvent` is set during transfer
+        """
+        view = memoryview(data)
+        offsets = deque(range(0, len(data), self.chunkSize) or [0])
+        inFlight = deque()  # (offset, checksum) of chunks sent, replies to which are not received yet
+        replies = []
+        sentChecksum, receivedChecksum = Rfc1071(), Rfc1071()
+        nChunks = len(offsets)
+
+        startedAt = perf_counter()
+        while offsets or inFlight:
+            if stopEvent is not None and stopEvent.is_set():
+                raise BulkInterrupted(f"Bulk transfer interrupted at {inFlight[0][0] if inFlight else offsets[0]}")
+            while offsets and len(inFlight) < self.depth:
+                offset = offsets.popleft()
+                chunk = view[offset:offset + self.chunkSize].tobytes()
+                self.transceiver.sendPacket(self.device.bulkWrap(offset, chunk))
+                sentChecksum.update(chunk)
+                inFlight.append((offset, rfc1071(chunk)))
+            offset, checksum = inFlight.popleft()
+            packet = self.transceiver.receivePacket()
+            acknowledged = self.device.bulkChecksum(offset, packet)
+            if acknowledged is not None and acknowledged != checksum:
+                raise BulkChecksumError(f"Chunk at {offset} is acknowledged with checksum [{bytewise(acknowledged)}], "
+                                        f"expected [{bytewise(checksum)}]")
+            reply = self.device.bulkUnwrap(offset, packet)
+            receivedChecksum.update(reply)
+            replies.append(reply)
+        elapsed = perf_counter() - startedAt
+
+        received = b''.join(replies)
+        report = BulkReport(len(data), len(received), nChunks, elapsed, sentChecksum.digest(), receivedChecksum.digest())
+        log.info(f"{self.device.name} bulk transfer: {report}")
+        return received, report
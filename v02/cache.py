@@ -0,0 +1,75 @@
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+from Utils import Logger, auto_repr
+
+log = Logger("Cache")
+log.setLevel('DEBUG')
+
+
+class ReplyCache:
+    """ Device replies to read-only NCS commands (inquiries), answered locally while fresh
+        Command types are classified by device: .CACHEABLE_COMMANDS are stored for `ttl` sec,
+            any of .INVALIDATING_COMMANDS (state-changing ones) drops the whole cache
+    """
+
+    MAX_ENTRIES: int = 256
+
+    def __init__(self, device, ttl: float):
+        self.device = device
+        self.ttl: float = ttl  # sec, 0 ––► cache disabled
+        self.entries: Dict[bytes, Tuple[bytes, float]] = {}  # command ––► (reply, expiration time)
+        self.lock = Lock()
+
+        self.nHits: int = 0
+        self.nMisses: int = 0
+        self.nInvalidations: int = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.device.name}, {len(self.entries)} entries, ttl={self.ttl}s")
+
+    def cacheable(self, command: bytes) -> bool:
+        if self.ttl <= 0: return False
+        if self.device.commandType(command) not in self.device.CACHEABLE_COMMANDS: return False
+        # ▼ Device state is about to change — cached replies may be outdated already
+        return all(par.inSync for par in self.device.params)
+
+    def lookup(self, command: bytes) -> Optional[bytes]:
+        """ Return cached reply to `command` if it is still fresh, None otherwise
+            State-changing `command` invalidates the cache
+        """
+        if self.device.commandType(command) in self.device.INVALIDATING_COMMANDS:
+            self.invalidate()
+            return None
+        if not self.cacheable(command): return None
+        with self.lock:
+            reply, expires = self.entries.get(command, (None, 0))
+            if reply is None or monotonic() > expires:
+                self.nMisses += 1
+                return None
+            self.nHits += 1
+            return reply
+
+    def store(self, command: bytes, reply: bytes):
+        if not self.cacheable(command): return
+        with self.lock:
+            now = monotonic()
+            if len(self.entries) >= self.MAX_ENTRIES:
+                self.entries = {cmd: entry for cmd, entry in self.entries.items() if entry[1] >= now}
+                if len(self.entries) >= self.MAX_ENTRIES: return
+            self.entries[command] = reply, now + self.ttl
+
+    def invalidate(self):
+        with self.lock:
+            if not self.entries: return
+            self.entries.clear()
+            self.nInvalidations += 1
+        log.debug(f"{self.device.name} reply cache invalidated")
+
+    def stats(self) -> dict:
+        return dict(entries=len(self.entries), ttl=self.ttl, hits=self.nHits,
+                    misses=self.nMisses, invalidations=self.nInvalidations)
@@ -0,0 +1,411 @@
+import csv
+import lzma
+import struct
+import zlib
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from enum import IntEnum
+from mmap import mmap, ACCESS_READ
+from threading import Thread, Event, Lock
+from time import time_ns
+from typing import Iterator, NamedTuple, BinaryIO, Collection, List
+
+from Utils import Logger, auto_repr
+
+log = Logger("Capture")
+log.setLevel('DEBUG')
+
+# Capture file layout:
+#   file header ––► magic (6) + version (1) + flags (1) + capture start time, ns (8)
+#   block       ––► block header + records (compressed as a whole according to codec)
+#       block header ––► tag (4) + codec (1) + reserved (3) + records size (4) + records count (4)
+#                            + first record time, ns (8) + last record time, ns (8)
+#       record       ––► time, ns (8) + direction (1) + error (1) + device address (1) + data size (2) + data
+#   index       ––► block header (index tag) + index entries, written when capture is closed
+#       index entry  ––► first record time, ns (8) + last record time, ns (8) + block offset (8) + records count (4)
+#   footer      ––► index offset (8) + footer tag (4)
+# Capture which has not been closed properly has no index — it is rebuilt from block headers when read
+
+MAGIC = b'PPCAP\x00'
+VERSION = 1
+FILE_HEADER = struct.Struct('< 6s B B Q')
+BLOCK_TAG = b'BLK\x00'
+INDEX_TAG = b'IDX\x00'
+FOOTER_TAG = b'PIDX'
+BLOCK_HEADER = struct.Struct('< 4s B 3x I I Q Q')
+RECORD_HEADER = struct.Struct('< Q B B B H')
+INDEX_ENTRY = struct.Struct('< Q Q Q I')
+FOOTER = struct.Struct('< Q 4s')
+
+# Block codecs
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODECS = {'none': CODEC_NONE, 'zlib': CODEC_ZLIB, 'lzma': CODEC_LZMA}
+
+# Record error codes
+ERROR_NONE = 0
+ERROR_TIMEOUT = 1  # no data within timeout, record data is empty
+ERROR_BAD_DATA = 2  # frame is rejected (bad checksum, size, etc.), record data is whatever has been received
+ERRORS = {'none': ERROR_NONE, 'timeout': ERROR_TIMEOUT, 'bad-data': ERROR_BAD_DATA}
+
+LINKTYPE_USER0 = 147  # pcapng link type for exported frames
+
+
+class Direction(IntEnum):
+    NCS_IN = 0  # NCS ––► app
+    DEV_OUT = 1  # app ––► device
+    DEV_IN = 2  # device ––► app
+    NCS_OUT = 3  # app ––► NCS
+    EVENT = 4  # device parameter or reply cache event, data is utf-8 text: '<event> <name>=<value>'
+
+
+class Record(NamedTuple):
+    time: int  # ns since epoch
+    direction: Direction
+    error: int  # see ERROR_*
+    address: int  # Peleng address of the device traffic belongs to
+    data: bytes
+
+    def __str__(self):
+        time = datetime.fromtimestamp(self.time / 1e9).strftime('%Y-%m-%d %H:%M:%S.%f')
+        error = next((name for name, code in ERRORS.items() if code == self.error), str(self.error))
+        if self.direction == Direction.EVENT:
+            data = self.data.decode('utf-8', errors='replace')
+        else:
+            data = self.data.hex(' ').upper()
+        return f"{time} {self.direction.name:<7} #{self.address:<3} {error if self.error else '':<8} {data}"
+
+
+class BlockEntry(NamedTuple):
+    firstTime: int  # ns
+    lastTime: int  # ns
+    offset: int  # block header position in file
+    count: int  # records in block
+
+
+class CaptureError(RuntimeError):
+    """ Capture file is corrupted or has unsupported format """
+
+
+class CaptureWriter:
+    """ Writes traffic records to capture file on a background thread
+        Callers only append records to in-memory buffer, writer packs them into blocks
+            of `blockSize` bytes (or whatever has been collected within `flushPeriod`)
+        Records are dropped (and counted) if writer falls behind by more than `maxPending` records
+        Blocks are compressed with `codec` ('none' | 'zlib' | 'lzma'), block index is written on close
+    """
+
+    def __init__(self, path: str, blockSize: int = 64*1024, flushPeriod: float = 0.5, maxPending: int = 100_000,
+                 codec: str = 'none'):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown capture codec '{codec}' (expected one of {', '.join(CODECS)})")
+        self.path: str = path
+        self.blockSize: int = blockSize
+        self.flushPeriod: float = flushPeriod
+        self.maxPending: int = maxPending
+        self.codec: int = CODECS[codec]
+        self.pending = deque()  # ◄ deque appends / pops are thread-safe
+        self.lock = Lock()  # serializes flushes by writer thread and by readers of running capture
+        self.index: List[BlockEntry] = []
+        self.stopEvent = Event()
+        self.file: BinaryIO = None
+        self.thread: Thread = None
+
+        self.nRecords: int = 0
+        self.nDropped: int = 0
+        self.nBytesRaw: int = 0  # records size before compression
+        self.nBytes: int = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.path}, {self.nRecords} records")
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> 'CaptureWriter':
+        self.file = open(self.path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, time_ns()))
+        self.nBytes = FILE_HEADER.size
+        self.stopEvent.clear()
+        self.thread = Thread(name="Capture thread", target=self.writerLoop, daemon=True)
+        self.thread.start()
+        log.info(f"Capturing traffic to {self.path}")
+        return self
+
+    def record(self, direction: Direction, data: bytes, error: int = ERROR_NONE, address: int = 0):
+        if len(self.pending) >= self.maxPending:
+            self.nDropped += 1
+            return
+        self.pending.append((time_ns(), direction, error, address, data))
+
+    def writerLoop(self):
+        while not self.stopEvent.wait(self.flushPeriod):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """ Write pending records to file — called periodically by writer thread,
+                and by readers of running capture, so that they see its latest records
+        """
+        with self.lock:
+            if self.file.closed: return
+            self.writePending()
+
+    def writePending(self):
+        while self.pending:
+            records = []
+            size = 0
+            firstTime = lastTime = self.pending[0][0]
+            while self.pending and size < self.blockSize:
+                timestamp, direction, error, address, data = self.pending.popleft()
+                data = data[:0xFFFF]
+                records.append(RECORD_HEADER.pack(timestamp, direction, error, address, len(data)))
+                records.append(data)
+                size += RECORD_HEADER.size + len(data)
+                # ▼ Records from different threads could be slightly out of order
+                firstTime, lastTime = min(firstTime, timestamp), max(lastTime, timestamp)
+            self.writeBlock(b''.join(records), len(records) // 2, firstTime, lastTime)
+        self.file.flush()
+
+    def writeBlock(self, records: bytes, count: int, firstTime: int, lastTime: int):
+        self.nBytesRaw += len(records)
+        if self.codec == CODEC_ZLIB:
+            records = zlib.compress(records)
+        elif self.codec == CODEC_LZMA:
+            records = lzma.compress(records)
+        self.index.append(BlockEntry(firstTime, lastTime, self.nBytes, count))
+        self.file.write(BLOCK_HEADER.pack(BLOCK_TAG, self.codec, len(records), count, firstTime, lastTime))
+        self.file.write(records)
+        self.nRecords += count
+        self.nBytes += BLOCK_HEADER.size + len(records)
+
+    def writeIndex(self):
+        entries = b''.join(INDEX_ENTRY.pack(*entry) for entry in self.index)
+        firstTime = self.index[0].firstTime if self.index else 0
+        lastTime = self.index[-1].lastTime if self.index else 0
+        self.file.write(BLOCK_HEADER.pack(INDEX_TAG, CODEC_NONE, len(entries), len(self.index), firstTime, lastTime))
+        self.file.write(entries)
+        self.file.write(FOOTER.pack(self.nBytes, FOOTER_TAG))
+
+    def close(self):
+        if self.thread is None: return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+        with self.lock:
+            self.writeIndex()
+            self.file.close()
+        log.info(f"Capture {self.path} closed: {self.nRecords} records, {self.nDropped} dropped")
+
+    def stats(self) -> dict:
+        return dict(path=self.path, records=self.nRecords, dropped=self.nDropped, pending=len(self.pending),
+                    blocks=len(self.index), bytes=self.nBytes,
+                    compression=round(self.nBytesRaw / max(self.nBytes - FILE_HEADER.size, 1), 2))
+
+
+class CaptureReader:
+    """ Reads records of capture file, which is memory-mapped, no matter how large it is
+        Block index allows to get records of given time range by decoding only the blocks which cover it
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        with open(path, 'rb') as file:
+            header = file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise CaptureError(f"{path} is not a capture file (too small)")
+        magic, self.version, self.flags, self.startTime = FILE_HEADER.unpack(header)
+        if magic != MAGIC:
+            raise CaptureError(f"{path} is not a capture file")
+        if self.version != VERSION:
+            raise CaptureError(f"{path} has unsupported capture format version {self.version}")
+        self.indexCache: List[BlockEntry] = None
+
+    def __iter__(self) -> Iterator[Record]:
+        return self.query()
+
+    @property
+    def index(self) -> List[BlockEntry]:
+        if self.indexCache is None:
+            with open(self.path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+                self.indexCache = self.loadIndex(buffer)
+        return self.indexCache
+
+    def loadIndex(self, buffer) -> List[BlockEntry]:
+        """ Read index written on capture close, rebuild it from block headers if there is none """
+        if len(buffer) >= FILE_HEADER.size + FOOTER.size:
+            indexOffset, tag = FOOTER.unpack_from(buffer, len(buffer) - FOOTER.size)
+            if tag == FOOTER_TAG:
+                tag, _, size, count, _, _ = BLOCK_HEADER.unpack_from(buffer, indexOffset)
+                if tag == INDEX_TAG:
+                    start = indexOffset + BLOCK_HEADER.size
+                    return [BlockEntry(*INDEX_ENTRY.unpack_from(buffer, start + i * INDEX_ENTRY.size))
+                            for i in range(count)]
+        log.debug(f"{self.path} has no index (capture has not been closed?) — rebuilding it")
+        index = []
+        offset = FILE_HEADER.size
+        while offset + BLOCK_HEADER.size <= len(buffer):
+            tag, _, size, count, firstTime, lastTime = BLOCK_HEADER.unpack_from(buffer, offset)
+            if tag != BLOCK_TAG: break
+            if offset + BLOCK_HEADER.size + size > len(buffer):
+                log.warning(f"{self.path} is truncated (incomplete block at {offset})")
+                break
+            index.append(BlockEntry(firstTime, lastTime, offset, count))
+            offset += BLOCK_HEADER.size + size
+        return index
+
+    def query(self, start: int = None, end: int = None, directions: Collection[Direction] = None,
+              errors: Collection[int] = None, addresses: Collection[int] = None) -> Iterator[Record]:
+        """ Iterate over records within [start, end] time range (ns), which match all given filters
+            Only blocks covering time range are decoded
+        """
+        index = self.index
+        first = 0
+        if start is not None:
+            # ▼ First record of a block could slightly precede the last one of previous block
+            first = max(bisect_left([entry.lastTime for entry in index], start) - 1, 0)
+        with open(self.path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+            for entry in index[first:]:
+                if end is not None and entry.firstTime > end: return
+                if start is not None and entry.lastTime < start: continue
+                for record in self.readBlock(buffer, entry.offset):
+                    if start is not None and record.time < start: continue
+                    if end is not None and record.time > end: continue
+                    if directions is not None and record.direction not in directions: continue
+                    if errors is not None and record.error not in errors: continue
+                    if addresses is not None and record.address not in addresses: continue
+                    yield record
+
+    def readBlock(self, buffer, offset: int) -> Iterator[Record]:
+        tag, codec, size, count, _, _ = BLOCK_HEADER.unpack_from(buffer, offset)
+        if tag != BLOCK_TAG:
+            raise CaptureError(f"{self.path} is corrupted (bad block tag at {offset})")
+        start = offset + BLOCK_HEADER.size
+        if codec == CODEC_NONE:
+            return self.parseRecords(buffer, start, start + size)
+        records = self.decode(codec, buffer[start:start + size])
+        return self.parseRecords(records, 0, len(records))
+
+    def decode(self, codec: int, records: bytes) -> bytes:
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(records)
+        elif codec == CODEC_LZMA:
+            return lzma.decompress(records)
+        raise CaptureError(f"{self.path} uses unsupported block codec {codec}")
+
+    @staticmethod
+    def parseRecords(buffer, start: int, end: int) -> Iterator[Record]:
+        """ Parse records located in `buffer` (bytes or mmap) between `start` and `end` offsets """
+        offset = start
+        while offset < end:
+            timestamp, direction, error, address, size = RECORD_HEADER.unpack_from(buffer, offset)
+            offset += RECORD_HEADER.size
+            yield Record(timestamp, Direction(direction), error, address, buffer[offset:offset + size])
+            offset += size
+
+
+def parseTime(text: str, reference: int) -> int:
+    """ Convert time given as 'HH:MM:SS[.ffffff]' (on the date of `reference` time, ns),
+            ISO date and time or seconds since epoch to ns since epoch
+    """
+    try:
+        return int(float(text) * 1e9)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            clock = datetime.strptime(text, '%H:%M:%S.%f' if '.' in text else '%H:%M:%S').time()
+        except ValueError:
+            raise ValueError(f"Invalid time '{text}' (expected 'HH:MM:SS', ISO date and time or epoch seconds)")
+        moment = datetime.combine(datetime.fromtimestamp(reference / 1e9).date(), clock)
+    return int(moment.timestamp() * 1e9)
+
+
+def exportPcapng(records: Iterator[Record], outputPath: str, linkType: int = LINKTYPE_USER0) -> int:
+    """ Write records to pcapng file, return number of packets exported
+        Packet data is prefixed with direction, error and device address bytes
+    """
+
+    def block(blockType: int, body: bytes) -> bytes:
+        body += b'\x00' * (-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack('< I I', blockType, length) + body + struct.pack('< I', length)
+
+    # ▼ Option if_tsresol = 9 (nanoseconds) + end of options
+    interfaceOptions = struct.pack('< H H B 3x', 9, 1, 9) + struct.pack('< H H', 0, 0)
+    nPackets = 0
+    with open(outputPath, 'wb') as output:
+        output.write(block(0x0A0D0D0A, struct.pack('< I H H q', 0x1A2B3C4D, 1, 0, -1)))
+        output.write(block(0x00000001, struct.pack('< H H I', linkType, 0, 0) + interfaceOptions))
+        for record in records:
+            data = bytes((record.direction, record.error, record.address)) + record.data
+            header = struct.pack('< I I I I I', 0, record.time >> 32, record.time & 0xFFFFFFFF, len(data), len(data))
+            output.write(block(0x00000006, header + data))
+            nPackets += 1
+    log.info(f"{nPackets} packets exported to {outputPath}")
+    return nPackets
+
+
+def exportCsv(records: Iterator[Record], outputPath: str) -> int:
+    """ Write records to CSV file, return number of rows exported """
+    nRows = 0
+    with open(outputPath, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(('time_ns', 'direction', 'error', 'address', 'size', 'data'))
+        for record in records:
+            if record.direction == Direction.EVENT:
+                data = record.data.decode('utf-8', errors='replace')
+            else:
+                data = record.data.hex(' ').upper()
+            writer.writerow((record.time, record.direction.name, record.error, record.address, len(record.data), data))
+            nRows += 1
+    log.info(f"{nRows} records exported to {outputPath}")
+    return nRows
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Query / export ProtocolProxy traffic capture")
+    parser.add_argument('capture', help="capture file")
+    parser.add_argument('--from', dest='start', metavar='TIME',
+                        help="skip records before TIME ('HH:MM:SS[.ffffff]', ISO date and time or epoch seconds)")
+    parser.add_argument('--to', dest='end', metavar='TIME', help="skip records after TIME")
+    parser.add_argument('--around', metavar='TIME', help="records within --span seconds around TIME")
+    parser.add_argument('--span', type=float, default=1, help="time window for --around, sec (default: 1)")
+    parser.add_argument('--direction', nargs='+', choices=[direction.name for direction in Direction])
+    parser.add_argument('--error', nargs='+', choices=list(ERRORS))
+    parser.add_argument('--address', nargs='+', type=int, help="device address(es)")
+    parser.add_argument('--pcapng', metavar='FILE', help="export to pcapng file (link type USER0)")
+    parser.add_argument('--csv', metavar='FILE', help="export to CSV file")
+    args = parser.parse_args()
+
+    reader = CaptureReader(args.capture)
+    start = end = None
+    if args.around:
+        center = parseTime(args.around, reader.startTime)
+        start, end = center - int(args.span * 1e9), center + int(args.span * 1e9)
+    if args.start: start = parseTime(args.start, reader.startTime)
+    if args.end: end = parseTime(args.end, reader.startTime)
+
+    def query() -> Iterator[Record]:
+        return reader.query(start, end,
+                            directions=args.direction and {Direction[name] for name in args.direction},
+                            errors=args.error and {ERRORS[name] for name in args.error},
+                            addresses=args.address and set(args.address))
+
+    if args.pcapng: exportPcapng(query(), args.pcapng)
+    if args.csv: exportCsv(query(), args.csv)
+    if not args.pcapng and not args.csv:
+        for rec in query(): print(rec)
@@ -0,0 +1,299 @@
+import lzma
+import zlib
+from functools import lru_cache
+from mmap import mmap, ACCESS_READ
+from typing import Dict, List, NamedTuple, Sequence, Tuple, Type
+
+from Utils import Logger, bitsarray, flags
+
+from capture import CaptureReader, Direction, BLOCK_HEADER, RECORD_HEADER, CODEC_ZLIB, CODEC_LZMA, ERROR_NONE
+from device import Device
+from peleng import Rfc1071, STARTBYTE, HEADER_SIZE, CHECKSUM_SIZE
+
+log = Logger("Decoder")
+log.setLevel('DEBUG')
+
+# Batch decoding of whole captures / raw byte streams with NumPy — no per-packet Python code is involved
+# Checksums are validated via prefix sums of 16-bit words: one's complement sum of any range is a difference
+#   of two prefix sums folded to 16 bits, so all candidate frames are validated at once
+# NumPy is an optional dependency (`pip install numpy`), imported on first use: without it the same results
+#   are produced by plain Python code (as lists instead of arrays), just much slower
+
+
+@lru_cache(maxsize=None)
+def numpy():
+    """ NumPy module, None if it is not installed """
+    try:
+        import numpy
+    except ModuleNotFoundError:
+        log.warning("NumPy is not installed, falling back to (slow) pure Python decoding")
+        return None
+    return numpy
+
+
+class Frames(NamedTuple):
+    offsets: Sequence[int]  # frame start positions in stream
+    sizes: Sequence[int]  # frame sizes, bytes
+    addresses: Sequence[int]  # Peleng address (empty for native frames)
+
+
+class Series(NamedTuple):
+    times: Sequence[int]  # ns since epoch
+    values: Sequence[bool]
+
+    def changes(self) -> 'Series':
+        """ Samples where value differs from the previous one (first sample included) """
+        if not len(self.values): return self
+        np = numpy()
+        if np is None:
+            values = self.values
+            index = [i for i in range(len(values)) if i == 0 or values[i] != values[i - 1]]
+            return Series([self.times[i] for i in index], [values[i] for i in index])
+        index = np.flatnonzero(np.concatenate(([True], self.values[1:] != self.values[:-1])))
+        return Series(self.times[index], self.values[index])
+
+
+class WordSums:
+    """ Prefix sums of big-endian 16-bit words for even- and odd-aligned word sequences of a stream """
+
+    def __init__(self, stream: 'np.ndarray'):
+        np = numpy()
+        self.stream = stream
+        padded = np.concatenate((stream, np.zeros(2, np.uint8))).astype(np.uint64)
+        self.even = self.prefix(padded[:-1])
+        self.odd = self.prefix(padded[1:])
+
+    @staticmethod
+    def prefix(data: 'np.ndarray') -> 'np.ndarray':
+        np = numpy()
+        data = data[:len(data) // 2 * 2]
+        words = (data[0::2] << np.uint64(8)) | data[1::2]
+        return np.concatenate(([0], np.cumsum(words, dtype=np.uint64))).astype(np.uint64)
+
+    def valid(self, offsets: 'np.ndarray', sizes: 'np.ndarray') -> 'np.ndarray':
+        """ Whether rfc1071 of each stream range [offset, offset + size) is zero (checksum inside the range is ok)
+            Odd-sized ranges are zero-padded, as rfc1071() does
+        """
+        np = numpy()
+        offsets, sizes = offsets.astype(np.int64), sizes.astype(np.int64)
+        nWords = sizes // 2
+        odd = offsets % 2 == 1
+        first = offsets // 2
+        sums = np.where(odd, self.odd[np.minimum(first + nWords, len(self.odd) - 1)] - self.odd[first],
+                        self.even[np.minimum(first + nWords, len(self.even) - 1)] - self.even[first])
+        tails = sizes % 2 == 1
+        tailBytes = self.stream[np.minimum(offsets + sizes - 1, len(self.stream) - 1)].astype(np.uint64)
+        sums = sums + np.where(tails, tailBytes << np.uint64(8), np.uint64(0))
+        for _ in range(4):
+            sums = (sums & np.uint64(0xFFFF)) + (sums >> np.uint64(16))
+        return sums == 0xFFFF
+
+
+def dropOverlapping(offsets: 'np.ndarray', sizes: 'np.ndarray') -> 'np.ndarray':
+    """ Mask of frames that do not start inside preceding frames (offsets are sorted) """
+    np = numpy()
+    if not len(offsets): return np.zeros(0, bool)
+    ends = np.maximum.accumulate(offsets + sizes)
+    return np.concatenate(([True], offsets[1:] >= ends[:-1]))
+
+
+def checksumValid(stream: bytes, offset: int, size: int) -> bool:
+    """ Pure Python counterpart of WordSums.valid() for a single stream range """
+    return Rfc1071(stream[offset:offset + size]).digest() == b'\x00\x00'
+
+
+def keepFirst(frames: List[Tuple[int, int, int]], hasAddress: bool) -> Frames:
+    """ Pure Python counterpart of dropOverlapping() for (offset, size, address) `frames` sorted by offset """
+    kept, end = [], 0
+    for frame in frames:
+        if frame[0] >= end: kept.append(frame)
+        end = max(end, frame[0] + frame[1])
+    return Frames([offset for offset, _, _ in kept], [size for _, size, _ in kept],
+                  [address for _, _, address in kept] if hasAddress else [])
+
+
+def startbytes(stream: bytes, startbyte: int, end: int):
+    """ Positions of `startbyte` in `stream` before `end` """
+    end = max(end, 0)
+    offset = stream.find(bytes([startbyte]), 0, end)
+    while offset >= 0:
+        yield offset
+        offset = stream.find(bytes([startbyte]), offset + 1, end)
+
+
+def pelengFrames(stream: bytes) -> Frames:
+    """ Locate valid Peleng packets (both header and packet checksums are correct) in raw byte stream """
+    np = numpy()
+    if np is None:
+        frames = []
+        for offset in startbytes(stream, STARTBYTE, len(stream) - HEADER_SIZE - CHECKSUM_SIZE + 1):
+            if not checksumValid(stream, offset, HEADER_SIZE): continue
+            sizeField = int.from_bytes(stream[offset + 2:offset + 4], 'little')
+            size = HEADER_SIZE + (sizeField & 0x0FFF) * 2 + CHECKSUM_SIZE
+            if offset + size <= len(stream) and checksumValid(stream, offset, size):
+                frames.append((offset, size, stream[offset + 1]))
+        return keepFirst(frames, hasAddress=True)
+    data = np.frombuffer(stream, np.uint8)
+    candidates = np.flatnonzero(data[:max(len(data) - HEADER_SIZE - CHECKSUM_SIZE + 1, 0)] == STARTBYTE)
+    sums = WordSums(data)
+    candidates = candidates[sums.valid(candidates, np.full(len(candidates), HEADER_SIZE))]
+    sizeField = data[candidates + 2].astype(np.int64) | (data[candidates + 3].astype(np.int64) << 8)
+    sizes = HEADER_SIZE + (sizeField & 0x0FFF) * 2 + CHECKSUM_SIZE
+    fits = candidates + sizes <= len(data)
+    candidates, sizes = candidates[fits], sizes[fits]
+    valid = sums.valid(candidates, sizes)
+    candidates, sizes = candidates[valid], sizes[valid]
+    keep = dropOverlapping(candidates, sizes)
+    return Frames(candidates[keep], sizes[keep], data[candidates[keep] + 1])
+
+
+def nativeFrames(stream: bytes, startbyte: int, size: int) -> Frames:
+    """ Locate valid fixed-size native frames with trailing rfc1071 (e.g. MWXC) in raw byte stream """
+    np = numpy()
+    if np is None:
+        return keepFirst([(offset, size, None) for offset in startbytes(stream, startbyte, len(stream) - size + 1)
+                          if checksumValid(stream, offset, size)], hasAddress=False)
+    data = np.frombuffer(stream, np.uint8)
+    candidates = np.flatnonzero(data[:max(len(data) - size + 1, 0)] == startbyte)
+    sizes = np.full(len(candidates), size)
+    valid = WordSums(data).valid(candidates, sizes)
+    candidates, sizes = candidates[valid], sizes[valid]
+    keep = dropOverlapping(candidates, sizes)
+    return Frames(candidates[keep], sizes[keep], np.zeros(0, np.uint8))
+
+
+def recordOffsets(block: 'np.ndarray', count: int) -> 'np.ndarray':
+    """ Offsets of `count` records packed in capture block — record chain is followed by pointer doubling,
+            i.e. log2(count) vectorized passes over the block instead of a Python loop over records
+    """
+    np = numpy()
+    size = len(block)
+    positions = np.arange(size + 1)
+    sizeLow = block[np.minimum(positions + 11, size - 1)].astype(np.int64)
+    sizeHigh = block[np.minimum(positions + 12, size - 1)].astype(np.int64)
+    jump = np.minimum(positions + RECORD_HEADER.size + (sizeLow | sizeHigh << 8), size)
+    jump[size] = size
+    offsets = np.zeros(count, np.int64)
+    steps = np.arange(count)
+    bit = 0
+    while (1 << bit) < count:
+        moving = (steps >> bit) & 1 == 1
+        offsets[moving] = jump[offsets[moving]]
+        jump = jump[jump]
+        bit += 1
+    return offsets
+
+
+class CaptureColumns(NamedTuple):
+    times: Sequence[int]  # uint64, ns
+    directions: Sequence[int]  # uint8
+    errors: Sequence[int]  # uint8
+    addresses: Sequence[int]  # uint8
+    sizes: Sequence[int]  # uint16
+    firstBytes: Sequence[int]  # uint8, first data byte (0 for empty records)
+
+
+def captureColumns(path: str) -> CaptureColumns:
+    """ Decode record headers of whole capture into columns """
+    reader = CaptureReader(path)
+    np = numpy()
+    if np is None:
+        rows = [(record.time, record.direction, record.error, record.address, len(record.data),
+                 record.data[0] if record.data else 0) for record in reader]
+        return CaptureColumns(*(list(column) for column in zip(*rows))) if rows else CaptureColumns(*[[]] * 6)
+    columns = []
+    with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+        for entry in reader.index:
+            _, codec, size, count, _, _ = BLOCK_HEADER.unpack_from(buffer, entry.offset)
+            start = entry.offset + BLOCK_HEADER.size
+            records = buffer[start:start + size]
+            if codec == CODEC_ZLIB: records = zlib.decompress(records)
+            elif codec == CODEC_LZMA: records = lzma.decompress(records)
+            block = np.frombuffer(records, np.uint8)
+            offsets = recordOffsets(block, count)
+            header = block[offsets[:, None] + np.arange(RECORD_HEADER.size)]
+            sizes = header[:, 11:13].copy().view('<u2')[:, 0]
+            firstBytes = np.where(sizes > 0, block[np.minimum(offsets + RECORD_HEADER.size, len(block) - 1)], 0)
+            columns.append((header[:, :8].copy().view('<u8')[:, 0], header[:, 8], header[:, 9], header[:, 10],
+                            sizes, firstBytes.astype(np.uint8)))
+    if not columns:
+        return CaptureColumns(*(np.zeros(0, dtype) for dtype in (np.uint64, np.uint8, np.uint8, np.uint8,
+                                                                 np.uint16, np.uint8)))
+    return CaptureColumns(*(np.concatenate(column) for column in zip(*columns)))
+
+
+def flagMasks(names: tuple, reply: bool) -> Dict[str, int]:
+    """ Header byte bit mask for each flag, taken from the same helpers devices use to pack / parse flags """
+    if reply:
+        return {name: next(1 << bit for bit in range(8) if flags(1 << bit, len(names))[i])
+                for i, name in enumerate(names)}
+    return {name: bitsarray(*(j == i for j in range(len(names)))) for i, name in enumerate(names)}
+
+
+def decodeFlags(columns: CaptureColumns, device: Type[Device]) -> Dict[str, Series]:
+    """ Per-parameter time series decoded from device packets header flags (see Device.COMMAND_FLAGS / .REPLY_FLAGS)
+        Series are named '<param> requested' (app ––► device) and '<param> reported' (device ––► app)
+    """
+    series = {}
+    np = numpy()
+    if np is None:
+        rows = list(zip(*columns))
+        for direction, names, suffix in ((Direction.DEV_OUT, device.COMMAND_FLAGS, 'requested'),
+                                         (Direction.DEV_IN, device.REPLY_FLAGS, 'reported')):
+            selected = [(time, header) for time, recordDirection, error, address, size, header in rows
+                        if error == ERROR_NONE and size > 0 and address == device.DEV_ADDRESS
+                        and recordDirection == direction]
+            for name, mask in flagMasks(names, reply=direction == Direction.DEV_IN).items():
+                series[f'{name} {suffix}'] = Series([time for time, _ in selected],
+                                                    [header & mask != 0 for _, header in selected])
+        return series
+    ok = (columns.errors == ERROR_NONE) & (columns.sizes > 0) & (columns.addresses == device.DEV_ADDRESS)
+    for direction, names, suffix in ((Direction.DEV_OUT, device.COMMAND_FLAGS, 'requested'),
+                                     (Direction.DEV_IN, device.REPLY_FLAGS, 'reported')):
+        selected = ok & (columns.directions == direction)
+        times, headers = columns.times[selected], columns.firstBytes[selected]
+        for name, mask in flagMasks(names, reply=direction == Direction.DEV_IN).items():
+            series[f'{name} {suffix}'] = Series(times, headers & mask != 0)
+    return series
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    from datetime import datetime
+    from os.path import dirname, abspath, join as joinpath
+    from time import perf_counter
+
+    from app import ProtocolLoader
+
+    parser = ArgumentParser(description="Batch decode ProtocolProxy capture or raw byte stream")
+    parser.add_argument('file', help="capture file (or raw stream with --raw)")
+    parser.add_argument('device', help="device protocol name (e.g. 'sony')")
+    parser.add_argument('--protocols', default=joinpath(dirname(abspath(__file__)), 'devices'),
+                        help="directory with device protocol files")
+    parser.add_argument('--raw', action='store_true', help="file is a raw serial stream dump")
+    args = parser.parse_args()
+
+    deviceClass = ProtocolLoader(args.protocols)[args.device.lower()]
+    startedAt = perf_counter()
+    if args.raw:
+        with open(args.file, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as stream:
+            frames = pelengFrames(stream)
+            print(f"Peleng packets: {len(frames.offsets)} "
+                  f"({sum(address == deviceClass.DEV_ADDRESS for address in frames.addresses)} "
+                  f"to {deviceClass.__name__})")
+            if hasattr(deviceClass, 'APP_STARTBYTE_COMMAND'):
+                command = nativeFrames(stream, deviceClass.APP_STARTBYTE_COMMAND[0], deviceClass.APP_PACKET_SIZE)
+                print(f"Native commands: {len(command.offsets)}")
+            if hasattr(deviceClass, 'APP_STARTBYTE_REPLY'):
+                # ▼ Startbyte + device reply without its header byte + rfc1071 (see .nativeReplyFrame())
+                reply = nativeFrames(stream, deviceClass.APP_STARTBYTE_REPLY[0], deviceClass.REPLY_MAX_SIZE + 2)
+                print(f"Native replies: {len(reply.offsets)}")
+    else:
+        columns = captureColumns(args.file)
+        print(f"Records: {len(columns.times)}")
+        for name, values in decodeFlags(columns, deviceClass).items():
+            changes = values.changes()
+            print(f"{name}: {len(values.times)} samples, {len(changes.times)} changes")
+            for time, value in zip(changes.times, changes.values):
+                print(f"    {datetime.fromtimestamp(int(time) / 1e9).strftime('%Y-%m-%d %H:%M:%S.%f')} {value}")
+    log.info(f"Decoded in {perf_counter() - startedAt:.3f} sec")
@@ -1,9 +1,10 @@
 from functools import partialmethod
-from threading import RLock
-from typing import Union, Mapping, TypeVar
-from Utils import Logger, auto_repr
+from threading import RLock, Event
+from typing import Union, Mapping, TypeVar, Tuple
+from Utils import Logger, auto_repr, bitsarray, flags
 
 from notifier import Notifier
+from peleng import OVERHEAD as PELENG_OVERHEAD, MAX_PAYLOAD_SIZE
 
 log = Logger("Device")
 log.setLevel('DEBUG')
@@ -21,6 +22,9 @@ class BadAckError(DeviceError):
     """ DSP protocol: devise has sent 'FF' acknowledge byte => error executing command on device side """
 
 
+# Device config attrs (prefixed with 'DEV_' / 'APP_') that are applied to serial interfaces
+SERIAL_OPTIONS = ('BAUDRATE', 'BYTESIZE', 'PARITY', 'STOPBITS', 'TIMEOUT', 'WRITE_TIMEOUT', 'INTER_BYTE_TIMEOUT')
+
 ParType = TypeVar('ParType', str, int, float, bool)
 PropType = TypeVar('PropType', str, int, float, bool)
 
@@ -150,6 +154,7 @@ class Device:
     DEV_TIMEOUT: float = 0.5
     DEV_WRITE_TIMEOUT: float = 0.5
     DEV_MAX_INPUT_BUFFER_SIZE: int = 255
+    DEV_INTER_BYTE_TIMEOUT: float = None  # None ––► derived from baudrate (see .interByteTimeout())
 
     APP_BAUDRATE: int
     APP_BYTESIZE: int = 8
@@ -158,6 +163,19 @@ class Device:
     APP_TIMEOUT: int
     APP_WRITE_TIMEOUT: int = 0.5
     APP_MAX_INPUT_BUFFER_SIZE: int = 255
+    APP_INTER_BYTE_TIMEOUT: float = None  # None ––► derived from baudrate (see .interByteTimeout())
+
+    WRAP_HEADER_SIZE: int = 0  # size of header prepended to payload by .wrap()
+    REPLY_MAX_SIZE: int = 255  # max size of device reply packet data (before .unwrap())
+    INTER_BYTE_GAP: int = 8  # max gap between bytes of one packet, in bytes transmission time
+    INTER_BYTE_TIMEOUT_MIN: float = 0.01  # sec
+    IDEMPOTENT_COMMANDS: frozenset = frozenset()  # native command types safe to merge (see .commandType())
+    CACHEABLE_COMMANDS: frozenset = frozenset()  # read-only native command types, replies could be cached
+    INVALIDATING_COMMANDS: frozenset = frozenset()  # state-changing native command types, invalidate cache
+    SEQUENCE_MODULO: int = 0  # modulo of command numbers echoed in replies, 0 ––► replies are not numbered
+    BULK_HEADER_SIZE: int = 0  # size of header prepended to bulk data chunk by .bulkWrap()
+    COMMAND_FLAGS: Tuple[str, ...] = ()  # params transferred as bits of wrapped command first byte (b0 first)
+    REPLY_FLAGS: Tuple[str, ...] = ()  # params / props reported by bits of device reply first byte (b0 first)
 
     DEFAULT_PAYLOAD: bytes  # accepted for future redesigns — use 'IDLE_PAYLOAD' instead
     IDLE_PAYLOAD: bytes  # should not change device state when sent to device (init with default payload)
@@ -171,6 +189,7 @@ class Device:
         self.params = tuple(slot for slot in vars(self.__class__).values() if isinstance(slot, Par))
         self.props = tuple(slot for slot in vars(self.__class__).values() if isinstance(slot, Prop))
         self.API = {slot.alias: slot for slot in vars(self.__class__).values() if isinstance(slot, (Par, Prop))}
+        self.windowed: bool = False  # several commands are in flight, delivery is tracked by app (see .retransmission())
 
     def __iter__(self):
         yield from self.API.values()
@@ -191,9 +210,62 @@ class Device:
     def sendNative(self, transceiver, data: bytes) -> int:
         return NotImplemented
 
-    def receiveNative(self, transceiver) -> bytes:
+    def receiveNative(self, transceiver, stopEvent: Event = None) -> bytes:
+        """ Read command frame from NCS, `stopEvent` is set ––► read has been cancelled by stop request """
         return NotImplemented
 
+    def nativeCommandFrame(self, data: bytes) -> bytes:
+        """ Frame received from NCS, restored from command `data` returned by .receiveNative() """
+        return data
+
+    def nativeReplyFrame(self, data: bytes) -> bytes:
+        """ Frame transmitted to NCS by .sendNative() for device reply `data` """
+        return data
+
+    def retransmission(self) -> bytes:
+        """ Native command that has not been consumed by device and should be sent again, None if there is none """
+        return None
+
+    def bulkWrap(self, offset: int, chunk: bytes) -> bytes:
+        """ Packet payload carrying bulk data `chunk` located at `offset` of transferred block """
+        return chunk
+
+    def bulkUnwrap(self, offset: int, packet: bytes) -> bytes:
+        """ Data extracted from device reply to bulk data chunk located at `offset` """
+        return packet
+
+    def bulkChecksum(self, offset: int, packet: bytes) -> bytes:
+        """ Checksum (rfc1071) of bulk data chunk located at `offset`, acknowledged by device reply `packet`
+            None ––► device does not acknowledge chunks, so they are not verified
+            Acknowledgement format is device-specific: protocols whose devices acknowledge chunks override this
+                (neither SONY nor MWXC devices do)
+        """
+        return None
+
+    def bulkChunkSize(self, limit: int = MAX_PAYLOAD_SIZE) -> int:
+        return min(limit, MAX_PAYLOAD_SIZE) - self.BULK_HEADER_SIZE
+
+    def sequenceNumber(self, packet: bytes) -> int:
+        """ Command number carried by wrapped command or echoed by device reply `packet` (see .SEQUENCE_MODULO) """
+        return None
+
+    def commandType(self, data: bytes) -> int:
+        """ Type of native command `data`, None if protocol does not distinguish command types """
+        return None
+
+    def commandFlags(self) -> int:
+        """ Wrapped command header byte carrying .COMMAND_FLAGS params """
+        return bitsarray(*(getattr(self, name) for name in self.COMMAND_FLAGS))
+
+    def ackReplyFlags(self, byte: int):
+        """ Acknowledge .REPLY_FLAGS params and update props by device reply header `byte` """
+        cls = self.__class__
+        for name, state in zip(self.REPLY_FLAGS, flags(byte, len(self.REPLY_FLAGS))):
+            # ▼ Access parameters via class to get a descriptor, not parameter value
+            slot = getattr(cls, name)
+            if isinstance(slot, Par): slot.ack(state)
+            else: setattr(self, name, state)
+
     def getPar(self, parName):  # NOTE: not tested
         return getattr(self.__class__, parName)
 
@@ -203,23 +275,49 @@ class Device:
             for parName, checkValue in params:
                 getattr(self.__class__, parName).ack(checkValue)
 
-    def configureInterface(self, appInterface, devInterface):
+    def interfaceSettings(self, side: str) -> dict:
+        """ Collect serial settings of 'DEV' or 'APP' interface
+                in a form accepted by pyserial's .apply_settings()
+        """
+        settings = {}
+        for option in SERIAL_OPTIONS:
+            value = getattr(self, f'{side}_{option}', None)
+            if value is not None: settings[option.lower()] = value
+        settings.setdefault('inter_byte_timeout', self.interByteTimeout(side))
+        return settings
+
+    def charTime(self, side: str = 'DEV') -> float:
+        """ Time to transmit one byte over 'DEV' or 'APP' serial line, sec """
+        nBits = 1 + getattr(self, f'{side}_BYTESIZE') + getattr(self, f'{side}_STOPBITS')
+        if getattr(self, f'{side}_PARITY') != 'N': nBits += 1
+        return nBits / getattr(self, f'{side}_BAUDRATE')
+
+    def interByteTimeout(self, side: str = 'DEV') -> float:
+        return max(self.charTime(side) * self.INTER_BYTE_GAP, self.INTER_BYTE_TIMEOUT_MIN)
+
+    def transactionTime(self) -> float:
+        """ Time to transmit idle command packet to device and receive max size reply back, sec """
+        commandSize = PELENG_OVERHEAD + self.WRAP_HEADER_SIZE + len(self.IDLE_PAYLOAD)
+        replySize = PELENG_OVERHEAD + self.REPLY_MAX_SIZE
+        return (commandSize + replySize) * self.charTime('DEV')
+
+    def configureInterface(self, appInterface, devInterface) -> bool:
+        """ Apply serial settings to both interfaces, each one is reconfigured at most once
+            Returns True if settings of any interface have actually been changed
+        """
         if (self.COMMUNICATION_INTERFACE == 'serial'):
-            for par in Device.__dict__.keys():
-                if par.startswith('DEV_'):
-                    attr = par.lstrip('DEV_').lower()
-                    interface = devInterface
-                elif par.startswith('APP_'):
-                    attr = par.lstrip('APP_').lower()
-                    interface = appInterface
-                else:
-                    continue
-                try:
-                    setattr(interface, attr, getattr(self.__class__, par))
-                except AttributeError:
-                    log.warning(f"Cannot apply serial config option '{par}' - "
-                                f"no such option '{interface.__class__.__name__}.{attr}'")
+            changed = False
+            for interface, side in ((appInterface, 'APP'), (devInterface, 'DEV')):
+                settings = self.interfaceSettings(side)
+                current = interface.get_settings()
+                if all(current.get(option) == value for option, value in settings.items()): continue
+                # ▼ Only differing options are reconfigured, e.g. device reply timeout adapted by app at runtime
+                #   (see App.adaptDeviceTimeout()) is just reset to protocol default — port is not reopened
+                interface.apply_settings(settings)
+                changed = True
             devInterface.deviceAddress = self.DEV_ADDRESS
-            log.info(f"In/out {self.COMMUNICATION_INTERFACE} interfaces reconfigured for {self.name} protocol")
+            log.info(f"In/out {self.COMMUNICATION_INTERFACE} interfaces "
+                     f"{'reconfigured' if changed else 'checked'} for {self.name} protocol")
+            return changed
         else:
             raise NotImplementedError(f"Interface {self.COMMUNICATION_INTERFACE} is not supported")
@@ -1,7 +1,9 @@
 import struct
+from threading import Event
 
-from Utils import bitsarray, flags, bytewise, Logger
+from Utils import bytewise, Logger
 from Transceiver import rfc1071, BadDataError, SerialCommunicationError, BadCrcError
+from Transceiver.errors import SerialReadTimeoutError
 
 from device import Device, Par, Prop, DataInvalidError
 
@@ -24,6 +26,11 @@ class MWXC(Device):
     APP_STARTBYTE_COMMAND: bytes = b'\xA0'
     APP_STARTBYTE_REPLY: bytes = b'\x50'
     APP_PACKET_SIZE: int = 13
+    WRAP_HEADER_SIZE: int = 1
+    REPLY_MAX_SIZE: int = 18
+    COMMAND_FLAGS: tuple = ('POWER', 'VIDEO_OUT_EN')
+    # ▼ VIDEO_OUT_EN is acknowledged by video receiver state bit
+    REPLY_FLAGS: tuple = ('POWER', 'VIDEO_OUT_EN', 'VIDEO_OUT_STATE', 'CTRL_CHNL_STATE')
 
     # Master-driven parameters
     POWER = Par('Power', 'p', bool)  # ack by POWER_STATE device property
@@ -35,26 +42,30 @@ class MWXC(Device):
 
     def wrap(self, data: bytes) -> bytes:
         with self.lock:
-            return struct.pack('< B', bitsarray(self.POWER, self.VIDEO_OUT_EN)) + data
+            return struct.pack('< B', self.commandFlags()) + data
 
     def unwrap(self, packet: bytes) -> bytes:
         self.validateReply(packet)
-        cls = self.__class__
         with self.lock:
-            POWER_STATE, VIDEO_IN_STATE, VIDEO_OUT_STATE, CTRL_CHNL_STATE = flags(packet[0], 4)
-            # ▼ Access parameters via class to get a descriptor, not parameter value
-            cls.POWER.ack(POWER_STATE)
-            cls.VIDEO_OUT_EN.ack(VIDEO_IN_STATE)
-            self.VIDEO_OUT_STATE = VIDEO_OUT_STATE
-            self.CTRL_CHNL_STATE = CTRL_CHNL_STATE
+            self.ackReplyFlags(packet[0])
         return packet[1:]
 
-    def sendNative(self, com, data: bytes) -> int:
+    def nativeCommandFrame(self, data: bytes) -> bytes:
+        data = self.APP_STARTBYTE_COMMAND + data
+        return data + rfc1071(data)
+
+    def nativeReplyFrame(self, data: bytes) -> bytes:
         data = self.APP_STARTBYTE_REPLY + data
-        return com.write(data + rfc1071(data))
+        return data + rfc1071(data)
+
+    def sendNative(self, com, data: bytes) -> int:
+        return com.write(self.nativeReplyFrame(data))
 
-    def receiveNative(self, com) -> bytes:
+    def receiveNative(self, com, stopEvent: Event = None) -> bytes:
         startByte = com.read(1)
+        if not startByte:
+            # ▼ Read has timed out or has been cancelled — nothing to search through
+            raise SerialReadTimeoutError("No data from MWXC control software")
         if (startByte != self.APP_STARTBYTE_COMMAND):
             log.warning(f"Bad data in front of the stream: {bytewise(startByte)}. Searching for valid startbyte...")
             for i in range(1, self.APP_PACKET_SIZE):
@@ -67,6 +78,11 @@ class MWXC(Device):
             else: raise SerialCommunicationError("Cannot find header in datastream, too many attempts...")
 
         nativePacket = startByte + com.readSimple(self.APP_PACKET_SIZE - 1)
+        # ▼ Read returns early on timeout (slow NCS) or cancellation (see App.requestUrgentTransaction()),
+        #   so the rest is awaited a few more times, unless read has been cancelled on stop
+        for _ in range(self.APP_PACKET_SIZE):
+            if len(nativePacket) == self.APP_PACKET_SIZE or (stopEvent is not None and stopEvent.is_set()): break
+            nativePacket += com.readSimple(self.APP_PACKET_SIZE - len(nativePacket))
         if len(nativePacket) != self.APP_PACKET_SIZE:
             raise BadDataError(f"Bad packet (data too small, [{len(nativePacket)}] out of [{self.APP_PACKET_SIZE}])",
                                dataname="Packet", data=nativePacket)
@@ -79,5 +95,5 @@ class MWXC(Device):
         return self.IDLE_PAYLOAD
 
     def validateReply(self, reply: bytes):
-        if (len(reply) != 18): raise DataInvalidError(f"Invalid reply packet size (expected 18, "
-                                                      f"got {len(reply)})")
+        if (len(reply) != self.REPLY_MAX_SIZE):
+            raise DataInvalidError(f"Invalid reply packet size (expected {self.REPLY_MAX_SIZE}, got {len(reply)})")
@@ -1,6 +1,8 @@
 import struct
+from threading import Event
 
-from Utils import bitsarray, flags, flag, Logger
+from Utils import flag, Logger
+from Transceiver.errors import SerialReadTimeoutError
 
 from device import Device, Par, Prop, DataInvalidError
 
@@ -22,6 +24,15 @@ class SONY(Device):
     # Internal service attrs
     APP_PACKET_MAX_SIZE: int = 18
     APP_TERMINATOR: bytes = b'\xFF'
+    WRAP_HEADER_SIZE: int = 2
+    REPLY_MAX_SIZE: int = APP_PACKET_MAX_SIZE
+    IDEMPOTENT_COMMANDS: frozenset = frozenset({0x09})  # inquiries
+    CACHEABLE_COMMANDS: frozenset = frozenset({0x09})  # inquiries
+    INVALIDATING_COMMANDS: frozenset = frozenset({0x01})  # commands
+    RETRANSMIT_LIMIT: int = 8  # max attempts to resend command not consumed by device
+    SEQUENCE_MODULO: int = 0x100  # CNT_IN / CNT_OUT are transferred as single byte
+    COMMAND_FLAGS: tuple = ('POWER', 'RESET', 'VIDEO_IN_EN', 'VIDEO_OUT_EN')
+    REPLY_FLAGS: tuple = ('POWER', 'RESET', 'VIDEO_IN_EN', 'VIDEO_OUT_EN')
 
     # Master-driven parameters
     POWER = Par('Power', 'p', bool)
@@ -33,46 +44,88 @@ class SONY(Device):
     CNT_IN = Prop('Incoming msgs counter', 'in', int)
     CNT_OUT = Prop('Outgoing msgs counter', 'out', int)
 
+    def __init__(self):
+        super().__init__()
+        self.unconsumed: bytes = None  # most recent command until device echoes its number in CNT_OUT
+        self.resendRequired: bool = False
+        self.nResends: int = 0  # attempts made to resend .unconsumed command
+
     def wrap(self, data: bytes) -> bytes:
         with self.lock:
-            if data != self.IDLE_PAYLOAD: self.CNT_IN += 1
-            header = bitsarray(self.POWER, self.RESET, self.VIDEO_IN_EN, self.VIDEO_OUT_EN), self.CNT_IN % 0x100
+            if self.resendRequired and data == self.unconsumed:
+                # ▼ Same command number, so device will not execute the command twice
+                self.resendRequired = False
+                self.nResends += 1
+            elif data != self.IDLE_PAYLOAD:
+                self.CNT_IN += 1
+                self.unconsumed = data
+                self.resendRequired = False
+                self.nResends = 0
+            header = self.commandFlags(), self.CNT_IN % 0x100
             return struct.pack('< B B', *header) + data
 
     def unwrap(self, packet: bytes) -> bytes:
         self.validateReply(packet)
-        cls = self.__class__
-        POWER_STATE, RESET_STATE, VIDEO_IN_STATE, VIDEO_OUT_STATE = flags(packet[0], 4)
         with self.lock:
-            # ▼ Access parameters via class to get a descriptor, not parameter value
-            cls.POWER.ack(POWER_STATE)
-            cls.RESET.ack(RESET_STATE)
-            cls.VIDEO_IN_EN.ack(VIDEO_IN_STATE)
-            cls.VIDEO_OUT_EN.ack(VIDEO_OUT_STATE)
+            self.ackReplyFlags(packet[0])
             self.CNT_OUT = packet[1]
+            self.checkConsumed()
         return packet[2:]
 
-    def sendNative(self, com, data: bytes) -> int:
+    def checkConsumed(self):
+        if self.unconsumed is None or self.windowed: return
+        if self.CNT_OUT == self.CNT_IN % 0x100:
+            self.unconsumed = None
+            self.resendRequired = False
+        elif self.nResends < self.RETRANSMIT_LIMIT:
+            self.resendRequired = True
+        else:
+            log.error(f"Device has not consumed message #{self.CNT_IN} after {self.nResends} retransmissions")
+            self.unconsumed = None
+            self.resendRequired = False
+
+    def retransmission(self) -> bytes:
+        with self.lock:
+            return self.unconsumed if self.resendRequired else None
+
+    def nativeReplyFrame(self, data: bytes) -> bytes:
         # ▼ SONY native control software does not accept '00's
         if data == b'\x00' * 16: data = self.APP_TERMINATOR
         endIndex = data.find(self.APP_TERMINATOR)
-        return com.write(data[:endIndex+1])
+        return data[:endIndex+1]
 
-    def receiveNative(self, com) -> bytes:
-        inputBuffer = b''.join(self.readUpToFirstFF(com))
+    def sendNative(self, com, data: bytes) -> int:
+        return com.write(self.nativeReplyFrame(data))
+
+    def receiveNative(self, com, stopEvent: Event = None) -> bytes:
+        inputBuffer = b''.join(self.readUpToFirstFF(com, stopEvent))
         if (com.in_waiting != 0):
             log.warning(f"Unread data ({com.in_waiting} bytes) is left in a serial datastream")
         self.validateCommandNative(inputBuffer)
         return inputBuffer
 
+    def sequenceNumber(self, packet: bytes) -> int:
+        return packet[1]
+
+    def commandType(self, data: bytes) -> int:
+        return data[1] if len(data) > 1 else None
+
     @staticmethod
-    def readUpToFirstFF(com):
+    def readUpToFirstFF(com, stopEvent: Event = None):
         byte = com.read()
         while byte == b'\xFF':
             byte = com.read()  # skip all leading 'FF's
+        if not byte:
+            raise SerialReadTimeoutError("No data from SONY control software")
         yield byte
         for _ in range(15):  # first byte has been already read a line above
             byte = com.read()
+            if not byte:
+                # ▼ Read returns early on timeout (slow NCS) or cancellation (see App.requestUrgentTransaction()),
+                #   while read cancelled on stop is not resumed
+                if stopEvent is not None and stopEvent.is_set():
+                    raise DataInvalidError("Bad data from SONY control software — message is incomplete")
+                continue
             yield byte
             if byte == b'\xFF': return
         raise DataInvalidError(f"Bad data from SONY control software — message size is > 16 bytes")
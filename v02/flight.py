@@ -0,0 +1,114 @@
+import struct
+import sys
+import traceback
+from datetime import datetime
+from time import time_ns
+from typing import List, NamedTuple
+
+from Utils import Logger, auto_repr
+
+log = Logger("Flight")
+log.setLevel('DEBUG')
+
+OUTCOMES = ('ok', 'timeout', 'bad reply', 'write failed')  # see FlightRecorder.OK, etc.
+
+# Slot layout: time, ns (8) + outcome (1) + device address (1) + command size (2) + reply size (2)
+#   + write time, µs (4) + reply time, µs (4) + reply timeout, µs (4) + command + reply (both truncated to maxData)
+SLOT_HEADER = struct.Struct('< Q B B H H I I I')
+
+
+class Entry(NamedTuple):
+    time: int  # ns since epoch
+    outcome: int
+    address: int
+    writeTime: int  # µs spent writing command to device port
+    replyTime: int  # µs from command sent to reply received (or given up)
+    timeout: int  # µs, device reply timeout at the moment
+    command: bytes  # wrapped command (truncated)
+    reply: bytes  # device reply (truncated)
+    commandSize: int  # full size
+    replySize: int  # full size
+
+    def __str__(self):
+        time = datetime.fromtimestamp(self.time / 1e9).strftime('%H:%M:%S.%f')
+        truncated = lambda data, size: data.hex(' ').upper() + (f" …(+{size - len(data)})" if size > len(data) else '')
+        return (f"{time} #{self.address:<3} {OUTCOMES[self.outcome]:<12} write {self.writeTime:>6}µs "
+                f"reply {self.replyTime:>7}µs (timeout {self.timeout}µs)\n"
+                f"    ► {truncated(self.command, self.commandSize)}\n"
+                f"    ◄ {truncated(self.reply, self.replySize)}")
+
+
+class FlightRecorder:
+    """ Fixed-size binary ring buffer of the most recent device transactions
+        Recording only packs numbers and copies bytes into preallocated buffer — nothing is formatted
+            until buffer is dumped, so recorder could stay always on
+        Intended for single producer (comm thread), dump is a best-effort snapshot
+    """
+
+    # Transaction outcomes
+    OK: int = 0
+    TIMEOUT: int = 1
+    BAD_REPLY: int = 2
+    WRITE_FAILED: int = 3
+
+    def __init__(self, capacity: int = 256, maxData: int = 64):
+        self.capacity: int = capacity
+        self.maxData: int = maxData
+        self.slotSize: int = SLOT_HEADER.size + 2 * maxData
+        self.buffer = bytearray(self.slotSize * capacity)
+        self.view = memoryview(self.buffer)
+        self.nRecorded: int = 0
+        self.nDumps: int = 0
+
+    def __len__(self):
+        return min(self.nRecorded, self.capacity)
+
+    def __repr__(self):
+        return auto_repr(self, f"{len(self)}/{self.capacity} transactions")
+
+    def record(self, outcome: int, address: int, command: bytes, reply: bytes,
+               writeTime: float, replyTime: float, timeout: float):
+        """ Save transaction to the next slot, timings are in seconds """
+        offset = (self.nRecorded % self.capacity) * self.slotSize
+        maxData = self.maxData
+        commandSize, replySize = len(command), len(reply)
+        SLOT_HEADER.pack_into(self.buffer, offset, time_ns(), outcome, address, commandSize, replySize,
+                              int(writeTime * 1e6), int(replyTime * 1e6), int(timeout * 1e6))
+        offset += SLOT_HEADER.size
+        size = min(commandSize, maxData)
+        self.view[offset:offset + size] = command[:size]
+        size = min(replySize, maxData)
+        self.view[offset + maxData:offset + maxData + size] = reply[:size]
+        self.nRecorded += 1
+
+    def entries(self) -> List[Entry]:
+        """ Recorded transactions, oldest first """
+        first = max(self.nRecorded - self.capacity, 0)
+        entries = []
+        for n in range(first, self.nRecorded):
+            offset = (n % self.capacity) * self.slotSize
+            time, outcome, address, commandSize, replySize, writeTime, replyTime, timeout = \
+                SLOT_HEADER.unpack_from(self.buffer, offset)
+            offset += SLOT_HEADER.size
+            command = bytes(self.view[offset:offset + min(commandSize, self.maxData)])
+            offset += self.maxData
+            reply = bytes(self.view[offset:offset + min(replySize, self.maxData)])
+            entries.append(Entry(time, outcome, address, writeTime, replyTime, timeout,
+                                 command, reply, commandSize, replySize))
+        return entries
+
+    def dump(self, path: str, reason: str = 'on demand') -> int:
+        """ Write recorded transactions (and exception being handled, if any) to text file, return their number """
+        entries = self.entries()
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(f"Flight recorder dump ({reason}) at {datetime.now().isoformat(' ')}\n")
+            file.write(f"{len(entries)} of {self.nRecorded} transactions recorded since start\n\n")
+            for entry in entries: file.write(f"{entry}\n")
+            if sys.exc_info()[0] is not None:
+                file.write(f"\nError being handled:\n{traceback.format_exc()}")
+        self.nDumps += 1
+        log.info(f"Flight recorder dumped to {path} ({len(entries)} transactions)")
+        return len(entries)
+
+    def stats(self) -> dict:
+        return dict(capacity=self.capacity, recorded=self.nRecorded, dumps=self.nDumps)
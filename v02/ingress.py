@@ -0,0 +1,106 @@
+from collections import deque
+from threading import Lock
+from time import monotonic
+from typing import Any, Deque, NamedTuple, Optional, Set
+
+from Utils import Logger, auto_repr
+
+log = Logger("Ingress")
+log.setLevel('DEBUG')
+
+
+# Overload policies:
+#   'drop-oldest'     ––► when queue is full, oldest command is dropped to make room for the new one
+#   'drop-duplicates' ––► new command is dropped if the same one is already queued (+ 'drop-oldest' when full)
+#   'deadline'        ––► commands queued longer than deadline are expired on retrieval (+ 'drop-oldest' when full)
+POLICIES = ('drop-oldest', 'drop-duplicates', 'deadline')
+
+
+class Command(NamedTuple):
+    data: bytes
+    source: Any  # device instance that framed the command
+    received: float  # monotonic time, sec
+
+
+class IngressQueue:
+    """ Bounded queue of framed NCS commands with overload policy """
+
+    def __init__(self, maxsize: int, policy: str = 'drop-oldest', deadline: float = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid ingress policy '{policy}', expected one of: {', '.join(POLICIES)}")
+        if policy == 'deadline' and not deadline:
+            raise ValueError("Deadline is required for 'deadline' ingress policy")
+        self.maxsize: int = max(maxsize, 1)
+        self.policy: str = policy
+        self.deadline: float = deadline  # sec
+        self.queue: Deque[Command] = deque()
+        self.keys: Set[bytes] = set()  # data of queued commands, kept for 'drop-duplicates' policy only
+        self.lock = Lock()
+
+        self.nReceived: int = 0
+        self.nDroppedOverflow: int = 0
+        self.nDroppedDuplicate: int = 0
+        self.nExpired: int = 0
+        self.nCoalesced: int = 0
+        self.maxDepth: int = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.policy}, {len(self.queue)}/{self.maxsize}")
+
+    def put(self, data: bytes, source=None) -> bool:
+        """ Enqueue command, return False if it has been dropped by overload policy """
+        with self.lock:
+            self.nReceived += 1
+            if self.policy == 'drop-duplicates':
+                if data in self.keys:
+                    self.nDroppedDuplicate += 1
+                    log.debug(f"Duplicate command dropped ({len(self.queue)} queued)")
+                    return False
+                self.keys.add(data)
+            if len(self.queue) >= self.maxsize:
+                self.popOldest()
+                self.nDroppedOverflow += 1
+                log.debug(f"Queue is full ({self.maxsize}) — oldest command dropped")
+            self.queue.append(Command(data, source, monotonic()))
+            self.maxDepth = max(self.maxDepth, len(self.queue))
+            return True
+
+    def get(self) -> Optional[Command]:
+        """ Dequeue oldest command which is not expired, return None if there is no such command """
+        with self.lock:
+            while self.queue:
+                command = self.popOldest()
+                if self.policy == 'deadline' and monotonic() - command.received > self.deadline:
+                    self.nExpired += 1
+                    continue
+                return command
+            return None
+
+    def coalesce(self, command: Command, window: float) -> int:
+        """ Remove commands identical to `command` that directly follow it in the queue
+                and have been received within `window` sec after it, return their number
+        """
+        with self.lock:
+            nMerged = 0
+            while self.queue:
+                following = self.queue[0]
+                if following.data != command.data or following.source is not command.source: break
+                if following.received - command.received > window: break
+                self.popOldest()
+                nMerged += 1
+            self.nCoalesced += nMerged
+            return nMerged
+
+    def popOldest(self) -> Command:
+        """ Remove the first command from the queue — the lock has to be held """
+        command = self.queue.popleft()
+        self.keys.discard(command.data)
+        return command
+
+    def stats(self) -> dict:
+        return dict(policy=self.policy, depth=len(self.queue), maxDepth=self.maxDepth, size=self.maxsize,
+                    received=self.nReceived, droppedOverflow=self.nDroppedOverflow,
+                    droppedDuplicate=self.nDroppedDuplicate, expired=self.nExpired, coalesced=self.nCoalesced)
@@ -0,0 +1,318 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from random import Random
+from threading import Thread
+from time import perf_counter, sleep
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+from Transceiver import rfc1071
+from Utils import Logger, auto_repr, bytewise
+
+from device import Device
+from devices.mwxc import MWXC
+from devices.sony import SONY
+
+log = Logger("LoadGen")
+log.setLevel('DEBUG')
+
+# NCS side load: native control software emulation driving the proxy app port
+# Modes:
+#   'closed' ––► next command is sent as soon as reply to the previous one arrives (or times out)
+#   'fixed'  ––► same, but commands are paced at given rate (rate is an upper bound if proxy is slower)
+#   'open'   ––► commands are sent at given rate regardless of replies, latency is counted from scheduled send time,
+#                  so proxy stalls are not hidden by delayed sending
+# Native protocols carry no sequence numbers, so in open loop replies are matched to commands in order
+# Lines: 'pty' (proxy opens printed path as APP_COM_PORT), serial port name, 'tcp://host:port' or in-process port
+
+MODES = ('closed', 'fixed', 'open')
+
+
+class NativeProtocol(ABC):
+    """ NCS side of device native protocol: command mixes, command framing and reply extraction """
+
+    deviceClass: Type[Device] = None
+    MIXES: Dict[str, Sequence[Tuple[float, bytes]]] = {}  # mix name ––► (weight, command data) pairs
+
+    def __init__(self):
+        self.device: Device = self.deviceClass()
+
+    def __repr__(self):
+        return auto_repr(self, self.deviceClass.__name__)
+
+    def commandFrame(self, data: bytes) -> bytes:
+        return self.device.nativeCommandFrame(data)
+
+    @abstractmethod
+    def extractReply(self, buffer: bytearray) -> Tuple[Optional[bytes], int]:
+        """ Take the first complete reply frame from `buffer`, return (reply or None, number of bytes skipped) """
+
+
+class SonyNative(NativeProtocol):
+    deviceClass = SONY
+    MIXES = {
+        'inquiry': ((1, bytes.fromhex('81 09 04 00 FF')), (1, bytes.fromhex('81 09 04 47 FF'))),
+        'command': ((1, bytes.fromhex('81 01 04 00 02 FF')), (1, bytes.fromhex('81 01 04 07 02 FF')),
+                    (1, bytes.fromhex('81 01 04 07 00 FF'))),
+        'mixed': ((4, bytes.fromhex('81 09 04 00 FF')), (3, bytes.fromhex('81 09 04 47 FF')),
+                  (2, bytes.fromhex('81 01 04 07 02 FF')), (1, bytes.fromhex('81 01 04 07 00 FF'))),
+    }
+
+    def extractReply(self, buffer: bytearray) -> Tuple[Optional[bytes], int]:
+        end = buffer.find(SONY.APP_TERMINATOR)
+        if end < 0: return None, 0
+        reply = bytes(buffer[:end + 1])
+        del buffer[:end + 1]
+        return reply, 0
+
+
+class MwxcNative(NativeProtocol):
+    deviceClass = MWXC
+    REPLY_SIZE: int = len(MWXC.APP_STARTBYTE_REPLY) + MWXC.REPLY_MAX_SIZE - MWXC.WRAP_HEADER_SIZE + 2
+    MIXES = {
+        'static': ((1, bytes.fromhex('01 00 00 00 00 00 00 00 00 00')),),
+        'varying': tuple((1, bytes([0x01, 0x01, n, 0, 0, 0, 0, 0, 0, n])) for n in range(8)),
+    }
+
+    def extractReply(self, buffer: bytearray) -> Tuple[Optional[bytes], int]:
+        skipped = 0
+        while True:
+            start = buffer.find(MWXC.APP_STARTBYTE_REPLY)
+            if start < 0:
+                skipped += len(buffer)
+                buffer.clear()
+                return None, skipped
+            if start:
+                skipped += start
+                del buffer[:start]
+            if len(buffer) < self.REPLY_SIZE: return None, skipped
+            reply = bytes(buffer[:self.REPLY_SIZE])
+            if int.from_bytes(rfc1071(reply), byteorder='big') == 0:
+                del buffer[:self.REPLY_SIZE]
+                return reply, skipped
+            skipped += 1
+            del buffer[:1]
+
+
+PROTOCOLS: Dict[str, Type[NativeProtocol]] = {'sony': SonyNative, 'mwxc': MwxcNative}
+
+
+class SerialLine:
+    """ Serial port (real or virtual) as load generator line """
+
+    def __init__(self, port: str, deviceClass: Type[Device]):
+        from serial import Serial
+        self.serial = Serial(port, baudrate=deviceClass.APP_BAUDRATE, parity=deviceClass.APP_PARITY, timeout=0)
+        self.path: str = port
+
+    def write(self, data: bytes) -> int:
+        return self.serial.write(data)
+
+    def readAvailable(self, timeout: float) -> bytes:
+        self.serial.timeout = timeout
+        data = self.serial.read(1)
+        if data and self.serial.in_waiting: data += self.serial.read(self.serial.in_waiting)
+        return data
+
+    def close(self):
+        self.serial.close()
+
+
+class SocketLine:
+    """ TCP connection as load generator line """
+
+    def __init__(self, host: str, port: int):
+        import socket
+        self.socket = socket.create_connection((host, port))
+        self.timeoutError = socket.timeout
+        self.path: str = f"tcp://{host}:{port}"
+
+    def write(self, data: bytes) -> int:
+        self.socket.sendall(data)
+        return len(data)
+
+    def readAvailable(self, timeout: float) -> bytes:
+        self.socket.settimeout(timeout)
+        try: return self.socket.recv(4096)
+        except self.timeoutError: return b''
+
+    def close(self):
+        self.socket.close()
+
+
+def openLine(spec: str, deviceClass: Type[Device]):
+    """ Line by spec: 'pty', 'tcp://host:port' or serial port name """
+    if spec == 'pty':
+        from simulator import PtyPort
+        return PtyPort()
+    if spec.startswith('tcp://'):
+        host, _, port = spec[len('tcp://'):].rpartition(':')
+        return SocketLine(host, int(port))
+    return SerialLine(spec, deviceClass)
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """ Nearest-rank percentile of sorted `values` """
+    if not values: return float('nan')
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class LoadReport(NamedTuple):
+    mode: str
+    sent: int
+    received: int
+    timeouts: int
+    skippedBytes: int  # reply stream bytes that are not part of valid replies
+    elapsed: float  # sec
+    latencies: List[float]  # sec, sorted
+
+    @property
+    def throughput(self) -> float:
+        return self.received / self.elapsed if self.elapsed else 0
+
+    def summary(self) -> dict:
+        """ Report without raw latencies, times in ms """
+        ms = lambda fraction: round(percentile(self.latencies, fraction) * 1000, 3)
+        return dict(mode=self.mode, sent=self.sent, received=self.received, timeouts=self.timeouts,
+                    skippedBytes=self.skippedBytes, elapsed=round(self.elapsed, 3),
+                    throughput=round(self.throughput, 1), p50=ms(0.5), p99=ms(0.99), p999=ms(0.999),
+                    max=round(self.latencies[-1] * 1000, 3) if self.latencies else float('nan'))
+
+    def __str__(self):
+        s = self.summary()
+        return (f"{s['mode']}: {s['sent']} sent, {s['received']} received, {s['timeouts']} timeouts "
+                f"in {s['elapsed']} sec ({s['throughput']} tx/s), latency p50 {s['p50']} ms, "
+                f"p99 {s['p99']} ms, p99.9 {s['p999']} ms, max {s['max']} ms")
+
+
+class LoadGenerator:
+    """ Send native commands to the proxy and measure round-trip time to proxied replies """
+
+    def __init__(self, protocol: NativeProtocol, line, mode: str = 'closed', rate: float = 100.0,
+                 mix: str = None, timeout: float = 0.5, seed: int = None):
+        if mode not in MODES: raise ValueError(f"Invalid mode '{mode}', expected one of: {', '.join(MODES)}")
+        if mode != 'closed' and rate <= 0: raise ValueError(f"Rate is required for '{mode}' mode")
+        mix = mix or next(iter(protocol.MIXES))
+        if mix not in protocol.MIXES:
+            raise ValueError(f"Invalid {protocol.deviceClass.__name__} command mix '{mix}', "
+                             f"expected one of: {', '.join(protocol.MIXES)}")
+        self.protocol: NativeProtocol = protocol
+        self.line = line
+        self.mode: str = mode
+        self.rate: float = rate  # commands per sec
+        self.timeout: float = timeout  # sec, reply wait limit
+        weights, commands = zip(*protocol.MIXES[mix])
+        self.frames: Tuple[bytes, ...] = tuple(protocol.commandFrame(data) for data in commands)
+        self.weights: Tuple[float, ...] = weights
+        self.rng = Random(seed)
+        self.buffer = bytearray()
+        self.skippedBytes: int = 0
+
+    def __repr__(self):
+        line = getattr(self.line, 'path', 'loopback')
+        return auto_repr(self, f"{self.protocol.deviceClass.__name__} {self.mode} on {line}")
+
+    def nextFrame(self) -> bytes:
+        return self.rng.choices(self.frames, self.weights)[0]
+
+    def readReply(self, deadline: float) -> Optional[bytes]:
+        """ Wait for the next complete reply until `deadline` (perf_counter time) """
+        while True:
+            reply, skipped = self.protocol.extractReply(self.buffer)
+            self.skippedBytes += skipped
+            if reply is not None: return reply
+            remaining = deadline - perf_counter()
+            if remaining <= 0: return None
+            self.buffer += self.line.readAvailable(remaining)
+
+    def run(self, count: int = None, duration: float = None) -> LoadReport:
+        """ Send `count` commands or keep sending for `duration` sec (whichever comes first) """
+        if count is None and duration is None: raise ValueError("Either count or duration is required")
+        if self.mode == 'open': report = self.openLoop(count, duration)
+        else: report = self.closedLoop(count, duration)
+        log.info(f"{self.protocol.deviceClass.__name__} {report}")
+        return report
+
+    def closedLoop(self, count: Optional[int], duration: Optional[float]) -> LoadReport:
+        sent = timeouts = 0
+        latencies = []
+        startedAt = perf_counter()
+        period = 1 / self.rate if self.mode == 'fixed' else 0
+        while (count is None or sent < count) and (duration is None or perf_counter() - startedAt < duration):
+            if period:
+                delay = startedAt + sent * period - perf_counter()
+                if delay > 0: sleep(delay)
+            frame = self.nextFrame()
+            sentAt = perf_counter()
+            self.line.write(frame)
+            sent += 1
+            if self.readReply(sentAt + self.timeout) is None:
+                timeouts += 1
+                log.debug(f"No reply to [{bytewise(frame)}]")
+            else:
+                latencies.append(perf_counter() - sentAt)
+        latencies.sort()
+        return LoadReport(self.mode, sent, len(latencies), timeouts, self.skippedBytes,
+                          perf_counter() - startedAt, latencies)
+
+    def openLoop(self, count: Optional[int], duration: Optional[float]) -> LoadReport:
+        scheduled = deque()  # send times of commands awaiting replies
+        period = 1 / self.rate
+        startedAt = perf_counter()
+        nSent = 0
+
+        def sender():
+            nonlocal nSent
+            while (count is None or nSent < count) and (duration is None or nSent * period < duration):
+                sendAt = startedAt + nSent * period
+                delay = sendAt - perf_counter()
+                if delay > 0: sleep(delay)
+                self.line.write(self.nextFrame())
+                scheduled.append(sendAt)
+                nSent += 1
+
+        thread = Thread(name='LoadGen sender', target=sender, daemon=True)
+        thread.start()
+        timeouts = 0
+        latencies = []
+        while thread.is_alive() or scheduled:
+            if not scheduled:
+                sleep(period / 4)
+                continue
+            reply = self.readReply(min(scheduled[0] + self.timeout, perf_counter() + period))
+            now = perf_counter()
+            if reply is not None:
+                latencies.append(now - scheduled.popleft())
+            # ▼ Commands without reply within timeout are given up
+            while scheduled and now - scheduled[0] > self.timeout:
+                scheduled.popleft()
+                timeouts += 1
+        thread.join()
+        latencies.sort()
+        return LoadReport(self.mode, nSent, len(latencies), timeouts, self.skippedBytes,
+                          perf_counter() - startedAt, latencies)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Emulate native control software load on ProtocolProxy app port")
+    parser.add_argument('device', choices=PROTOCOLS, help="device native protocol")
+    parser.add_argument('line', help="'pty', serial port name or 'tcp://host:port'")
+    parser.add_argument('--mode', choices=MODES, default='closed')
+    parser.add_argument('--rate', type=float, default=100.0, help="commands per sec ('fixed' and 'open' modes)")
+    parser.add_argument('--mix', default=None, help="command mix name (default is the first one of protocol)")
+    parser.add_argument('--count', type=int, default=None, help="number of commands to send")
+    parser.add_argument('--duration', type=float, default=10.0, help="load duration, sec")
+    parser.add_argument('--timeout', type=float, default=0.5, help="reply wait limit, sec")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    protocol = PROTOCOLS[args.device]()
+    line = openLine(args.line, protocol.deviceClass)
+    if args.line == 'pty':
+        input(f"NCS line: {line.path} (set it as APP.APP_COM_PORT), press Enter to start...")
+    try:
+        generator = LoadGenerator(protocol, line, args.mode, args.rate, args.mix, args.timeout, args.seed)
+        print(generator.run(args.count, args.duration))
+    finally:
+        line.close()
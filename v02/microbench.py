@@ -0,0 +1,213 @@
+import gc
+import tracemalloc
+from itertools import repeat
+from time import perf_counter_ns
+from typing import Callable, Dict, NamedTuple
+
+from Transceiver import PelengTransceiver, rfc1071
+from Utils import Logger
+from orderedset import OrderedSet
+
+from device import Par, Prop
+from devices.mwxc import MWXC
+from devices.sony import SONY
+from notifier import Notifier
+from peleng import packFrame, unpackFrame, Rfc1071
+from replay import ReplayPort
+
+log = Logger("Microbench")
+log.setLevel('DEBUG')
+
+# Hot path microbenchmarks, reported per operation:
+#   ns      ––► best of REPEATS timed runs (garbage collector is off), includes one Python call — see 'call' row
+#   alloc   ––► bytes allocated at peak while operation runs (tracemalloc), i.e. transient garbage it produces
+#   retained ––► bytes left allocated after operation (tracemalloc), non-zero means state grows with each call
+# CPython does not count allocations without a debug build, so allocated / retained bytes stand for them
+
+REPEATS = 5
+MEMORY_RUNS = 200
+N_HANDLERS = 8
+
+
+class Result(NamedTuple):
+    name: str
+    ns: float  # per op
+    allocated: float  # bytes per op
+    retained: float  # bytes per op
+    loops: int  # ops per timed run
+
+    def __str__(self):
+        return f"{self.name:<28} {self.ns:>10.1f} ns {self.allocated:>9.1f} B {self.retained:>9.1f} B"
+
+
+def timeLoops(op: Callable, loops: int) -> int:
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        startedAt = perf_counter_ns()
+        for _ in repeat(None, loops): op()
+        return perf_counter_ns() - startedAt
+    finally:
+        if gcEnabled: gc.enable()
+
+
+def measure(name: str, op: Callable, minTime: float = 0.2) -> Result:
+    """ Time `op` (loops count is grown until run takes at least `minTime` / REPEATS), then trace its memory """
+    loops = 1
+    while timeLoops(op, loops) < minTime * 1e9 / REPEATS: loops *= 4
+    ns = min(timeLoops(op, loops) for _ in range(REPEATS)) / loops
+
+    tracemalloc.start()
+    try:
+        allocated = 0
+        retainedFrom, _ = tracemalloc.get_traced_memory()
+        for _ in range(MEMORY_RUNS):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            op()
+            allocated += tracemalloc.get_traced_memory()[1] - current
+        retained = tracemalloc.get_traced_memory()[0] - retainedFrom
+    finally:
+        tracemalloc.stop()
+    return Result(name, ns, allocated / MEMORY_RUNS, retained / MEMORY_RUNS, loops)
+
+
+def benchmarks() -> Dict[str, Callable]:
+    """ Benchmark name ––► operation, fixtures are prepared here and reset inside operations where needed
+        Fixtures register events and handlers in global Notifier — see run(), which restores them afterwards
+    """
+    ops: Dict[str, Callable] = {'call': lambda: None}
+
+    class Bench:
+        """ Owner of standalone parameters, so that device classes state is not touched by Par / Prop benchmarks """
+        FLAG = Par('Benchmark flag', 'bf', bool)
+        STATE = Prop('Benchmark state', 'bs', bool)
+
+    # Notifier
+    Notifier.addEvents('bench 0', 'bench 1', f'bench {N_HANDLERS}')
+    Notifier.addHandler('bench 1', lambda *args: None)
+    for _ in range(N_HANDLERS): Notifier.addHandler(f'bench {N_HANDLERS}', lambda *args: None)
+    ops['notify 0 handlers'] = lambda: Notifier.notify('bench 0', 'FLAG', True)
+    ops['notify 1 handler'] = lambda: Notifier.notify('bench 1', 'FLAG', True)
+    ops[f'notify {N_HANDLERS} handlers'] = lambda: Notifier.notify(f'bench {N_HANDLERS}', 'FLAG', True)
+
+    # Par.ack branches (status / value are assigned directly, as .__set__() would notify)
+    par = Bench.FLAG
+
+    def ackNoChange():
+        par.value = par.status = True
+        par.ack(True)
+
+    def ackConnection():
+        par.value, par.status = True, None
+        par.ack(True)
+
+    def ackUpdated():
+        par.value, par.status = True, False
+        par.ack(True)
+
+    def ackUnexpected():
+        par.value = par.status = False
+        par.ack(True)
+
+    ops.update({'Par.ack no change': ackNoChange, 'Par.ack connection': ackConnection,
+                'Par.ack updated': ackUpdated, 'Par.ack unexpected': ackUnexpected})
+
+    # Prop.__set__
+    bench = Bench()
+
+    def propChanged():
+        bench.STATE = not Bench.STATE.value
+
+    def propUnchanged():
+        bench.STATE = Bench.STATE.value
+
+    ops.update({'Prop.__set__ changed': propChanged, 'Prop.__set__ unchanged': propUnchanged})
+
+    # SONY
+    sony = SONY()
+    sonyCommand = bytes.fromhex('81 01 04 07 02 FF')
+    sonyReply = bytes.fromhex('01 00 90 50 FF')
+    ops['SONY.wrap'] = lambda: sony.wrap(sonyCommand)
+    ops['SONY.unwrap'] = lambda: sony.unwrap(sonyReply)
+
+    # MWXC
+    mwxc = MWXC()
+    mwxcCommand = bytes.fromhex('01 01 00 00 00 00 00 00 00 00')
+    mwxcReply = bytes(MWXC.REPLY_MAX_SIZE)
+    mwxcFrame = mwxc.nativeCommandFrame(mwxcCommand)
+    port = ReplayPort()
+
+    def mwxcReceiveNative():
+        port.reset_input_buffer()
+        port.feed(mwxcFrame)
+        mwxc.receiveNative(port)
+
+    ops['MWXC.wrap'] = lambda: mwxc.wrap(mwxcCommand)
+    ops['MWXC.unwrap'] = lambda: mwxc.unwrap(mwxcReply)
+    ops['MWXC.receiveNative'] = mwxcReceiveNative
+
+    # Checksum and Peleng framing
+    for size in (18, 256, 4096):
+        data = bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+        ops[f'rfc1071 {size} B'] = lambda data=data: rfc1071(data)
+    bulk = bytes(range(256)) * 16
+    ops['Rfc1071 4096 B in 4 parts'] = lambda: Rfc1071().update(bulk[:1024]).update(bulk[1024:2048]) \
+        .update(bulk[2048:3072]).update(bulk[3072:]).digest()
+    payload = sony.wrap(b'\xFF' * 16)
+    packet = packFrame(SONY.DEV_ADDRESS, payload)
+    ops['peleng packFrame 18 B'] = lambda: packFrame(SONY.DEV_ADDRESS, payload)
+    ops['peleng unpackFrame 18 B'] = lambda: unpackFrame(packet)
+
+    # PelengTransceiver packet assembly (port is not opened, .write() is stubbed out)
+    try:
+        transceiver = PelengTransceiver(device=SONY.DEV_ADDRESS)
+    except Exception as e:
+        log.error(f"PelengTransceiver benchmarks skipped: {e.__class__.__name__}: {e}")
+    else:
+        transceiver.write = len
+        ops['PelengTransceiver.sendPacket 18 B'] = lambda: transceiver.sendPacket(payload)
+    return ops
+
+
+def run(pattern: str = '', minTime: float = 0.2) -> Dict[str, Result]:
+    results = {}
+    # ▼ Notifier events are global, so app (or tests) running in the same process should not see benchmark ones
+    events = {event: OrderedSet(handlers) for event, handlers in Notifier.events.items()}
+    try:
+        for name, op in benchmarks().items():
+            if pattern not in name: continue
+            try:
+                results[name] = measure(name, op, minTime)
+            except Exception as e:
+                # ▼ Broken operation is reported, but does not stop the others
+                log.error(f"{name} failed: {e.__class__.__name__}: {e}")
+    finally:
+        Notifier.events.clear()
+        Notifier.events.update(events)
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Microbenchmarks of ProtocolProxy hot paths (ns and memory per operation)")
+    parser.add_argument('--filter', default='', help="run only benchmarks with given substring in name")
+    parser.add_argument('--min-time', type=float, default=0.2, help="min time of timed runs per benchmark, sec")
+    parser.add_argument('--log-level', default='ERROR',
+                        help="level of 'Device', 'SONY', 'MWXC' and 'Notifier' loggers (all of them are DEBUG "
+                             "by default, running App sets 'Device' to INFO)")
+    parser.add_argument('--json', default=None, help="save results to JSON file")
+    args = parser.parse_args()
+
+    # ▼ Logging is left on at given level, as log calls are part of Par / Prop / device hot paths
+    for name in ('Device', 'SONY', 'MWXC', 'Notifier'):
+        if name in Logger.all: Logger.all[name].setLevel(args.log_level)
+
+    print(f"{'benchmark':<28} {'time/op':>13} {'alloc/op':>11} {'retained/op':>11}")
+    results = run(args.filter, args.min_time)
+    for result in results.values(): print(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({name: result._asdict() for name, result in results.items()}, file, indent=2)
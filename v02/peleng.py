@@ -0,0 +1,82 @@
+import struct
+import sys
+from typing import Tuple
+
+from Transceiver import rfc1071
+from Transceiver.errors import BadDataError, BadCrcError
+
+# Peleng packet layout:
+#   header ––► startbyte (1) + address (1) + payload size in 16-bit words with EVEN flag in b15 (2) + header rfc1071 (2)
+#   body   ––► payload + zero padding byte (only if payload size is odd) + packet rfc1071 (2)
+
+STARTBYTE: int = 0x5A
+MASTER_ADDRESS: int = 0  # address in device replies
+HEADER_SIZE: int = 6
+CHECKSUM_SIZE: int = 2
+OVERHEAD: int = HEADER_SIZE + 1 + CHECKSUM_SIZE  # max bytes added to payload
+MAX_PAYLOAD_SIZE: int = 0xFFF * 2  # bytes, size field holds 12 bits of 16-bit words count
+
+HEADER_FORMAT = '< B B H'
+EVEN_FLAG = 1 << 15
+
+
+def packFrame(address: int, payload: bytes) -> bytes:
+    """ Wrap payload into Peleng packet addressed to `address` """
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Payload is too large ({len(payload)} bytes, max {MAX_PAYLOAD_SIZE})")
+    padding = b'\x00' if len(payload) % 2 else b''
+    size = len(payload) + len(padding)
+    header = struct.pack(HEADER_FORMAT, STARTBYTE, address, (size // 2) | (EVEN_FLAG if padding else 0))
+    packet = header + rfc1071(header) + payload + padding
+    return packet + rfc1071(packet)
+
+
+def parseHeader(header: bytes) -> Tuple[int, int, bool]:
+    """ Validate packet header, return (address, body size without checksum, whether payload is padded) """
+    if len(header) != HEADER_SIZE or header[0] != STARTBYTE:
+        raise BadDataError("Bad header", dataname="Header", data=header)
+    if int.from_bytes(rfc1071(header), byteorder='big') != 0:
+        raise BadCrcError("Bad header checksum", dataname="Header", data=header)
+    _, address, size = struct.unpack_from(HEADER_FORMAT, header)
+    return address, (size & 0x0FFF) * 2, bool(size & EVEN_FLAG)
+
+
+def unpackFrame(packet: bytes) -> Tuple[int, bytes]:
+    """ Validate whole Peleng packet, return (address, payload) """
+    address, size, padded = parseHeader(packet[:HEADER_SIZE])
+    if len(packet) != HEADER_SIZE + size + CHECKSUM_SIZE:
+        raise BadDataError(f"Bad packet size (expected {HEADER_SIZE + size + CHECKSUM_SIZE}, got {len(packet)})",
+                           dataname="Packet", data=packet)
+    if int.from_bytes(rfc1071(packet), byteorder='big') != 0:
+        raise BadCrcError("Bad packet checksum", dataname="Packet", data=packet)
+    return address, packet[HEADER_SIZE:HEADER_SIZE + size - padded]
+
+
+class Rfc1071:
+    """ Incremental rfc1071 checksum: feeding data in parts gives the same result as rfc1071() of joined data
+        Words are summed in native byte order and result is converted once in .digest()
+            (one's complement sum does not depend on byte order — RFC 1071, section 2.B)
+    """
+
+    def __init__(self, data: bytes = b''):
+        self.sum: int = 0
+        self.odd: bytes = b''  # trailing byte of odd-sized part, completed by the next part
+        self.size: int = 0
+        self.update(data)
+
+    def update(self, data: bytes) -> 'Rfc1071':
+        if not data: return self
+        self.size += len(data)
+        view = memoryview(data)
+        if self.odd:
+            self.sum += int.from_bytes(self.odd + view[:1], sys.byteorder)
+            self.odd, view = b'', view[1:]
+        if len(view) % 2:
+            self.odd, view = bytes(view[-1:]), view[:-1]
+        self.sum += sum(view.cast('H'))
+        return self
+
+    def digest(self) -> bytes:
+        total = self.sum + (int.from_bytes(self.odd + b'\x00', sys.byteorder) if self.odd else 0)
+        while total >> 16: total = (total & 0xFFFF) + (total >> 16)
+        return (~total & 0xFFFF).to_bytes(2, sys.byteorder)
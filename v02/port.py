@@ -0,0 +1,88 @@
+from threading import RLock, Timer
+
+from Utils import Logger, auto_repr
+
+log = Logger("Port")
+log.setLevel('DEBUG')
+
+
+class PortKeeper:
+    """ Keeps serial interface open while traffic continues,
+        closes it only after idle period elapses without any transactions
+    """
+
+    def __init__(self, interface, idleTimeout: float):
+        self.interface = interface
+        self.idleTimeout: float = idleTimeout  # sec, 0 ––► close immediately on release
+        self.lock = RLock()
+        self.timer: Timer = None
+        self.holders: int = 0  # number of acquire() calls not yet followed by release()
+        self.generation: int = 0  # incremented on each release to expire stale timers
+
+        self.nOpened: int = 0
+        self.nClosed: int = 0
+        self.nReused: int = 0
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.interface.port}({'open' if self.interface.is_open else 'closed'}), "
+                               f"holders={self.holders}")
+
+    def acquire(self):
+        """ Open interface if it is closed, cancel pending idle close """
+        with self.lock:
+            self.cancelTimer()
+            if self.interface.is_open:
+                self.nReused += 1
+            else:
+                self.interface.open()
+                self.nOpened += 1
+                log.debug(f"Port {self.interface.port} opened")
+            self.holders += 1
+            return self.interface
+
+    def release(self):
+        """ Schedule interface closing after idle timeout """
+        with self.lock:
+            self.holders = max(self.holders - 1, 0)
+            if self.holders: return
+            self.cancelTimer()
+            if self.idleTimeout <= 0:
+                return self.close()
+            self.generation += 1
+            self.timer = Timer(self.idleTimeout, self.idleClose, args=(self.generation,))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def idleClose(self, generation: int):
+        with self.lock:
+            # ▼ Interface has been acquired again while timer was firing
+            if generation != self.generation or self.holders: return
+            self.timer = None
+            if self.interface.is_open:
+                log.debug(f"Port {self.interface.port} idle for {self.idleTimeout} sec")
+            self.close()
+
+    def close(self):
+        """ Close interface immediately regardless of idle timer """
+        with self.lock:
+            self.cancelTimer()
+            self.holders = 0
+            if self.interface.is_open:
+                self.interface.close()
+                self.nClosed += 1
+                log.debug(f"Port {self.interface.port} closed")
+
+    def cancelTimer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def stats(self) -> dict:
+        return dict(opened=self.nOpened, closed=self.nClosed, reused=self.nReused,
+                    open=self.interface.is_open, idleTimeout=self.idleTimeout)
@@ -0,0 +1,188 @@
+from time import perf_counter, sleep
+from typing import List, NamedTuple, Optional
+
+from Transceiver.errors import SerialError
+from Utils import Logger, auto_repr, bytewise, castStr
+
+from capture import CaptureReader, Direction, Record, ERROR_NONE
+from device import Device, Par, Prop, DataInvalidError
+
+log = Logger("Replay")
+log.setLevel('DEBUG')
+
+
+class Mismatch(NamedTuple):
+    index: int  # record number in capture
+    direction: Direction
+    expected: bytes  # as recorded
+    actual: bytes  # as produced by replay
+
+    def __str__(self):
+        return (f"#{self.index} {self.direction.name}: expected [{bytewise(self.expected)}], "
+                f"got [{bytewise(self.actual)}]")
+
+
+class ReplayReport(NamedTuple):
+    nRecords: int
+    nFrames: int  # frames passed through protocol code
+    nBytes: int  # bytes of those frames
+    nMismatches: int
+    nErrors: int  # frames rejected by protocol code
+    elapsed: float  # sec
+
+    @property
+    def framesPerSecond(self) -> float:
+        return self.nFrames / self.elapsed if self.elapsed else 0
+
+    def __str__(self):
+        return (f"{self.nFrames} frames ({self.nBytes} bytes) replayed in {self.elapsed:.3f} sec "
+                f"({self.framesPerSecond:.0f} frames/s), {self.nMismatches} mismatches, {self.nErrors} errors")
+
+
+class ReplayPort:
+    """ Serial port stand-in: reads are served from fed data, writes are collected """
+
+    def __init__(self):
+        self.input: bytearray = bytearray()
+        self.output: bytearray = bytearray()
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.input)
+
+    def feed(self, data: bytes):
+        self.input += data
+
+    def read(self, size: int = 1) -> bytes:
+        data = bytes(self.input[:size])
+        del self.input[:size]
+        return data
+
+    readSimple = read
+
+    def write(self, data: bytes) -> int:
+        self.output += data
+        return len(data)
+
+    def reset_input_buffer(self):
+        self.input.clear()
+
+    def takeOutput(self) -> bytes:
+        data = bytes(self.output)
+        self.output.clear()
+        return data
+
+
+class Replay:
+    """ Pass captured traffic through device protocol code, compare results with capture
+        Each captured frame is reproduced by the same code path that has produced it:
+            • NCS command ––► .receiveNative() and .nativeCommandFrame() restore the same frame
+            • device packet ––► .wrap() of its command gives the same packet (header is built from device state)
+            • device reply ––► .unwrap() updates device parameters, its result is checked by the next NCS reply
+            • NCS reply ––► .sendNative() of the most recent unwrapped device reply writes the same frame
+        Recorded parameter changes ('altered' events) are applied to device, so packet headers match as well
+        Recorded device parameter updates ('new' events) are checked against device state after .unwrap()
+        Recorded reply cache hits ('cached' events) provide device reply data for the NCS reply that follows them
+        Device state is taken as is — replay fresh device for captures started along with communication
+    """
+
+    MAX_MISMATCHES_KEPT: int = 100
+
+    def __init__(self, path: str, device: Device):
+        self.reader = CaptureReader(path)
+        self.device: Device = device
+        self.port = ReplayPort()
+        self.mismatches: List[Mismatch] = []
+        self.deviceData: bytes = None  # most recent unwrapped device reply
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.reader.path} through {self.device.name}")
+
+    def run(self, timed: bool = False) -> ReplayReport:
+        """ Replay whole capture, at recorded pace if `timed` is set, otherwise as fast as possible """
+        nRecords = nFrames = nBytes = nMismatches = nErrors = 0
+        startedAt = perf_counter()
+        firstRecordTime = None
+        for index, record in enumerate(self.reader):
+            nRecords += 1
+            if timed:
+                if firstRecordTime is None: firstRecordTime = record.time
+                delay = (record.time - firstRecordTime) / 1e9 - (perf_counter() - startedAt)
+                if delay > 0: sleep(delay)
+            if record.error != ERROR_NONE: continue
+            if record.direction == Direction.EVENT:
+                actual = self.replayEvent(record.data.decode('utf-8', errors='replace'))
+            else:
+                try:
+                    actual = self.replayFrame(record)
+                except (DataInvalidError, SerialError, ValueError) as e:
+                    log.debug(f"Record #{index} {record.direction.name} [{bytewise(record.data)}] rejected: {e}")
+                    nErrors += 1
+                    continue
+                nFrames += 1
+                nBytes += len(record.data)
+            if actual is not None and actual != record.data:
+                nMismatches += 1
+                if len(self.mismatches) < self.MAX_MISMATCHES_KEPT:
+                    self.mismatches.append(Mismatch(index, record.direction, record.data, actual))
+        report = ReplayReport(nRecords, nFrames, nBytes, nMismatches, nErrors, perf_counter() - startedAt)
+        log.info(f"{self.device.name} replay: {report}")
+        return report
+
+    def replayFrame(self, record: Record) -> Optional[bytes]:
+        """ Reproduce captured frame, return the result to be compared with record data
+                (None ––► frame is checked by the records that follow it)
+        """
+        device = self.device
+        if record.direction == Direction.NCS_IN:
+            self.port.feed(record.data)
+            data = device.receiveNative(self.port)
+            self.port.reset_input_buffer()
+            return device.nativeCommandFrame(data)
+        elif record.direction == Direction.DEV_OUT:
+            return device.wrap(record.data[device.WRAP_HEADER_SIZE:])
+        elif record.direction == Direction.DEV_IN:
+            self.deviceData = device.unwrap(record.data)
+            return None
+        elif record.direction == Direction.NCS_OUT:
+            if self.deviceData is None: raise ValueError("No device reply to be sent yet")
+            device.sendNative(self.port, self.deviceData)
+            return self.port.takeOutput()
+        raise ValueError(f"Unknown direction {record.direction}")
+
+    def replayEvent(self, event: str) -> Optional[bytes]:
+        """ Apply recorded 'altered' event to device or reproduce recorded 'new' event from device state,
+                return the latter to be compared with record data (None ––► nothing to compare)
+        """
+        kind, _, assignment = event.partition(' ')
+        name, _, value = assignment.partition('=')
+        par = getattr(self.device.__class__, name, None)
+        if kind == 'altered' and isinstance(par, Par):
+            with self.device.lock:
+                par.value = castStr(par.type, value)
+        elif kind == 'new' and isinstance(par, (Par, Prop)):
+            # ▼ Device value reported by the most recent reply — what .unwrap() has made of it
+            return f"new {name}={par.status if isinstance(par, Par) else par.value}".encode()
+        elif kind == 'cached':
+            # ▼ NCS has been answered from reply cache (see App.answerFromCache()) — next NCS reply carries it
+            self.deviceData = bytes.fromhex(value)
+        return None  # ◄ other events are consequences of replayed frames
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    from os.path import dirname, abspath, join as joinpath
+
+    from app import ProtocolLoader
+
+    parser = ArgumentParser(description="Replay ProtocolProxy traffic capture through device protocol code")
+    parser.add_argument('capture', help="capture file")
+    parser.add_argument('device', help="device protocol name (e.g. 'sony')")
+    parser.add_argument('--protocols', default=joinpath(dirname(abspath(__file__)), 'devices'),
+                        help="directory with device protocol files")
+    parser.add_argument('--timed', action='store_true', help="replay at recorded pace")
+    args = parser.parse_args()
+
+    replay = Replay(args.capture, ProtocolLoader(args.protocols)[args.device.lower()]())
+    print(replay.run(timed=args.timed))
+    for mismatch in replay.mismatches: print(mismatch)
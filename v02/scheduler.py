@@ -0,0 +1,80 @@
+from threading import Event
+from typing import Dict
+
+from Utils import auto_repr
+
+# Traffic classes, in priority order:
+#   URGENT ––► dedicated transaction carrying altered parameters to device
+#   NCS    ––► transaction relaying queued NCS command
+#   IDLE   ––► keep-alive transaction with idle payload (only when nothing else is pending)
+URGENT = 'urgent'
+NCS = 'ncs'
+IDLE = 'idle'
+
+
+class Scheduler:
+    """ Chooses traffic class served by the next comm loop transaction slot
+        Pending classes share slots by smooth weighted round-robin,
+            class left waiting for `starvationLimit` slots in a row is served unconditionally
+    """
+
+    def __init__(self, weights: Dict[str, int], starvationLimit: int):
+        self.weights: Dict[str, int] = weights  # class ––► relative share of slots, URGENT should weigh most
+        self.starvationLimit: int = max(starvationLimit, 1)
+        self.credits: Dict[str, int] = dict.fromkeys(weights, 0)
+        self.waiting: Dict[str, int] = dict.fromkeys(weights, 0)  # slots passed since pending class was served
+        self.urgentRequest = Event()  # ◄ set from any thread, consumed by comm thread
+        self.wakeup = Event()  # ◄ interrupts .sleep()
+
+        self.served: Dict[str, int] = dict.fromkeys((*weights, IDLE), 0)
+        self.nStarved: int = 0
+
+    def __repr__(self):
+        return auto_repr(self, ', '.join(f"{cls}={n}" for cls, n in self.served.items()))
+
+    @property
+    def urgentPending(self) -> bool:
+        return self.urgentRequest.is_set()
+
+    def requestUrgent(self):
+        """ Demand dedicated transaction in the next slot (e.g. parameter has been altered) """
+        self.urgentRequest.set()
+        self.wakeup.set()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def sleep(self, timeout: float) -> bool:
+        """ Block until timeout expires or scheduler is woken up, return True in the latter case """
+        woken = self.wakeup.wait(timeout)
+        self.wakeup.clear()
+        return woken
+
+    def next(self, ncsPending: bool) -> str:
+        """ Return traffic class to be served in the next slot """
+        pending = [cls for cls, isPending in ((URGENT, self.urgentPending), (NCS, ncsPending)) if isPending]
+        for cls in self.weights:
+            if cls not in pending: self.credits[cls] = self.waiting[cls] = 0
+
+        if not pending:
+            choice = IDLE
+        else:
+            starving = [cls for cls in pending if self.waiting[cls] >= self.starvationLimit]
+            if starving:
+                choice = starving[0]
+                self.nStarved += 1
+            else:
+                for cls in pending: self.credits[cls] += self.weights[cls]
+                choice = max(pending, key=self.credits.get)
+                self.credits[choice] -= sum(self.weights[cls] for cls in pending)
+            for cls in pending:
+                self.waiting[cls] = 0 if cls == choice else self.waiting[cls] + 1
+
+        # ▼ Altered parameters are carried by whatever transaction comes next, so clear request beforehand
+        if choice == URGENT: self.urgentRequest.clear()
+        self.served[choice] += 1
+        return choice
+
+    def stats(self) -> dict:
+        return dict(served=dict(self.served), weights=dict(self.weights),
+                    starvationLimit=self.starvationLimit, starved=self.nStarved)
@@ -0,0 +1,349 @@
+import os
+from abc import ABC, abstractmethod
+from random import Random
+from threading import Thread, Event, Condition
+from time import sleep, monotonic
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+from Transceiver.errors import BadDataError, BadCrcError
+from Utils import Logger, auto_repr, bitsarray, bytewise, flags
+
+from device import Device
+from devices.mwxc import MWXC
+from devices.sony import SONY
+from peleng import packFrame, parseHeader, unpackFrame, STARTBYTE, MASTER_ADDRESS, HEADER_SIZE, CHECKSUM_SIZE
+
+log = Logger("Simulator")
+log.setLevel('DEBUG')
+
+# Virtual Peleng devices on a shared line: commands addressed to simulated devices are answered
+#   like real devices do (device state follows command header flags, reply header reports the state)
+# Line is either Linux pseudo-terminal (proxy opens .path as device port) or in-process loopback (see loopback())
+# Replies are delayed by latency ± jitter and paced according to baudrate; faults are injected at random
+
+BITS_PER_BYTE = 10  # start bit + 8 data bits + stop bit
+
+
+class Faults(NamedTuple):
+    """ Probabilities of injected faults, per reply """
+    badCrc: float = 0  # packet checksum is corrupted
+    truncated: float = 0  # reply is cut short
+    junkPrefix: float = 0  # random bytes are sent ahead of reply
+    dropReply: float = 0  # no reply at all
+    parChange: float = 0  # device changes one of reported states on its own
+
+
+class SimDevice(ABC):
+    """ Device side of protocol: keeps device state and builds replies to wrapped commands
+        Command / reply header flags layouts are taken from the device protocol class
+    """
+
+    deviceClass: Type[Device] = None
+
+    def __init__(self):
+        self.address: int = self.deviceClass.DEV_ADDRESS
+        self.state: Dict[str, bool] = dict.fromkeys(self.deviceClass.REPLY_FLAGS, False)
+        self.nCommands: int = 0
+
+    def __repr__(self):
+        return auto_repr(self, f"#{self.address}, {self.state}")
+
+    @property
+    def name(self) -> str:
+        return self.deviceClass.__name__
+
+    def command(self, payload: bytes):
+        """ Apply wrapped command to device state """
+        self.nCommands += 1
+        commanded = flags(payload[0], len(self.deviceClass.COMMAND_FLAGS))
+        for name, state in zip(self.deviceClass.COMMAND_FLAGS, commanded):
+            if name in self.state: self.state[name] = state
+        self.update()
+
+    def update(self):
+        """ Derive device-driven states from commanded ones """
+
+    def disturb(self, rng: Random) -> str:
+        """ Flip one of reported states on device own initiative, return its name """
+        name = rng.choice(self.deviceClass.REPLY_FLAGS)
+        self.state[name] = not self.state[name]
+        return name
+
+    def reply(self, payload: bytes) -> bytes:
+        """ Wrapped reply to `payload` command reflecting current device state """
+        header = bitsarray(*(self.state[name] for name in self.deviceClass.REPLY_FLAGS))
+        return bytes([header]) + self.replyData(payload)
+
+    @abstractmethod
+    def replyData(self, payload: bytes) -> bytes:
+        """ Reply data following reply header """
+
+
+class SonySim(SimDevice):
+    deviceClass = SONY
+
+    def replyData(self, payload: bytes) -> bytes:
+        # ▼ Command number is echoed back, so every command is consumed
+        counter, visca = payload[1:2], payload[2:]
+        if not visca or visca[0] == 0xFF: return counter + SONY.APP_TERMINATOR  # ◄ idle
+        if len(visca) > 1 and visca[1] == 0x09: return counter + b'\x90\x50\x00\x00\xFF'  # ◄ inquiry
+        return counter + b'\x90\x50\xFF'  # ◄ command completion
+
+
+class MwxcSim(SimDevice):
+    deviceClass = MWXC
+
+    def update(self):
+        # ▼ Video receiver and control channel follow commanded states (see MWXC.REPLY_FLAGS)
+        power, videoOut, videoIn, channel = MWXC.REPLY_FLAGS
+        self.state[videoIn] = self.state[power] and self.state[videoOut]
+        self.state[channel] = self.state[power]
+
+    def replyData(self, payload: bytes) -> bytes:
+        size = MWXC.REPLY_MAX_SIZE - MWXC.WRAP_HEADER_SIZE
+        return payload[MWXC.WRAP_HEADER_SIZE:].ljust(size, b'\x00')[:size]
+
+
+SIMULATORS: Dict[str, Type[SimDevice]] = {'sony': SonySim, 'mwxc': MwxcSim}
+
+
+class LoopbackPort:
+    """ One end of in-process serial line, reads follow pyserial semantics (wait for `size` bytes or timeout) """
+
+    def __init__(self, timeout: float = 0.5):
+        self.timeout: float = timeout
+        self.peer: LoopbackPort = None
+        self.input = bytearray()
+        self.condition = Condition()
+        self.is_open: bool = True
+
+    def __repr__(self):
+        return auto_repr(self, f"{len(self.input)} bytes waiting")
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.input)
+
+    def write(self, data: bytes) -> int:
+        peer = self.peer
+        with peer.condition:
+            peer.input += data
+            peer.condition.notify_all()
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        with self.condition:
+            while len(self.input) < size:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0: break
+                self.condition.wait(remaining)
+            data = bytes(self.input[:size])
+            del self.input[:size]
+            return data
+
+    readSimple = read
+
+    def readAvailable(self, timeout: float) -> bytes:
+        """ Whatever has been received within `timeout` """
+        with self.condition:
+            if not self.input: self.condition.wait(timeout)
+            data = bytes(self.input)
+            self.input.clear()
+            return data
+
+    def reset_input_buffer(self):
+        with self.condition:
+            self.input.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def loopback(timeout: float = 0.5) -> Tuple[LoopbackPort, LoopbackPort]:
+    """ Connected pair of in-process ports: (proxy end, simulator end) """
+    proxyEnd, simEnd = LoopbackPort(timeout), LoopbackPort(timeout)
+    proxyEnd.peer, simEnd.peer = simEnd, proxyEnd
+    return proxyEnd, simEnd
+
+
+class PtyPort:
+    """ Master side of Linux pseudo-terminal, proxy opens .path as regular serial port """
+
+    def __init__(self):
+        import tty
+        from select import select
+        self.select = select
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # ◄ no echo and line discipline, bytes pass as is
+        self.path: str = os.ttyname(self.slave)
+
+    def __repr__(self):
+        return auto_repr(self, self.path)
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view: view = view[os.write(self.master, view):]
+        return len(data)
+
+    def readAvailable(self, timeout: float) -> bytes:
+        ready, _, _ = self.select([self.master], [], [], timeout)
+        return os.read(self.master, 4096) if ready else b''
+
+    def close(self):
+        # ▼ Slave side is kept open until now, so that pty survives proxy reopening the port
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class Simulator:
+    """ Simulated Peleng devices answering commands on a pty or loopback line """
+
+    def __init__(self, devices: Sequence[SimDevice], port=None, latency: float = 0.0, jitter: float = 0.0,
+                 baudrate: int = None, faults: Faults = Faults(), seed: int = None):
+        self.devices: Dict[int, SimDevice] = {device.address: device for device in devices}
+        self.port = port  # PtyPort is created on start if not specified
+        self.latency: float = latency  # sec, reply delay after command is received
+        self.jitter: float = jitter  # sec, max deviation of reply delay (uniform)
+        self.baudrate: int = baudrate  # None ––► replies are sent at once
+        self.faults: Faults = faults
+        self.rng = Random(seed)
+        self.buffer = bytearray()
+        self.stopEvent = Event()
+        self.thread: Thread = None
+
+        self.nCommands: int = 0
+        self.nReplies: int = 0
+        self.nIgnored: int = 0  # packets for devices not simulated
+        self.nBadBytes: int = 0  # bytes skipped while searching for valid packet
+        self.nFaults: Dict[str, int] = dict.fromkeys(Faults._fields, 0)
+
+    def __repr__(self):
+        return auto_repr(self, f"{', '.join(device.name for device in self.devices.values())} on {self.path}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def path(self) -> str:
+        return getattr(self.port, 'path', 'loopback')
+
+    def start(self) -> 'Simulator':
+        if self.port is None: self.port = PtyPort()
+        self.stopEvent.clear()
+        self.thread = Thread(name='Simulator', target=self.lineLoop, daemon=True)
+        self.thread.start()
+        log.info(f"Simulating {self}")
+        return self
+
+    def stop(self):
+        if self.thread is None: return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+        if isinstance(self.port, PtyPort): self.port.close()
+
+    def lineLoop(self):
+        while not self.stopEvent.is_set():
+            data = self.port.readAvailable(0.05)
+            if not data: continue
+            for reply in self.feed(data):
+                delay = self.latency + self.jitter * self.rng.uniform(-1, 1)
+                if self.baudrate: delay += len(reply) * BITS_PER_BYTE / self.baudrate
+                if delay > 0: sleep(delay)
+                self.port.write(reply)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """ Consume bytes received from the line, return reply frames (with faults injected) to be sent in order """
+        buffer = self.buffer
+        buffer += data
+        replies = []
+        while buffer:
+            start = buffer.find(STARTBYTE)
+            if start != 0:
+                skipped = len(buffer) if start < 0 else start
+                self.nBadBytes += skipped
+                del buffer[:skipped]
+                continue
+            if len(buffer) < HEADER_SIZE: break
+            try:
+                _, size, _ = parseHeader(bytes(buffer[:HEADER_SIZE]))
+            except (BadDataError, BadCrcError):
+                self.nBadBytes += 1
+                del buffer[:1]
+                continue
+            packetSize = HEADER_SIZE + size + CHECKSUM_SIZE
+            if len(buffer) < packetSize: break
+            try:
+                address, payload = unpackFrame(bytes(buffer[:packetSize]))
+            except (BadDataError, BadCrcError):
+                self.nBadBytes += 1
+                del buffer[:1]
+                continue
+            del buffer[:packetSize]
+            reply = self.respond(address, payload)
+            if reply is not None: replies.append(reply)
+        return replies
+
+    def respond(self, address: int, payload: bytes) -> Optional[bytes]:
+        device = self.devices.get(address)
+        if device is None or not payload:
+            self.nIgnored += 1
+            return None
+        self.nCommands += 1
+        device.command(payload)
+        faults, chance = self.faults, self.rng.random
+        if faults.parChange and chance() < faults.parChange:
+            self.nFaults['parChange'] += 1
+            log.debug(f"{device.name}.{device.disturb(self.rng)} changed on its own")
+        reply = packFrame(MASTER_ADDRESS, device.reply(payload))
+        if faults.dropReply and chance() < faults.dropReply:
+            self.nFaults['dropReply'] += 1
+            return None
+        if faults.badCrc and chance() < faults.badCrc:
+            self.nFaults['badCrc'] += 1
+            reply = reply[:-1] + bytes([reply[-1] ^ 0xFF])
+        if faults.truncated and chance() < faults.truncated:
+            self.nFaults['truncated'] += 1
+            reply = reply[:self.rng.randrange(1, len(reply))]
+        if faults.junkPrefix and chance() < faults.junkPrefix:
+            self.nFaults['junkPrefix'] += 1
+            # ▼ Junk never contains startbyte, so it cannot be mistaken for a packet
+            junk = bytes(self.rng.choice([b for b in range(0x100) if b != STARTBYTE])
+                         for _ in range(self.rng.randrange(1, 8)))
+            reply = junk + reply
+        self.nReplies += 1
+        log.debug(f"{device.name} ◄ [{bytewise(reply)}]")
+        return reply
+
+    def stats(self) -> dict:
+        return dict(line=self.path, commands=self.nCommands, replies=self.nReplies, ignored=self.nIgnored,
+                    badBytes=self.nBadBytes, faults=self.nFaults,
+                    devices={device.name: device.state for device in self.devices.values()})
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Simulate Peleng devices on a Linux pseudo-terminal")
+    parser.add_argument('devices', nargs='+', choices=SIMULATORS, help="devices on the line")
+    parser.add_argument('--latency', type=float, default=0.002, help="reply delay, sec")
+    parser.add_argument('--jitter', type=float, default=0.0, help="max reply delay deviation, sec")
+    parser.add_argument('--baudrate', type=int, default=None, help="pace replies at given baudrate")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for jitter and faults")
+    for field in Faults._fields:
+        parser.add_argument(f'--{field}', type=float, default=0.0, help=f"{field} fault probability")
+    args = parser.parse_args()
+
+    simulator = Simulator([SIMULATORS[name]() for name in args.devices], latency=args.latency, jitter=args.jitter,
+                          baudrate=args.baudrate, seed=args.seed,
+                          faults=Faults(*(getattr(args, field) for field in Faults._fields)))
+    with simulator:
+        print(f"Device line: {simulator.path} (set it as APP.DEV_COM_PORT)")
+        try:
+            while True: sleep(1)
+        except KeyboardInterrupt:
+            print(simulator.stats())
@@ -0,0 +1,290 @@
+import socket
+from contextlib import nullcontext
+from threading import Thread, Event, Lock
+from time import time_ns, monotonic
+from typing import Callable, Collection, Iterator, List, Optional, Tuple
+
+from Utils import Logger, auto_repr
+
+from capture import Record, Direction, RECORD_HEADER, ERROR_NONE
+
+log = Logger("Tap")
+log.setLevel('DEBUG')
+
+# Passive observers of live proxy traffic (loggers, plotters, test oracles)
+# Every subscriber gets its own bounded single-producer / single-consumer ring:
+#   • with a single publishing thread (Tap(singleProducer=True)) rings are pushed without any lock
+#   • App traffic is traced from several threads (comm, command, capture control), which deviates from SPSC:
+#       such publishers are serialized by the tap producer lock — it is held only for pushing a record,
+#       never while waiting, and consumers never take it
+#   • when ring is full, record is dropped and counted as overrun
+#   • idle consumer sleeps on its ring wakeup event, producer sets it only if it is not set already
+#   • subscribers list is replaced as a whole on (un)subscription, so producer iterates it without locking
+# Socket wire format is a stream of capture records: RECORD_HEADER + data (see capture.py)
+# Overruns of socket subscribers are reported in-stream as 'overrun dropped=<n>' EVENT records
+
+STOP_CHECK_INTERVAL = 0.2  # sec, how often idle socket subscribers check whether tap server is stopping
+
+
+class Subscription:
+    """ Bounded SPSC ring of traffic records
+        Producer only advances .head, consumer only advances .tail — each index has a single writer
+        .push() is not thread-safe on its own — use Tap.publish(), which serializes multiple producers
+    """
+
+    def __init__(self, tap: 'Tap', capacity: int, directions: Collection[Direction] = None):
+        self.tap: 'Tap' = tap
+        self.capacity: int = max(capacity, 1)
+        self.directions: frozenset = frozenset(directions) if directions else None  # None ––► all directions
+        self.slots: List[Optional[Record]] = [None] * self.capacity
+        self.head: int = 0  # records pushed (written by producer only)
+        self.tail: int = 0  # records taken (written by consumer only)
+        self.nOverruns: int = 0  # records dropped because ring was full (written by producer only)
+        self.ready = Event()  # set by producer after push, cleared by consumer before it goes idle
+        self.closed: bool = False
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def __repr__(self):
+        return auto_repr(self, f"{len(self)}/{self.capacity}, {self.nOverruns} overruns")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        """ Yield records as they come until subscription is closed """
+        while not self.closed:
+            records = self.drain()
+            if not records: self.wait()
+            yield from records
+
+    def push(self, record: Record) -> bool:
+        """ Producer side: add record, return False if it has been dropped (ring is full) """
+        head = self.head
+        pushed = head - self.tail < self.capacity
+        if pushed:
+            self.slots[head % self.capacity] = record
+            self.head = head + 1  # ◄ publishes the slot
+        else:
+            self.nOverruns += 1
+        # ▼ Checked after publishing: if the flag was seen set, consumer clears it later and finds the record
+        if not self.ready.is_set(): self.ready.set()
+        return pushed
+
+    def pop(self) -> Optional[Record]:
+        """ Consumer side: take the oldest record, return None if ring is empty """
+        tail = self.tail
+        if tail == self.head: return None
+        index = tail % self.capacity
+        record, self.slots[index] = self.slots[index], None
+        self.tail = tail + 1  # ◄ releases the slot
+        return record
+
+    def drain(self, limit: int = None) -> List[Record]:
+        """ Consumer side: take all (or up to `limit`) pending records """
+        records = []
+        tail, head = self.tail, self.head
+        if limit is not None: head = min(head, tail + limit)
+        while tail < head:
+            index = tail % self.capacity
+            records.append(self.slots[index])
+            self.slots[index] = None
+            tail += 1
+        self.tail = tail
+        return records
+
+    def wait(self, timeout: float = None) -> bool:
+        """ Consumer side: block until ring is not empty (or overrun / closing happens),
+                return False on timeout
+        """
+        self.ready.clear()
+        if self.head != self.tail or self.closed: return True
+        return self.ready.wait(timeout)
+
+    def get(self, timeout: float = None) -> Optional[Record]:
+        """ Consumer side: wait for the next record, return None on timeout or when subscription is closed """
+        deadline = None if timeout is None else monotonic() + timeout
+        while not self.closed:
+            record = self.pop()
+            if record is not None: return record
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0: return None
+            self.wait(remaining)
+        return None
+
+    def close(self):
+        self.closed = True
+        self.ready.set()  # ◄ wakes up waiting consumer
+        self.tap.unsubscribe(self)
+
+    def stats(self) -> dict:
+        return dict(capacity=self.capacity, pending=len(self), delivered=self.tail, overruns=self.nOverruns)
+
+
+class Tap:
+    """ Fan-out of traffic records to subscribers, publishing costs nothing when there are none """
+
+    def __init__(self, onChange: Callable[[], None] = None, singleProducer: bool = False):
+        self.subscribers: Tuple[Subscription, ...] = ()
+        self.onChange: Callable[[], None] = onChange  # called when subscribers are added or removed
+        self.lock = Lock()  # serializes (un)subscription only, producers never take it
+        # ▼ Rings have to be pushed by one thread at a time, lock is not needed if only one thread publishes
+        self.producerLock = nullcontext() if singleProducer else Lock()
+        self.nPublished: int = 0
+
+    def __repr__(self):
+        return auto_repr(self, f"{len(self.subscribers)} subscribers")
+
+    def subscribe(self, capacity: int = 4096, directions: Collection[Direction] = None) -> Subscription:
+        subscription = Subscription(self, capacity, directions)
+        with self.lock:
+            self.subscribers = self.subscribers + (subscription,)
+        log.debug(f"Subscribed: {subscription}")
+        if self.onChange: self.onChange()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            if subscription not in self.subscribers: return
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscription)
+        log.debug(f"Unsubscribed: {subscription}")
+        if self.onChange: self.onChange()
+
+    def publish(self, direction: Direction, data: bytes, error: int = ERROR_NONE, address: int = 0):
+        subscribers = self.subscribers
+        if not subscribers: return
+        record = Record(time_ns(), direction, error, address, bytes(data))
+        with self.producerLock:
+            self.nPublished += 1
+            for subscription in subscribers:
+                if subscription.directions is None or direction in subscription.directions:
+                    subscription.push(record)
+
+    def stats(self) -> dict:
+        return dict(published=self.nPublished, subscribers=[s.stats() for s in self.subscribers])
+
+
+class TapServer:
+    """ Serve tap subscriptions to local socket clients, one subscription and sender thread per client
+        Slow client only stalls its own sender thread and overruns its own ring
+    """
+
+    def __init__(self, tap: Tap, port: int, host: str = '127.0.0.1', capacity: int = 4096):
+        self.tap: Tap = tap
+        self.address: Tuple[str, int] = (host, port)
+        self.capacity: int = capacity
+        self.server: socket.socket = None
+        self.stopEvent = Event()
+        self.thread: Thread = None
+        self.nClients: int = 0
+
+    def __repr__(self):
+        return auto_repr(self, f"{self.address[0]}:{self.address[1]}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self) -> 'TapServer':
+        self.server = socket.create_server(self.address)
+        self.address = self.server.getsockname()[:2]  # ◄ actual port, if 0 has been requested
+        self.server.settimeout(0.2)
+        self.stopEvent.clear()
+        self.thread = Thread(name='Tap server', target=self.acceptLoop, daemon=True)
+        self.thread.start()
+        log.info(f"Tap server listening on {self.address[0]}:{self.address[1]}")
+        return self
+
+    def stop(self):
+        if self.thread is None: return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+        self.server.close()
+
+    def acceptLoop(self):
+        while not self.stopEvent.is_set():
+            try:
+                client, address = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                log.error(f"Tap server stopped: {e}")
+                return
+            self.nClients += 1
+            Thread(name=f'Tap client {address[0]}:{address[1]}', target=self.clientLoop,
+                   args=(client,), daemon=True).start()
+
+    def clientLoop(self, client: socket.socket):
+        subscription = self.tap.subscribe(self.capacity)
+        overruns = 0
+        try:
+            with client:
+                while not self.stopEvent.is_set():
+                    records = subscription.drain()
+                    if subscription.nOverruns != overruns:
+                        dropped, overruns = subscription.nOverruns - overruns, subscription.nOverruns
+                        records.append(Record(time_ns(), Direction.EVENT, ERROR_NONE, 0,
+                                              f"overrun dropped={dropped}".encode()))
+                    if not records:
+                        subscription.wait(STOP_CHECK_INTERVAL)
+                        continue
+                    client.sendall(b''.join(packRecord(record) for record in records))
+        except OSError as e:
+            log.debug(f"Tap client disconnected: {e}")
+        finally:
+            subscription.close()
+
+    def stats(self) -> dict:
+        return dict(address=f"{self.address[0]}:{self.address[1]}", clients=self.nClients)
+
+
+def packRecord(record: Record) -> bytes:
+    return RECORD_HEADER.pack(record.time, record.direction, record.error, record.address,
+                              len(record.data)) + record.data
+
+
+class TapClient:
+    """ Connection to tap server, iterating it yields records until connection is closed """
+
+    def __init__(self, host: str, port: int):
+        self.connection = socket.create_connection((host, port))
+        self.stream = self.connection.makefile('rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        while True:
+            header = self.stream.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size: return
+            time, direction, error, address, size = RECORD_HEADER.unpack(header)
+            yield Record(time, Direction(direction), error, address, self.stream.read(size))
+
+    def close(self):
+        self.stream.close()
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Print live ProtocolProxy traffic from tap server")
+    parser.add_argument('port', type=int, help="tap server port (see CONFIG.TAP_PORT)")
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+
+    try:
+        with TapClient(args.host, args.port) as client:
+            for record in client: print(record)
+    except KeyboardInterrupt:
+        pass
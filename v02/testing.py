@@ -3,7 +3,11 @@ import time
 import unittest
 import sys
 
+from collections import deque
+from contextlib import contextmanager
 from os.path import expandvars as envar, join as joinpath
+from typing import Callable
+from Transceiver.errors import SerialError, SerialReadTimeoutError
 from Utils import Logger, auto_repr, bytewise, formatDict
 
 
@@ -59,6 +63,146 @@ class DeviceMock:
                                f"running={self.thread.is_alive()}}}")
 
 
+class FakeInterface:
+    """ Serial transceiver stand-in for App tests
+        Device packets are answered by `respond` (packet ––► reply packet or None if there is no reply),
+            reads without data wait for timeout, new data or .cancel_read(), whichever comes first
+            (.cancel_read() with no read waiting is left pending and cuts the next waiting read short, as in pyserial)
+    """
+
+    def __init__(self, port: str, respond: Callable[[bytes], bytes] = None):
+        self.port = self.token = port
+        self.respond = respond
+        self.input: bytearray = bytearray()  # NCS data to be read
+        self.output: bytearray = bytearray()  # data written
+        self.replies = deque()
+        self.settings = dict(timeout=None)
+        self.condition = threading.Condition()
+        self.cancelPending = False
+        self.is_open = False
+        self.nTimeouts = 0
+        self.nApplied = 0
+        self.nFailingOpens = 0  # ◄ next .open() calls that fail as if port is lost
+
+    timeout = property(lambda self: self.settings['timeout'],
+                       lambda self, value: self.settings.update(timeout=value))
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.input)
+
+    def open(self):
+        if self.nFailingOpens:
+            self.nFailingOpens -= 1
+            raise SerialError(f"Port {self.port} is not available")
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def get_settings(self) -> dict:
+        return dict(self.settings)
+
+    def apply_settings(self, settings: dict):
+        self.settings.update(settings)
+        self.nApplied += 1
+
+    def feed(self, data: bytes):
+        with self.condition:
+            self.input += data
+            self.condition.notify_all()
+
+    def wait(self, ready: Callable[[], bool]):
+        with self.condition:
+            self.condition.wait_for(lambda: ready() or self.cancelPending, self.timeout)
+            self.cancelPending = False
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.input: self.wait(lambda: self.input)
+        data = bytes(self.input[:size])
+        del self.input[:size]
+        return data
+
+    readSimple = read
+
+    def write(self, data: bytes) -> int:
+        self.output += data
+        return len(data)
+
+    def takeOutput(self) -> bytes:
+        data = bytes(self.output)
+        self.output.clear()
+        return data
+
+    def reset_input_buffer(self):
+        self.input.clear()
+
+    def cancel_read(self):
+        with self.condition:
+            self.cancelPending = True
+            self.condition.notify_all()
+
+    def cancel_write(self):
+        pass
+
+    def sendPacket(self, packet: bytes):
+        self.write(packet)
+        reply = self.respond(packet) if self.respond else None
+        if reply is not None: self.replies.append(reply)
+
+    def deliver(self, reply: bytes):
+        """ Device reply arriving on its own (e.g. late one) """
+        with self.condition:
+            self.replies.append(reply)
+            self.condition.notify_all()
+
+    def receivePacket(self) -> bytes:
+        if not self.replies: self.wait(lambda: self.replies)
+        if not self.replies: raise SerialReadTimeoutError(f"No reply on {self.port}")
+        return self.replies.popleft()
+
+
+def sonyReply(packet: bytes) -> bytes:
+    """ SONY device reply echoing command flags and number """
+    return packet[:2] + bytes.fromhex('90 50 02 FF')
+
+
+@contextmanager
+def fakeApp(respond: Callable[[bytes], bytes] = sonyReply):
+    """ App running SONY protocol over fake interfaces (see FakeInterface)
+        App data folder is temporary, app event handlers and SONY parameters are restored afterwards
+    """
+    from tempfile import TemporaryDirectory
+    from unittest.mock import patch
+    from app import App, ProtocolLoader, CONFIG
+    from device import Par, Prop
+    from devices.sony import SONY
+    from notifier import Notifier
+    from port import PortKeeper
+
+    state = [(slot, slot.value, getattr(slot, 'status', None))
+             for slot in vars(SONY).values() if isinstance(slot, (Par, Prop))]
+    with TemporaryDirectory() as folder, patch.object(ProtocolLoader, 'path', folder), \
+            patch.object(CONFIG, 'CAPTURE_FILE', ''), patch.object(CONFIG, 'TAP_PORT', 0):
+        app = App(dict(version='test', projectname='ProtocolProxy', projectdir=folder))
+        app.init()
+        app.protocols = {'sony': SONY}
+        app.appInt, app.devInt = FakeInterface('APP'), FakeInterface('DEV', respond)
+        app.devPort = PortKeeper(app.devInt, CONFIG.PORT_IDLE_TIMEOUT)
+        app.setProtocol('sony')
+        try:
+            yield app
+        finally:
+            if app.commThread: app.stopComm()
+            if app.ioWorker: app.ioWorker.shutdown(wait=True)
+            app.devPort.close()
+            for handlers in Notifier.events.values():
+                for handler in [h for h in handlers if getattr(h, '__self__', None) is app]: handlers.remove(handler)
+            for slot, value, status in state:
+                slot.value = value
+                if isinstance(slot, Par): slot.status = status
+
+
 class Test(unittest.TestCase):
 
     # FIXME: Arr, terrible test design, refactor everything :(
@@ -303,6 +447,828 @@ class Test(unittest.TestCase):
 
         del SONY
 
+    def test_SONY_retransmit(self):
+        from devices.sony import SONY
+
+        d = SONY()
+        command = bytes.fromhex('81 01 04 00 02 FF')
+        cntIn = d.wrap(command)[1]
+        d.unwrap(bytes([0x00, cntIn - 1]) + bytes.fromhex('90 41 FF'))  # ◄ command is lost
+        self.assertEqual(d.retransmission(), command)
+        self.assertEqual(d.wrap(command)[1], cntIn)  # ◄ resent with the same number
+        self.assertIsNone(d.retransmission())
+        d.unwrap(bytes([0x00, cntIn]) + bytes.fromhex('90 41 FF'))
+        self.assertIsNone(d.retransmission())
+        d.CNT_IN = d.CNT_OUT = 0  # SONY properties are class attrs as well
+
+        del SONY
+
+    def test_submitTransaction(self):
+        with fakeApp() as app:
+            app.devInt.timeout = 0.05
+            future = app.submitTransaction(bytes.fromhex('81 09 04 00 FF'))
+            self.assertEqual(future.result(timeout=5), bytes.fromhex('90 50 02 FF'))
+            self.assertEqual(app.devInt.takeOutput()[2:], bytes.fromhex('81 09 04 00 FF'))
+
+            app.devInt.respond = None  # ◄ device is silent
+            future = app.submitTransaction()
+            with self.assertRaises(SerialReadTimeoutError): future.result(timeout=5)
+            self.assertTrue(app.devInt.is_open)  # ◄ port is kept open between transactions
+
+    def test_PortKeeper(self):
+        from port import PortKeeper
+
+        interface = FakeInterface('DEV')
+        keeper = PortKeeper(interface, idleTimeout=0.1)
+        for _ in range(3):
+            with keeper: pass
+        self.assertTrue(interface.is_open)  # ◄ idle timeout has not elapsed yet
+        self.assertEqual((keeper.nOpened, keeper.nReused, keeper.nClosed), (1, 2, 0))
+        time.sleep(0.3)
+        self.assertFalse(interface.is_open)
+        self.assertEqual(keeper.nClosed, 1)
+
+        with keeper:
+            time.sleep(0.2)  # ◄ held longer than idle timeout
+            self.assertTrue(interface.is_open)
+        keeper.close()
+        self.assertEqual(keeper.stats(), dict(opened=2, closed=2, reused=2, open=False, idleTimeout=0.1))
+
+        keeper.idleTimeout = 0
+        with keeper: pass
+        self.assertFalse(interface.is_open)
+
+    def test_configureInterface(self):
+        from devices.sony import SONY
+
+        appInt, devInt = FakeInterface('APP'), FakeInterface('DEV')
+        self.assertTrue(SONY().configureInterface(appInt, devInt))
+        self.assertEqual((appInt.nApplied, devInt.nApplied), (1, 1))  # ◄ all settings are applied at once
+        self.assertEqual(devInt.get_settings(), SONY().interfaceSettings('DEV'))
+        self.assertEqual(devInt.deviceAddress, SONY.DEV_ADDRESS)
+
+        self.assertFalse(SONY().configureInterface(appInt, devInt))  # ◄ same protocol again ––► unchanged
+        self.assertEqual((appInt.nApplied, devInt.nApplied), (1, 1))
+        devInt.timeout /= 10  # ◄ adapted by app meanwhile
+        self.assertTrue(SONY().configureInterface(appInt, devInt))
+        self.assertEqual(devInt.timeout, SONY().interfaceSettings('DEV')['timeout'])
+        self.assertEqual((appInt.nApplied, devInt.nApplied), (1, 2))
+
+        del SONY
+
+    def test_adaptDeviceTimeout(self):
+        from unittest.mock import patch
+        from app import CONFIG
+
+        with patch.object(CONFIG, 'ADAPTIVE_TIMEOUT', True), patch.object(CONFIG, 'TIMEOUT_ADAPT_INTERVAL', 60), \
+                fakeApp() as app:
+            floor = app.devTimer.floor
+            app.devInt.timeout = 0.5
+            app.adaptDeviceTimeout(floor / 10)
+            self.assertEqual(app.devInt.timeout, floor)  # ◄ clamped against the floor before port is reconfigured
+            for timeout in (0.1, 0.2, 0.3): app.adaptDeviceTimeout(timeout)
+            self.assertEqual(app.devInt.timeout, floor)  # ◄ throttled
+            app.adaptDeviceTimeout(0.4, urgent=True)
+            self.assertEqual(app.devInt.timeout, 0.4)  # ◄ backed off timeout is applied at once
+
+    def test_restartNeeded(self):
+        with fakeApp() as app:
+            app.interactWithNativeSoft = True
+            app.appInt.timeout = 5  # ◄ comm loop is left blocked in NCS read
+            self.assertTrue(app.startComm())
+            time.sleep(0.2)
+            thread, startedAt = app.commThread, time.monotonic()
+            with app.restartNeeded():
+                self.assertFalse(app.commThread)
+            self.assertLess(time.monotonic() - startedAt, 1)
+            self.assertTrue(app.commThread.is_alive())
+            self.assertIsNot(app.commThread, thread)
+
+    def test_interrupt(self):
+        from devices.mwxc import MWXC
+
+        with fakeApp() as app:
+            app.interactWithNativeSoft = True
+            app.appInt.timeout = 5  # ◄ comm loop is left blocked in NCS read
+            self.assertTrue(app.startComm())
+            time.sleep(0.2)
+            startedAt = time.monotonic()
+            app.stopComm()
+            self.assertLess(time.monotonic() - startedAt, 1)
+            self.assertFalse(app.commThread)
+
+        port = FakeInterface('APP')
+        port.timeout = 5
+        threading.Timer(0.1, port.cancel_read).start()
+        startedAt = time.monotonic()
+        with self.assertRaises(SerialReadTimeoutError): MWXC().receiveNative(port)  # ◄ no start byte search
+        self.assertLess(time.monotonic() - startedAt, 1)
+
+        from devices.sony import SONY
+        from device import DataInvalidError
+
+        stopEvent = threading.Event()
+        port.timeout = 0.05
+        port.feed(bytes.fromhex('81 01 04'))
+        threading.Timer(0.2, port.feed, (bytes.fromhex('00 02 FF'),)).start()  # ◄ slow NCS, frame is not lost
+        self.assertEqual(SONY().receiveNative(port, stopEvent), bytes.fromhex('81 01 04 00 02 FF'))
+        stopEvent.set()
+        port.feed(bytes.fromhex('81 01 04'))
+        with self.assertRaises(DataInvalidError): SONY().receiveNative(port, stopEvent)
+
+        del SONY
+
+    def test_supervisor(self):
+        from unittest.mock import patch
+        from app import CONFIG
+
+        with fakeApp() as app, patch.object(CONFIG, 'AUTO_RECONNECT', True), \
+                patch.object(CONFIG, 'RECONNECT_PERIOD', 0.01):
+            losses = [SerialError("Port is lost")]
+
+            def loop(stopEvent):
+                if losses: raise losses.pop()
+                return 'finished'
+
+            app.appInt.nFailingOpens = 2  # ◄ port reappears on the third attempt
+            self.assertEqual(app.supervise(loop, threading.Event(), reopenDev=True), 'finished')
+            supervisor = app.stats()['supervisor']
+            self.assertEqual((supervisor['reconnects'], supervisor['lastLoss']), (1, "Port is lost"))
+            self.assertGreaterEqual(supervisor['downtime'], 0.03)
+            self.assertEqual(supervisor['maxDowntime'], supervisor['downtime'])
+            self.assertTrue(app.appInt.is_open and app.devInt.is_open)
+
+            # ▼ Stop is requested while ports are still lost
+            stopEvent = threading.Event()
+            losses.append(SerialError("Port is lost again"))
+            app.appInt.nFailingOpens = 1_000
+            threading.Timer(0.1, stopEvent.set).start()
+            self.assertIsNone(app.supervise(loop, stopEvent, reopenDev=True))
+            self.assertEqual(app.stats()['supervisor']['reconnects'], 1)
+
+    def test_keepAlive(self):
+        from time import monotonic
+        from unittest.mock import patch
+        from app import CONFIG
+        from ingress import IngressQueue
+        from scheduler import Scheduler, URGENT, NCS
+
+        with fakeApp() as app, patch.object(CONFIG, 'KEEPALIVE_INTERVAL', 0.5):
+            device = app.device
+            app.interactWithNativeSoft = True  # ◄ skipped slot waits in NCS read, not in scheduler
+            for par in device.params: par.status = par.value
+            app.lastTransactionAt = monotonic()
+            self.assertFalse(app.idlePollDue(device))
+            self.assertFalse(app.idlePollDue(device))
+            self.assertTrue(app.keepAliveMode)
+            app.lastTransactionAt = monotonic() - 1
+            self.assertTrue(app.idlePollDue(device))  # ◄ keep-alive poll is due
+
+            power = type(device).POWER
+            power.value = not power.status  # ◄ parameter change ––► full rate
+            self.assertTrue(app.idlePollDue(device))
+            self.assertFalse(app.keepAliveMode)
+            self.assertEqual(app.stats()['polling'], dict(mode='full', keepAliveInterval=0.5, slowdowns=1, skipped=2))
+
+            # ▼ NCS read cut short by stale .cancel_read() ––► skipped slot waits in scheduler instead of spinning
+            power.status = power.value
+            app.scheduler = Scheduler(weights={URGENT: 1, NCS: 1}, starvationLimit=1)
+            app.ingress = IngressQueue(4)
+            app.appInt.timeout = 5
+            app.appInt.cancel_read()
+            app.lastTransactionAt = startedAt = monotonic()
+            app.receiveIngress(threading.Event())
+            self.assertTrue(app.ncsWaitCutShort)
+            self.assertFalse(app.idlePollDue(device))
+            self.assertGreaterEqual(monotonic() - startedAt, 0.5)
+
+    def test_ReplyCache(self):
+        from cache import ReplyCache
+        from devices.sony import SONY
+
+        d = SONY()
+        for par in d.params: par.ack(par.value)
+        cache = ReplyCache(d, ttl=10)
+        inquiry, command = bytes.fromhex('81 09 04 00 FF'), bytes.fromhex('81 01 04 00 02 FF')
+
+        self.assertIsNone(cache.lookup(inquiry))
+        cache.store(inquiry, bytes.fromhex('90 50 02 FF'))
+        cache.store(command, bytes.fromhex('90 41 FF'))
+        self.assertEqual(cache.lookup(inquiry), bytes.fromhex('90 50 02 FF'))
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.lookup(command))
+        self.assertIsNone(cache.lookup(inquiry))
+
+        cache.store(inquiry, bytes.fromhex('90 50 02 FF'))
+        d.POWER = not d.POWER  # ◄ out of sync ––► bypass cache
+        self.assertIsNone(cache.lookup(inquiry))
+        d.POWER = not d.POWER
+
+        del SONY
+
+    def test_replyCacheInApp(self):
+        from os.path import join
+        from unittest.mock import patch
+        from app import CONFIG
+        from capture import CaptureReader, Direction
+        from ingress import Command
+        from replay import Replay
+
+        inquiry, reply = bytes.fromhex('81 09 04 00 FF'), bytes.fromhex('90 50 02 FF')
+        with patch.object(CONFIG, 'REPLY_CACHE_TTL', 10), fakeApp() as app:
+            device, cache = app.device, app.replyCache
+            for par in device.params: par.ack(par.value)
+            cache.store(inquiry, reply)
+            path = join(app.PROJECT_FOLDER, 'cache.ppcap')
+            app.startCapture(path)
+            self.assertTrue(app.answerFromCache(Command(inquiry, device, 0), nReplies=1))
+            app.stopCapture()
+            self.assertEqual(app.appInt.takeOutput(), reply)
+            records = [(record.direction, record.data) for record in CaptureReader(path)]
+            self.assertEqual(records, [(Direction.EVENT, f"cached reply={reply.hex()}".encode()),
+                                       (Direction.NCS_OUT, reply)])
+            self.assertEqual(Replay(path, device).run().nMismatches, 0)
+
+            power = type(device).POWER
+            power.value = not power.value  # ◄ altered from UI
+            power.ack(power.value)
+            self.assertEqual(len(cache), 0)
+            self.assertFalse(app.answerFromCache(Command(inquiry, device, 0), nReplies=1))
+
+
+    def test_RtoEstimator(self):
+        from timing import RtoEstimator
+
+        est = RtoEstimator(floor=0.002, ceiling=0.5)
+        self.assertEqual(est.rto, 0.5)  # no samples yet
+
+        for _ in range(50): est.sample(0.001)
+        self.assertEqual(est.rto, 0.002)  # converged below floor
+        self.assertAlmostEqual(est.srtt, 0.001)
+
+        est.sample(0.05)
+        self.assertTrue(0.002 < est.rto < 0.5)
+
+        for _ in range(20): est.backoff()
+        self.assertEqual(est.rto, 0.5)  # capped by ceiling
+        self.assertEqual(est.nBackoffs, 20)
+
+
+    def test_Backoff(self):
+        from timing import Backoff
+
+        backoff = Backoff(base=0.5, cap=5, grace=2, jitter=0.2)
+        self.assertEqual((backoff.next(), backoff.next()), (0, 0))  # grace timeouts
+        self.assertFalse(backoff.active)
+        self.assertTrue(0.4 <= backoff.next() <= 0.6)
+        self.assertTrue(backoff.active)
+        self.assertTrue(0.8 <= backoff.next() <= 1.2)
+        for _ in range(2000): backoff.next()
+        self.assertEqual(backoff.delay, 5)
+
+        backoff.reset()
+        self.assertFalse(backoff.active)
+        self.assertEqual(backoff.next(), 0)
+
+    def test_IngressQueue(self):
+        from ingress import IngressQueue
+
+        queue = IngressQueue(maxsize=2)
+        for data in (b'\x01', b'\x02', b'\x03'): queue.put(data)
+        self.assertEqual([queue.get().data for _ in range(2)], [b'\x02', b'\x03'])
+        self.assertIsNone(queue.get())
+        self.assertEqual(queue.nDroppedOverflow, 1)
+
+        queue = IngressQueue(maxsize=4, policy='drop-duplicates')
+        self.assertTrue(queue.put(b'\x01'))
+        self.assertFalse(queue.put(b'\x01'))
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.get().data, b'\x01')
+        self.assertTrue(queue.put(b'\x01'))  # ◄ command is not a duplicate once previous one is taken
+        for data in (b'\x02', b'\x03', b'\x04', b'\x05'): queue.put(data)
+        self.assertTrue(queue.put(b'\x01'))  # ◄ ...or has been dropped on overflow
+        self.assertEqual(queue.nDroppedDuplicate, 1)
+
+        queue = IngressQueue(maxsize=4, policy='deadline', deadline=0.01)
+        queue.put(b'\x01')
+        time.sleep(0.02)
+        queue.put(b'\x02')
+        self.assertEqual(queue.get().data, b'\x02')
+        self.assertEqual(queue.nExpired, 1)
+
+        queue = IngressQueue(maxsize=4)
+        for data in (b'\x01', b'\x01', b'\x01', b'\x02'): queue.put(data)
+        self.assertEqual(queue.coalesce(queue.get(), window=1), 2)
+        self.assertEqual(queue.get().data, b'\x02')
+
+        with self.assertRaises(ValueError): IngressQueue(maxsize=4, policy='drop-all')
+
+    def test_coalesceWindow(self):
+        from unittest.mock import patch
+        from app import CONFIG
+        from ingress import IngressQueue
+        from scheduler import Scheduler, URGENT, NCS
+
+        inquiry = bytes.fromhex('81 09 04 00 FF')
+        with patch.object(CONFIG, 'COALESCE_WINDOW', 0.2), fakeApp() as app:
+            app.scheduler = Scheduler(weights={URGENT: 1, NCS: 1}, starvationLimit=1)
+            app.ingress = IngressQueue(4)
+            app.ingress.put(inquiry, app.device)
+            command = app.ingress.get()
+            # ▼ Duplicate arrives after the first one has been taken for transaction, but still within window
+            threading.Timer(0.05, app.appInt.feed, (inquiry,)).start()
+            self.assertEqual(app.coalesce(threading.Event(), command), 1)
+            self.assertGreaterEqual(time.monotonic() - command.received, CONFIG.COALESCE_WINDOW)
+            self.assertEqual(len(app.ingress), 0)
+
+
+    def test_Scheduler(self):
+        from scheduler import Scheduler, URGENT, NCS, IDLE
+
+        scheduler = Scheduler(weights={URGENT: 3, NCS: 1}, starvationLimit=2)
+        self.assertEqual(scheduler.next(ncsPending=False), IDLE)
+        self.assertEqual(scheduler.next(ncsPending=True), NCS)
+        scheduler.requestUrgent()
+        self.assertEqual(scheduler.next(ncsPending=True), URGENT)  # ◄ served within one slot
+        self.assertFalse(scheduler.urgentPending)
+
+        slots = []
+        for _ in range(8):
+            scheduler.requestUrgent()
+            slots.append(scheduler.next(ncsPending=True))
+        self.assertIn(slots.count(NCS), (2, 3))  # ◄ about 1/4 of slots
+        self.assertNotIn([URGENT]*3, [slots[i:i+3] for i in range(6)])  # ◄ NCS is not starved
+
+    def test_protocolSwitchKeepsHandlers(self):
+        from os.path import join
+        from tempfile import TemporaryDirectory
+        from app import ProtocolLoader
+        from notifier import Notifier
+
+        def handler(*args): pass
+
+        if 'altered' not in Notifier.events: Notifier.addEvents('altered')
+        Notifier.addHandler('altered', handler)
+        try:
+            with TemporaryDirectory() as folder:
+                with open(join(folder, 'switchtest.py'), 'w') as file:
+                    file.write("from device import Device, Par\n"
+                               "class SWITCHTEST(Device):\n"
+                               "    FLAG = Par('Test flag', 'tf', bool)\n")
+                ProtocolLoader(folder)['switchtest']  # ◄ lazy import creates Par, which re-registers events
+            self.assertIn(handler, Notifier.events['altered'])
+        finally:
+            Notifier.events['altered'].discard(handler)
+            sys.modules.pop('switchtest', None)
+
+    def test_urgentTransaction(self):
+        from devices.mwxc import MWXC
+
+        with fakeApp() as app:
+            app.interactWithNativeSoft = True
+            app.appInt.timeout = 5
+            command = bytes.fromhex('81 01 04 00 02 FF')
+            app.appInt.feed(command[:3])  # ◄ NCS has started sending a frame
+            for _ in range(2):
+                self.assertTrue(app.startComm())
+                time.sleep(0.2)
+                power = type(app.device).POWER
+                power.value = not power.value  # ◄ urgent transaction cancels NCS read in the middle of the frame
+                time.sleep(0.2)
+                app.appInt.feed(command[3:])
+                time.sleep(0.2)
+                app.stopComm()
+                self.assertIn(command, app.devInt.takeOutput())  # ◄ frame is completed and relayed to device
+                app.appInt.feed(command[:3])
+            urgentHandlers = [h for h in app.events['altered'] if h == app.requestUrgentTransaction]
+            self.assertEqual(len(urgentHandlers), 1)  # ◄ registered once, at app init
+
+        port, stopEvent = FakeInterface('APP'), threading.Event()
+        port.timeout = 5
+        command = bytes.fromhex('A0 00 00 00 00 00 00 00 00 00')
+        frame = MWXC().nativeCommandFrame(command)
+        port.feed(frame[:4])
+        threading.Timer(0.1, port.cancel_read).start()
+        threading.Timer(0.2, port.feed, (frame[4:],)).start()
+        self.assertEqual(MWXC().receiveNative(port, stopEvent), command)
+
+
+    def test_TxWindow(self):
+        from window import TxWindow, Request
+
+        window = TxWindow(size=3, modulo=0x100)
+        for sentAt, seq in enumerate((0xFE, 0xFF, 0x00)): window.add(Request(seq, bytes([seq]), 1, sentAt))
+        self.assertTrue(window.full)
+        self.assertEqual(window.match(0x100).data, b'\x00')  # ◄ out of order, counter wrapped
+        self.assertIsNone(window.match(0x10))
+        self.assertEqual([request.seq for request in window.expire(deadline=1)], [0xFE])
+        self.assertEqual(window.stats()['inFlight'], 1)
+        self.assertEqual((window.nOvertaken, window.nStray, window.nLost), (1, 1, 1))
+
+
+    def test_relayWindow(self):
+        from unittest.mock import patch
+        from app import CONFIG
+        from ingress import IngressQueue
+        from scheduler import Scheduler, URGENT, NCS
+        from timing import Backoff
+        from window import Request
+
+        commands = [bytes.fromhex(f'81 09 04 {i:02X} FF') for i in range(3)]
+
+        def relay(app):
+            app.scheduler = Scheduler(weights={URGENT: 1, NCS: 1}, starvationLimit=1)
+            app.devBackoff = Backoff(base=1, cap=1, grace=len(commands))
+            app.ingress = IngressQueue(len(commands))
+            for command in commands[1:]: app.ingress.put(command, app.device)
+            app.nativeData = commands[0]
+            app.relayWindow(threading.Event(), nReplies=1)
+            return app.txWindow.stats()
+
+        def lateReply(packet: bytes):
+            command = packet[2:]
+            if command == commands[1]: return None  # ◄ lost
+            if command == commands[2]:
+                threading.Timer(0.15, app.devInt.deliver, (sonyReply(packet),)).start()
+                return None
+            return sonyReply(packet)
+
+        with patch.object(CONFIG, 'TX_WINDOW', len(commands)), patch.object(CONFIG, 'ADAPTIVE_TIMEOUT', False):
+            with fakeApp() as app:
+                app.devInt.timeout = 0.1
+                stats = relay(app)
+                self.assertEqual((stats['sent'], stats['matched'], stats['lost'], stats['maxInFlight']), (3, 3, 0, 3))
+                self.assertFalse(app.devInt.replies)
+
+            with fakeApp(lateReply) as app:
+                app.devInt.timeout = 0.1
+                stats = relay(app)
+                # ▼ Only request that has timed out is lost, reply to the following one is still accepted
+                self.assertEqual((stats['matched'], stats['lost']), (2, 1))
+
+            with fakeApp() as app:
+                app.devInt.timeout = 0.1
+                device, window = app.device, app.txWindow
+                packet = device.wrap(commands[0])
+                window.add(Request(device.sequenceNumber(packet), commands[0], 1, time.perf_counter(), packet))
+                threading.Timer(0.05, app.devInt.deliver, (sonyReply(packet),)).start()
+                app.devInt.feed(b'\xFF')
+                app.drainWindow(device, window)
+                self.assertEqual(window.stats()['matched'], 1)  # ◄ late reply is collected
+                self.assertFalse(window)
+                self.assertEqual(app.devInt.in_waiting, 1)  # ◄ input buffer is not flushed
+
+    def test_peleng(self):
+        from os import urandom
+        from Transceiver import rfc1071
+        from peleng import packFrame, unpackFrame, Rfc1071
+
+        packet = packFrame(0, bytes.fromhex('01 01 A8 AB AF AA AC AB A3 AA 08'))
+        self.assertEqual(packet, bytes.fromhex('5A 00 06 80 9F 7F 01 01 A8 AB AF AA AC AB A3 AA 08 00 4E 52'))
+        self.assertEqual(unpackFrame(packet), (0, bytes.fromhex('01 01 A8 AB AF AA AC AB A3 AA 08')))
+
+        data = urandom(1001)
+        self.assertEqual(Rfc1071(data[:333]).update(data[333:500]).update(data[500:]).digest(), rfc1071(data))
+
+    def test_bulkTransfer(self):
+        from collections import deque
+        from os import urandom
+        from Transceiver import rfc1071
+        from bulk import BulkTransfer, BulkChecksumError, BulkInterrupted
+        from device import Device
+        from devices.mwxc import MWXC
+        from devices.sony import SONY
+        from peleng import packFrame, unpackFrame, parseHeader, HEADER_SIZE, CHECKSUM_SIZE
+        from simulator import Simulator, SonySim, MwxcSim, loopback
+
+        class EchoDevice(Device):
+            def bulkChecksum(self, offset, packet): return rfc1071(self.bulkUnwrap(offset, packet))
+
+        class LoopbackTransceiver:
+            def __init__(self): self.line = deque()
+            def sendPacket(self, payload): self.line.append(packFrame(0, payload))
+            def receivePacket(self): return unpackFrame(self.line.popleft())[1]
+
+        data = urandom(20_000)
+        replies, report = BulkTransfer(LoopbackTransceiver(), EchoDevice(), chunkSize=8190, depth=2).run(data)
+        self.assertEqual(replies, data)
+        self.assertEqual(report.nChunks, 3)
+        self.assertEqual(report.sentChecksum, rfc1071(data))
+        self.assertEqual(report.receivedChecksum, report.sentChecksum)
+
+        class CorruptingTransceiver(LoopbackTransceiver):
+            def receivePacket(self):
+                reply = super().receivePacket()
+                return reply[:-1] + bytes([reply[-1] ^ 0xFF]) if len(self.line) == 0 else reply
+
+        with self.assertRaises(BulkChecksumError):
+            BulkTransfer(CorruptingTransceiver(), EchoDevice(), chunkSize=8190, depth=2).run(data)
+        stopEvent = threading.Event()
+        stopEvent.set()
+        with self.assertRaises(BulkInterrupted):
+            BulkTransfer(LoopbackTransceiver(), EchoDevice(), chunkSize=8190).run(data, stopEvent)
+
+        class LineTransceiver:
+            def __init__(self, line, address): self.line, self.address = line, address
+            def sendPacket(self, payload): self.line.write(packFrame(self.address, payload))
+            def receivePacket(self):
+                header = self.line.read(HEADER_SIZE)
+                return unpackFrame(header + self.line.read(parseHeader(header)[1] + CHECKSUM_SIZE))[1]
+
+        # ▼ Simulated devices do not echo chunks back, so transfer is not failed by chunk verification
+        line, simEnd = loopback(timeout=0.5)
+        with Simulator([SonySim(), MwxcSim()], simEnd):
+            for device in (SONY(), MWXC()):
+                transfer = BulkTransfer(LineTransceiver(line, device.DEV_ADDRESS), device, chunkSize=64, depth=2)
+                replies, report = transfer.run(data[:1000])
+                self.assertEqual(report.nChunks, -(-1000 // transfer.chunkSize))
+                self.assertNotEqual(report.receivedChecksum, report.sentChecksum)  # ◄ replies are not echoes
+
+    def test_capture(self):
+        import csv
+        from os.path import join
+        from tempfile import TemporaryDirectory
+        from capture import CaptureWriter, CaptureReader, Direction, exportPcapng, exportCsv, ERROR_TIMEOUT
+
+        frames = [(Direction.NCS_IN, b'\x81\x09\x04\x00\xFF', 0), (Direction.DEV_OUT, b'\x5A' * 300, 0),
+                  (Direction.DEV_IN, b'', ERROR_TIMEOUT), (Direction.EVENT, b'altered POWER=True', 0)] * 50
+        with TemporaryDirectory() as folder:
+            path = join(folder, 'test.ppcap')
+            with CaptureWriter(path, blockSize=1024) as capture:
+                for frame in frames: capture.record(*frame)
+            records = list(CaptureReader(path))
+            self.assertEqual([(r.direction, r.data, r.error) for r in records], frames)
+            self.assertEqual(records, sorted(records, key=lambda record: record.time))
+            self.assertGreater(len(capture.index), 1)
+            self.assertEqual(exportPcapng(CaptureReader(path), join(folder, 'test.pcapng')), len(frames))
+            self.assertEqual(exportCsv(CaptureReader(path), join(folder, 'test.csv')), len(frames))
+            with open(join(folder, 'test.csv'), newline='') as file:
+                rows = list(csv.reader(file))
+            self.assertEqual(rows[0], ['time_ns', 'direction', 'error', 'address', 'size', 'data'])
+            self.assertEqual(len(rows), len(frames) + 1)
+            self.assertEqual(rows[1][1:], ['NCS_IN', '0', '0', '5', '81 09 04 00 FF'])
+            self.assertEqual(rows[3][1:], ['DEV_IN', str(ERROR_TIMEOUT), '0', '0', ''])
+            self.assertEqual(rows[4][1:], ['EVENT', '0', '0', '18', 'altered POWER=True'])  # ◄ events are text
+            self.assertEqual(int(rows[1][0]), records[0].time)
+
+    def test_captureQuery(self):
+        from os.path import join
+        from tempfile import TemporaryDirectory
+        from capture import CaptureWriter, CaptureReader, Direction, ERROR_TIMEOUT
+
+        with TemporaryDirectory() as folder:
+            path = join(folder, 'test.ppcap')
+            with CaptureWriter(path, blockSize=512, codec='lzma', flushPeriod=60) as capture:
+                for i in range(1000):
+                    capture.record(Direction.DEV_OUT, i.to_bytes(2, 'big') * 8, address=12 + i % 3)
+                    capture.record(Direction.DEV_IN, b'', ERROR_TIMEOUT, address=12 + i % 3)
+                # ▼ Running capture is searched after its pending records are flushed (see 'cap find')
+                capture.flush()
+                self.assertEqual(len(list(CaptureReader(path))), 2000)
+            reader = CaptureReader(path)
+            records = list(reader)
+            self.assertEqual(len(records), 2000)
+            self.assertEqual(len(reader.index), len(capture.index))
+            middle = records[1001]
+            self.assertIn(middle, list(reader.query(middle.time, middle.time)))
+            timeouts = list(reader.query(errors={ERROR_TIMEOUT}, addresses={13}))
+            self.assertEqual(len(timeouts), 333)
+            self.assertTrue(all(r.direction == Direction.DEV_IN and r.address == 13 for r in timeouts))
+
+            # ▼ Capture which has not been closed has no index
+            with open(path, 'r+b') as file:
+                file.truncate(capture.nBytes)
+            self.assertEqual(CaptureReader(path).index, reader.index)
+
+    def test_flightRecorder(self):
+        from os.path import join
+        from tempfile import TemporaryDirectory
+        from flight import FlightRecorder
+
+        recorder = FlightRecorder(capacity=4, maxData=8)
+        for i in range(6):
+            recorder.record(FlightRecorder.OK, 12, bytes([i]) * 10, bytes([i]), 0.001, 0.01 * i, 0.5)
+        recorder.record(FlightRecorder.TIMEOUT, 12, b'\x00\x01', b'', 0.001, 0.5, 0.5)
+        entries = recorder.entries()
+        self.assertEqual(len(entries), 4)
+        self.assertEqual([entry.reply for entry in entries], [b'\x03', b'\x04', b'\x05', b''])
+        self.assertEqual((entries[0].command, entries[0].commandSize), (b'\x03' * 8, 10))
+        self.assertEqual((entries[-1].outcome, entries[-1].replyTime), (FlightRecorder.TIMEOUT, 500_000))
+        with TemporaryDirectory() as folder:
+            self.assertEqual(recorder.dump(join(folder, 'flight.txt'), 'test'), 4)
+            with open(join(folder, 'flight.txt'), encoding='utf-8') as file:
+                dump = file.read()
+            self.assertIn('timeout', dump)
+            self.assertNotIn('Error being handled', dump)
+            try:
+                raise TimeoutError("no reply")
+            except TimeoutError:
+                recorder.dump(join(folder, 'flight.txt'), 'test')
+            with open(join(folder, 'flight.txt'), encoding='utf-8') as file:
+                self.assertIn('TimeoutError: no reply', file.read())
+
+    def test_tap(self):
+        from capture import Direction
+        from tap import Tap, TapServer, TapClient
+
+        tap = Tap()
+        tap.publish(Direction.NCS_IN, b'\x00')  # ◄ no subscribers, nothing happens
+        with tap.subscribe(capacity=3) as everything, tap.subscribe(directions=[Direction.DEV_IN]) as replies:
+            for i in range(5): tap.publish(Direction.DEV_IN if i % 2 else Direction.DEV_OUT, bytes([i]), address=12)
+            self.assertEqual([record.data for record in everything.drain()], [b'\x00', b'\x01', b'\x02'])
+            self.assertEqual(everything.nOverruns, 2)
+            self.assertEqual([record.data for record in replies.drain()], [b'\x01', b'\x03'])
+            self.assertIsNone(everything.get(timeout=0.01))
+        self.assertEqual(tap.subscribers, ())
+
+        with tap.subscribe(capacity=4000) as everything:  # ◄ several publisher threads, as App.trace() has
+            publishers = [threading.Thread(target=lambda: [tap.publish(Direction.EVENT, b'') for _ in range(1000)])
+                          for _ in range(4)]
+            for thread in publishers: thread.start()
+            for thread in publishers: thread.join()
+            self.assertEqual((len(everything.drain()), everything.nOverruns), (4000, 0))
+
+        # ▼ Lock-free single producer: idle consumer is woken up by the event, not by polling
+        tap = Tap(singleProducer=True)
+        with tap.subscribe() as everything:
+            threading.Timer(0.05, tap.publish, (Direction.DEV_IN, b'\x01')).start()
+            startedAt = time.monotonic()
+            self.assertEqual(everything.get(timeout=5).data, b'\x01')
+            self.assertLess(time.monotonic() - startedAt, 1)
+            threading.Timer(0.05, everything.close).start()
+            self.assertEqual(list(everything), [])  # ◄ closing wakes up iterating consumer
+
+        with TapServer(tap, 0) as server, TapClient(*server.address) as client:
+            while not tap.subscribers: time.sleep(0.01)
+            tap.publish(Direction.DEV_OUT, b'\x5A\x0C', address=12)
+            record = next(iter(client))
+            self.assertEqual((record.direction, record.address, record.data), (Direction.DEV_OUT, 12, b'\x5A\x0C'))
+
+    def test_simulator(self):
+        from Transceiver.errors import BadCrcError
+        from peleng import packFrame, unpackFrame, MASTER_ADDRESS
+        from simulator import Simulator, SimDevice, SonySim, MwxcSim, Faults, loopback
+
+        with self.assertRaises(TypeError): SimDevice()  # ◄ replies are device-specific
+        line, simEnd = loopback(timeout=0.2)
+        with Simulator([SonySim(), MwxcSim()], simEnd, latency=0.001, jitter=0.001, seed=1) as simulator:
+            line.write(b'\x00\x13' + packFrame(12, b'\x01\x05\x81\x01\x04\x00\x02\xFF'))
+            address, reply = unpackFrame(line.read(6 + 6 + 2))
+            self.assertEqual((address, reply), (MASTER_ADDRESS, b'\x01\x05\x90\x50\xFF'))
+            line.write(packFrame(14, b'\x03' + bytes(11)))
+            _, reply = unpackFrame(line.read(6 + 18 + 2))
+            self.assertEqual(reply[0], 0b1111)  # ◄ power and video are on, video receiver and channel are up
+            line.write(packFrame(13, b'\x00'))  # ◄ no such device on the line
+            self.assertEqual(line.read(1), b'')
+            self.assertEqual(simulator.stats()['badBytes'], 2)
+
+            simulator.faults = Faults(badCrc=1)
+            line.write(packFrame(14, b'\x00' + bytes(11)))
+            with self.assertRaises(BadCrcError): unpackFrame(line.read(6 + 18 + 2))
+            simulator.faults = Faults(dropReply=1)
+            line.write(packFrame(14, b'\x00' + bytes(11)))
+            self.assertEqual(line.read(1), b'')
+
+    def test_loadgen(self):
+        from loadgen import LoadGenerator, NativeProtocol, SonyNative
+        from simulator import loopback
+
+        with self.assertRaises(TypeError): NativeProtocol()  # ◄ reply framing is protocol-specific
+        protocol = SonyNative()
+        line, ncsEnd = loopback(timeout=0.05)
+        stopEvent = threading.Event()
+
+        def proxy():
+            # ▼ Native side of the app: frame command, reply with device data
+            while not stopEvent.is_set():
+                if not ncsEnd.in_waiting: time.sleep(0.001); continue
+                protocol.device.receiveNative(ncsEnd)
+                protocol.device.sendNative(ncsEnd, b'\x90\x50\xFF')
+
+        thread = threading.Thread(target=proxy)
+        thread.start()
+        try:
+            report = LoadGenerator(protocol, line, 'closed', mix='mixed', timeout=0.2, seed=1).run(count=20)
+            self.assertEqual((report.sent, report.received, report.timeouts), (20, 20, 0))
+            report = LoadGenerator(protocol, line, 'open', rate=500, timeout=0.2, seed=1).run(count=20)
+            self.assertEqual(report.received + report.timeouts, 20)
+            self.assertEqual(len(report.latencies), report.received)
+        finally:
+            stopEvent.set()
+            thread.join()
+
+    def test_benchmarkCompare(self):
+        from benchmark import compare
+
+        baseline = {'sony/passthrough': dict(deviceThroughput=500, p99=4.0, cpuPerTx=100, rssGrowth=10)}
+        results = {'sony/passthrough': dict(deviceThroughput=470, p99=4.4, cpuPerTx=130, rssGrowth=900),
+                   'mwxc/passthrough': dict(deviceThroughput=1)}  # ◄ not in baseline
+        regressions = compare(results, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('sony/passthrough cpuPerTx'))
+
+    def test_microbench(self):
+        from microbench import run
+        from notifier import Notifier
+
+        events = {event: list(handlers) for event, handlers in Notifier.events.items()}
+        results = run('rfc1071 18 B', minTime=0.001)
+        self.assertEqual({event: list(handlers) for event, handlers in Notifier.events.items()}, events)
+        self.assertEqual(list(results), ['rfc1071 18 B'])
+        self.assertGreater(results['rfc1071 18 B'].ns, 0)
+        self.assertGreaterEqual(results['rfc1071 18 B'].allocated, 0)
+
+    def test_decoder(self):
+        import sys
+        from os import urandom
+        from os.path import join
+        from tempfile import TemporaryDirectory
+        from unittest.mock import patch
+        from Utils import flags
+        from capture import CaptureWriter, Direction
+        from Transceiver import rfc1071
+        from decoder import numpy, pelengFrames, nativeFrames, captureColumns, decodeFlags
+        from devices.mwxc import MWXC
+        from devices.sony import SONY
+        from peleng import packFrame
+
+        frames = [packFrame(12, urandom(size)) for size in (0, 1, 11, 300)]
+        peleng = b'\x5A\x5A' + frames[0] + urandom(7) + frames[1] + frames[2] + b'\x5A' + frames[3] + b'\x5A\x0C'
+        replies = [MWXC.APP_STARTBYTE_REPLY + urandom(MWXC.REPLY_MAX_SIZE - 1) for _ in range(3)]
+        replies = [reply + rfc1071(reply) for reply in replies]
+        broken = replies[0][:5] + bytes([replies[0][5] ^ 0xFF]) + replies[0][6:]
+        native = b'\x50' + replies[0] + urandom(5) + broken + replies[1] + replies[2][:-1] + b'\x50' + replies[2]
+        headers = [0x01, 0x01, 0x03, 0x08, 0x00]
+
+        def decode():
+            found = pelengFrames(peleng)
+            self.assertEqual([peleng[o:o + s] for o, s in zip(found.offsets, found.sizes)], frames)
+            self.assertEqual(list(found.addresses), [12] * 4)
+
+            found = nativeFrames(native, MWXC.APP_STARTBYTE_REPLY[0], MWXC.REPLY_MAX_SIZE + 2)
+            self.assertEqual([native[o:o + s] for o, s in zip(found.offsets, found.sizes)], replies)
+
+            with TemporaryDirectory() as folder:
+                path = join(folder, 'test.ppcap')
+                with CaptureWriter(path, blockSize=64) as capture:
+                    for header in headers:
+                        capture.record(Direction.DEV_OUT, bytes((header, 0)) + urandom(5), address=12)
+                        capture.record(Direction.DEV_IN, bytes((header, 0)) + urandom(5), address=12)
+                        capture.record(Direction.DEV_IN, bytes((0xFF, 0)), address=14)
+                series = decodeFlags(captureColumns(path), SONY)
+            self.assertEqual(list(series['POWER reported'].values), [flags(header, 4)[0] for header in headers])
+            self.assertEqual(list(series['VIDEO_OUT_EN reported'].values),
+                             [flags(header, 4)[3] for header in headers])
+            self.assertEqual(list(series['RESET requested'].changes().values), [False, True, False])
+
+        decode()
+        # ▼ NumPy is optional, the same results are produced by pure Python fallback
+        numpy.cache_clear()
+        try:
+            with patch.dict(sys.modules, {'numpy': None}):
+                self.assertIsNone(numpy())
+                decode()
+        finally:
+            numpy.cache_clear()
+
+    def test_replay(self):
+        from os.path import join
+        from tempfile import TemporaryDirectory
+        from capture import CaptureWriter, Direction
+        from devices.sony import SONY
+        from replay import Replay
+
+        d = SONY()
+        power = SONY.POWER.value, SONY.POWER.status  # SONY parameters are class attrs :/
+        d.CNT_IN = d.CNT_OUT = 0
+        command = bytes.fromhex('81 09 04 00 FF')
+        with TemporaryDirectory() as folder:
+            path = join(folder, 'test.ppcap')
+            with CaptureWriter(path) as capture:
+                d.POWER = True
+                capture.record(Direction.EVENT, b'altered POWER=True')
+                for _ in range(3):
+                    capture.record(Direction.NCS_IN, d.nativeCommandFrame(command))
+                    packet = d.wrap(command)
+                    capture.record(Direction.DEV_OUT, packet)
+                    reply = packet[:2] + bytes.fromhex('90 50 02 FF')
+                    capture.record(Direction.DEV_IN, reply)
+                    data = d.unwrap(reply)
+                    capture.record(Direction.EVENT, f'new POWER={SONY.POWER.status}'.encode())
+                    capture.record(Direction.NCS_OUT, d.nativeReplyFrame(data))
+                capture.record(Direction.DEV_OUT, bytes.fromhex('01 01') + command)  # ◄ counter is stale
+                capture.record(Direction.EVENT, f'new POWER={not SONY.POWER.status}'.encode())  # ◄ not reported
+            SONY.POWER.value = False
+            d.CNT_IN = d.CNT_OUT = 0
+            replay = Replay(path, d)
+            report = replay.run()
+            self.assertEqual((report.nFrames, report.nErrors, report.nMismatches), (13, 0, 2))
+            self.assertEqual([m.direction for m in replay.mismatches], [Direction.DEV_OUT, Direction.EVENT])
+        SONY.POWER.value, SONY.POWER.status = power
+        d.CNT_IN = d.CNT_OUT = 0
+
+        del SONY
+
 
     def test_ConfigLoader(self):
         from contextlib import contextmanager
@@ -0,0 +1,94 @@
+from random import uniform
+
+from Utils import auto_repr
+
+
+class RtoEstimator:
+    """ Device reply timeout estimator (RFC 6298 retransmission timeout algorithm)
+        Timeout tracks smoothed round-trip time, but is kept within [floor, ceiling] range
+    """
+
+    ALPHA: float = 1/8  # smoothed RTT gain
+    BETA: float = 1/4   # RTT variation gain
+    K: int = 4          # RTT variation multiplier
+
+    def __init__(self, floor: float, ceiling: float):
+        self.floor: float = min(floor, ceiling)
+        self.ceiling: float = ceiling
+        self.srtt: float = None
+        self.rttvar: float = None
+        self.rto: float = ceiling  # ◄ no RTT samples yet — be conservative
+        self.nSamples: int = 0
+        self.nBackoffs: int = 0
+
+    def __repr__(self):
+        return auto_repr(self, f"rto={self.rto*1000:.2f}ms, srtt="
+                               f"{'?' if self.srtt is None else f'{self.srtt*1000:.2f}ms'}")
+
+    def sample(self, rtt: float) -> float:
+        """ Account measured round-trip time, return updated timeout """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.nSamples += 1
+        self.rto = min(max(self.srtt + self.K * self.rttvar, self.floor), self.ceiling)
+        return self.rto
+
+    def backoff(self) -> float:
+        """ Double the timeout after reply has not been received (Karn's algorithm) """
+        self.nBackoffs += 1
+        self.rto = min(self.rto * 2, self.ceiling)
+        return self.rto
+
+    def reset(self):
+        self.srtt = self.rttvar = None
+        self.rto = self.ceiling
+
+    def stats(self) -> dict:
+        return dict(rto=self.rto, srtt=self.srtt, rttvar=self.rttvar, floor=self.floor,
+                    ceiling=self.ceiling, samples=self.nSamples, backoffs=self.nBackoffs)
+
+
+class Backoff:
+    """ Exponential backoff with jitter for polling unresponsive device
+        First `grace` failures are retried immediately, then delay grows
+            from `base` by `factor` on each failure up to `cap`
+    """
+
+    def __init__(self, base: float, cap: float, grace: int = 0, jitter: float = 0.25, factor: float = 2):
+        self.base: float = base
+        self.cap: float = cap
+        self.grace: int = grace
+        self.jitter: float = jitter  # relative delay spread, 0..1
+        self.factor: float = factor
+        self.nFailures: int = 0
+        self.delay: float = 0
+
+    def __repr__(self):
+        return auto_repr(self, f"failures={self.nFailures}, delay={self.delay:.3f}s")
+
+    @property
+    def active(self) -> bool:
+        """ Whether failures count exceeded grace limit """
+        return self.nFailures > self.grace
+
+    def next(self) -> float:
+        """ Account failure, return delay before next attempt """
+        self.nFailures += 1
+        if not self.active:
+            self.delay = 0
+        else:
+            delay = self.base * self.factor ** min(self.nFailures - self.grace - 1, 64)
+            delay *= uniform(1 - self.jitter, 1 + self.jitter)
+            self.delay = min(delay, self.cap)
+        return self.delay
+
+    def reset(self):
+        self.nFailures = 0
+        self.delay = 0
+
+    def stats(self) -> dict:
+        return dict(failures=self.nFailures, delay=self.delay, base=self.base, cap=self.cap, grace=self.grace)
@@ -12,7 +12,7 @@ from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QSizePolicy, QVB
 from PyQt5.QtWidgets import QPushButton, QComboBox, QLabel
 from PyQt5Utils import Block, blockedSignals, setFocusChain, Colorer, DisplayColor, SerialCommPanel
 from PyQt5Utils import QHoldFocusComboBox, QAutoSelectLineEdit, QFixedLabel, QSqButton, QRightclickButton
-from Utils import Logger, formatDict, formatList, virtualport, ignoreErrors, ConfigLoader
+from Utils import Logger, bytewise, formatDict, formatList, virtualport, ignoreErrors, ConfigLoader
 from Utils.colored_logger import ColoredLogger
 from importlib.resources import path as resource_path
 
@@ -107,10 +107,13 @@ class UI(QApplication):
     commStarted = pyqtSignal()
     commDropped = pyqtSignal()
     commFailed = pyqtSignal()
+    commLost = pyqtSignal()
+    commRestored = pyqtSignal()
     commStopped = pyqtSignal()
     commError = pyqtSignal()
     commTimeout = pyqtSignal()
     commOk = pyqtSignal()
+    transactionDone = pyqtSignal(object)
 
     def __init__(self, app, argv):
         super().__init__(argv)
@@ -174,13 +177,16 @@ class UI(QApplication):
         self.app.addHandler('comm timeout', self.commTimeout.emit)
         self.app.addHandler('comm error', self.commError.emit)
         self.app.addHandler('comm failed', self.commFailed.emit)
+        self.app.addHandler('comm lost', self.commLost.emit)
+        self.app.addHandler('comm restored', self.commRestored.emit)
         self.app.addHandler('comm stopped', self.commStopped.emit)
         self.app.addHandler('protocol changed', self.protocolChanged.emit)
         self.app.addHandler('quit', self.quit)
 
         # Communication bindings
         self.commPanel.bind(SerialCommPanel.Mode.Continuous, self.triggerContComm)
-        self.commPanel.bind(SerialCommPanel.Mode.Manual, self.app.transaction)
+        self.commPanel.bind(SerialCommPanel.Mode.Manual, self.triggerTransaction)
+        self.transactionDone.connect(self.showTransactionResult)
         self.commPanel.bind(SerialCommPanel.Mode.Smart, self.app.transaction)
 
         # Update commPanel interface
@@ -198,6 +204,10 @@ class UI(QApplication):
         # Indicate communication failure
         self.commFailed.connect(partial(self.commPanel.commButton.colorer.setBaseColor, DisplayColor.Red))
 
+        # Indicate port loss while communication supervisor is waiting for port to reappear
+        self.commLost.connect(partial(self.commPanel.commButton.colorer.setBaseColor, DisplayColor.Orange))
+        self.commRestored.connect(partial(self.commPanel.commButton.colorer.setBaseColor, None))
+
         # self.commFailed.connect(lambda: self.commPanel.commButton.colorer.setBaseColor(DisplayColor.Red)
         # if self.commPanel.commMode is SerialCommPanel.Mode.Continuous
         # else self.commPanel.commButton.colorer.blink(DisplayColor.Red))
@@ -384,6 +394,16 @@ class UI(QApplication):
             self.deviceCombobox.setDisabled(status)
         return status
 
+    def triggerTransaction(self, *_):
+        future = self.app.submitTransaction()
+        # ▼ Callback is executed in I/O thread — result is passed to UI thread via signal
+        future.add_done_callback(self.transactionDone.emit)
+
+    def showTransactionResult(self, future):
+        """ Manual mode transaction outcome (failures are reported by app itself) """
+        if future.cancelled() or future.exception() is not None: return
+        log.info(f"{self.app.device.name} reply: [{bytewise(future.result())}]")
+
     def triggerSmartMode(self, mode):
         if mode == SerialCommPanel.Mode.Smart:
             self.app.enableSmart()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from Utils import auto_repr
+
+
+class Request(NamedTuple):
+    seq: int  # sequence number carried by wrapped packet
+    data: bytes  # native command
+    nReplies: int  # NCS replies expected for this command
+    sentAt: float  # perf_counter() time, sec
+    packet: bytes = b''  # wrapped command as sent to device
+
+
+class TxWindow:
+    """ Requests in flight to device which echoes command sequence numbers in its replies
+        Replies are matched to requests by sequence number (in any order),
+            request not matched within timeout is considered lost
+    """
+
+    def __init__(self, size: int, modulo: int):
+        self.modulo: int = modulo
+        # ▼ Sequence numbers of requests in flight should not wrap around
+        self.size: int = max(1, min(size, modulo // 2))
+        self.inFlight: Dict[int, Request] = OrderedDict()
+
+        self.nSent: int = 0
+        self.nMatched: int = 0
+        self.nLost: int = 0
+        self.nStray: int = 0
+        self.nOvertaken: int = 0  # replies that overtook earlier request (reordered or lost)
+        self.maxInFlight: int = 0
+
+    def __len__(self):
+        return len(self.inFlight)
+
+    def __repr__(self):
+        return auto_repr(self, f"{len(self.inFlight)}/{self.size} in flight")
+
+    @property
+    def full(self) -> bool:
+        return len(self.inFlight) >= self.size
+
+    def oldest(self) -> Optional[Request]:
+        return next(iter(self.inFlight.values()), None)
+
+    def add(self, request: Request):
+        if request.seq in self.inFlight:
+            # ▼ Previous request with the same number is unanswerable from now on
+            self.inFlight.pop(request.seq)
+            self.nLost += 1
+        self.inFlight[request.seq] = request
+        self.nSent += 1
+        self.maxInFlight = max(self.maxInFlight, len(self.inFlight))
+
+    def match(self, seq: int) -> Optional[Request]:
+        """ Pop request answered by reply with sequence number `seq`, None if there is no such request """
+        request = self.inFlight.pop(seq % self.modulo, None)
+        if request is None:
+            self.nStray += 1
+            return None
+        if any(other.sentAt < request.sentAt for other in self.inFlight.values()):
+            self.nOvertaken += 1
+        self.nMatched += 1
+        return request
+
+    def lose(self, request: Request):
+        """ Drop `request` whose reply has not arrived within timeout """
+        if self.inFlight.pop(request.seq, None) is not None: self.nLost += 1
+
+    def expire(self, deadline: float) -> List[Request]:
+        """ Pop requests sent before `deadline` (perf_counter() time) — their replies are considered lost """
+        expired = [request for request in self.inFlight.values() if request.sentAt < deadline]
+        for request in expired: del self.inFlight[request.seq]
+        self.nLost += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        return dict(size=self.size, inFlight=len(self.inFlight), maxInFlight=self.maxInFlight, sent=self.nSent,
+                    matched=self.nMatched, lost=self.nLost, stray=self.nStray, overtaken=self.nOvertaken)